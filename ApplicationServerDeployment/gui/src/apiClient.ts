@@ -2,7 +2,7 @@
 // SPDX-License-Identifier: MIT-0
 
 import axios from "redaxios";
-import { ACCESS_TOKEN, API_URL } from "./constants";
+import { ACCESS_TOKEN, API_ACCEPT, API_URL } from "./constants";
 
 // @ts-ignore
 let instance;
@@ -11,13 +11,10 @@ const gateway = () => {
   const accessToken = localStorage.getItem(ACCESS_TOKEN);
   const options = {
     baseURL: API_URL,
-    ...(accessToken
-      ? {
-          headers: {
-            authorizationtoken: `Basic ${accessToken}`,
-          },
-        }
-      : {}),
+    headers: {
+      accept: API_ACCEPT,
+      ...(accessToken ? { authorizationtoken: `Basic ${accessToken}` } : {}),
+    },
   };
 
   instance = axios.create(options);
@@ -28,6 +25,7 @@ const gateway = () => {
 export const setAuthHeader = (token: string) => {
   // @ts-ignore
   instance.defaults.headers = {
+    accept: API_ACCEPT,
     authorizationtoken: `Basic ${token}`,
   };
 
@@ -37,6 +35,7 @@ export const setAuthHeader = (token: string) => {
 export const setUsernameHeader = (username: string) => {
     // @ts-ignore
     instance.defaults.headers = {
+        accept: API_ACCEPT,
         Username: `${username}`,
     };
 };
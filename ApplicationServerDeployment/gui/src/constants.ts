@@ -8,6 +8,8 @@ export const SENSOR_UNIT = {
 };
 
 export const API_URL = '/api';
+// Asks SidewalkDbHandlerLambda for compressed responses (binary media type of the API Gateway)
+export const API_ACCEPT = "application/vnd.sidewalk+json";
 
 export const COLORS = {
   gray: "rgb(255, 99, 132)",
@@ -0,0 +1,286 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Micro-benchmarks for the command codec.
+
+Times decoding and encoding of every message type from the unit test vectors and reports ops/sec
+(from timed batches), p50/p99 latency (from individually timed operations) and peak memory allocated
+per operation (tracemalloc).
+With --memory, memory retained per decoded Command and Tag object is compared with dict-backed objects
+holding the same attributes.
+Results may be saved as a JSON baseline; a run fails (exit code 1) when throughput of any benchmark
+drops by more than the given percentage compared to the baseline.
+
+Usage:
+    python benchmark_codec.py --save baseline.json
+    python benchmark_codec.py --baseline baseline.json --threshold 10
+    python benchmark_codec.py --memory 100000
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import command_templates
+from command import Command
+from protocol import *
+from tag import Tag
+
+"""
+Uplink test vectors (see: test_decoder.py), one per message type and tag layout.
+"""
+DECODE_VECTORS = {
+    'cap_discovery_notification': '40C10301020382010203040B010C02',
+    'action_resp_led_on': '61C90301020387000003E888000000640C04',
+    'action_resp_led_off': '618A01020304870000271088000003E80C01',
+    'action_notification_button_press': '41C50301020387000000640C02',
+    'action_notification_sensor_1b': '41060187000000010C01',
+    'action_notification_sensor_3b': '41C60301020387000000010C01',
+    'action_notification_sensor_4b': '41860102030487000000010C01'
+}
+
+"""
+Downlink test vectors (see: test_encoder.py), one per message type.
+"""
+ENCODE_VECTORS = {
+    'cap_discovery_resp': (True, OpCode.MSG_TYPE_RESP, Id.DEMO_APP_CAP_DISCOVERY_RESP, '00000000', []),
+    'action_resp_button_pressed': (True, OpCode.MSG_TYPE_RESP, Id.DEMO_APP_ACTION_RESP, '00000000',
+                                   [{TagType.BUTTON_PRESSED_RESP: [1, 2, 4]}]),
+    'action_req_led_on': (False, OpCode.MSG_TYPE_WRITE, Id.DEMO_APP_ACTION_REQ, '',
+                          [{TagType.LED_ON: [1, 2, 3]}, {TagType.CURRENT_GPS_TIME_IN_SECS: 1000}]),
+    'action_req_led_off': (False, OpCode.MSG_TYPE_WRITE, Id.DEMO_APP_ACTION_REQ, '',
+                           [{TagType.LED_OFF: [1, 2, 3, 4]}, {TagType.CURRENT_GPS_TIME_IN_SECS: 1000}])
+}
+
+
+def _encode(status_hdr_ind, op_code, id, status_code, tags_json):
+    tags = [Tag().encode(tag) for tag in tags_json]
+    return Command().encode(status_hdr_ind=status_hdr_ind, op_code=op_code, cls=Class.DEMO_APP_CLASS, id=id,
+                            status_code=status_code, payload=tags).to_bytes()
+
+
+def _decoded_tag(hex_str: str) -> Tag:
+    return Command().decode(hex_str).payload[0]
+
+
+def build_benchmarks() -> dict:
+    """
+    Builds benchmarked operations.
+
+    :return:    Dict of benchmark name: zero-argument callable.
+    """
+    benchmarks = {}
+    for name, hex_str in DECODE_VECTORS.items():
+        benchmarks[f'Command.decode[{name}]'] = lambda hex_str=hex_str: Command().decode(hex_str).decoded_cmd
+        benchmarks[f'Command.decode_lazy[{name}]'] = \
+            lambda hex_str=hex_str: Command().decode(hex_str, lazy=True).decoded_cmd['id']
+        benchmarks[f'Command.hex_to_bin[{name}]'] = lambda hex_str=hex_str: Command.hex_to_bin(hex_str)
+    benchmarks['Command.decode_many[x100]'] = lambda: Command.decode_many(list(DECODE_VECTORS.values()) * 100)
+
+    for name, args in ENCODE_VECTORS.items():
+        benchmarks[f'Command.encode[{name}]'] = lambda args=args: _encode(*args)
+    benchmarks['command_templates.encode_led_action_req'] = \
+        lambda: command_templates.encode_led_action_req(TagType.LED_ON, [1, 2, 3], 1000)
+
+    decoded_tag = _decoded_tag(DECODE_VECTORS['action_notification_sensor_1b'])
+    benchmarks['Tag._decode_tag[temp_sensor_data]'] = decoded_tag._decode_tag
+    encoded_tag = Tag().encode({TagType.LED_ON: [1, 2, 3]})
+    benchmarks['Tag._encode_tag[led_on]'] = encoded_tag._encode_tag
+    return benchmarks
+
+
+def run_benchmark(fn, number: int, repeat: int, alloc_runs: int, latency_runs: int = 10000) -> dict:
+    """
+    Measures single benchmark. Throughput is computed from the timed batches, latency percentiles
+    from the individually timed operations (batch means would hide the tail).
+
+    :param fn:              Benchmarked operation.
+    :param number:          Number of operations per timed batch.
+    :param repeat:          Number of timed batches.
+    :param alloc_runs:      Number of operations traced with tracemalloc.
+    :param latency_runs:    Number of individually timed operations.
+    :return:                Dict with ops_per_sec, p50_us, p99_us and peak_alloc_bytes.
+    """
+    for _ in range(min(number, 100)):  # warm up caches
+        fn()
+
+    total_ns = 0
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        total_ns += time.perf_counter_ns() - start
+
+    timer_overhead = _timer_overhead_ns()
+    latencies = []
+    for _ in range(latency_runs):
+        start = time.perf_counter_ns()
+        fn()
+        latencies.append(max(0, time.perf_counter_ns() - start - timer_overhead))
+    latencies.sort()
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_runs):
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops_per_sec': round(number * repeat / (total_ns / 1e9), 1),
+        'p50_us': round(_percentile(latencies, 50) / 1000, 3),
+        'p99_us': round(_percentile(latencies, 99) / 1000, 3),
+        'peak_alloc_bytes': round(sum(peaks) / len(peaks)) if peaks else 0
+    }
+
+
+def measure_memory(factory, count: int) -> float:
+    """
+    Measures memory retained by objects created by the factory.
+
+    :param factory:     Callable, which takes object index and returns the object.
+    :param count:       Number of created objects.
+    :return:            Retained memory per object (in bytes).
+    """
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        objects = [factory(idx) for idx in range(count)]
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (retained - baseline) / count
+
+
+def _dict_backed(obj) -> SimpleNamespace:
+    """
+    Returns dict-backed copy of the slotted Command or Tag object.
+    """
+    attrs = {name: getattr(obj, name) for name in type(obj).__slots__}
+    if isinstance(obj, Command):
+        attrs['_payload'] = [_dict_backed(tag) for tag in obj.payload]
+    return SimpleNamespace(**attrs)
+
+
+def run_memory_benchmark(count: int):
+    """
+    Prints memory retained per decoded Command (with materialized tags) and per Tag object.
+
+    :param count:   Number of created objects.
+    """
+    vectors = list(DECODE_VECTORS.values())
+
+    def decoded(idx: int) -> Command:
+        cmd = Command().decode(vectors[idx % len(vectors)])
+        cmd.payload  # materialize tags
+        return cmd
+
+    def decoded_tag(idx: int) -> Tag:
+        return decoded(idx).payload[0]
+
+    benchmarks = {
+        'Command': (decoded, lambda idx: _dict_backed(decoded(idx))),
+        'Tag': (decoded_tag, lambda idx: _dict_backed(decoded_tag(idx)))
+    }
+    print(f'{"class":<16} {"dict-backed B/obj":>18} {"slotted B/obj":>14} {"reduction":>10}')
+    for name, (slotted_factory, dict_backed_factory) in benchmarks.items():
+        dict_backed = measure_memory(dict_backed_factory, count)
+        slotted = measure_memory(slotted_factory, count)
+        print(f'{name:<16} {dict_backed:>18.0f} {slotted:>14.0f} {(1 - slotted / dict_backed) * 100:>9.1f}%')
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> [str]:
+    """
+    Compares results with baseline.
+
+    :param results:     Benchmark results.
+    :param baseline:    Baseline results.
+    :param threshold:   Allowed throughput regression (in percent).
+    :return:            List of descriptions of regressed benchmarks.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        change = (result['ops_per_sec'] - expected['ops_per_sec']) / expected['ops_per_sec'] * 100
+        if change < -threshold:
+            regressions.append(f'{name}: {result["ops_per_sec"]:.0f} ops/sec vs baseline '
+                               f'{expected["ops_per_sec"]:.0f} ops/sec ({change:.1f}%)')
+    return regressions
+
+
+def _timer_overhead_ns(runs: int = 1000) -> int:
+    """
+    Returns cost of a pair of perf_counter_ns calls, subtracted from the individually timed operations.
+    """
+    overheads = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        overheads.append(time.perf_counter_ns() - start)
+    return min(overheads)
+
+
+def _percentile(sorted_samples: [float], percentile: float) -> float:
+    idx = min(len(sorted_samples) - 1, int(round(percentile / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[idx]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Codec micro-benchmarks.')
+    parser.add_argument('--number', type=int, default=1000, help='operations per timed batch')
+    parser.add_argument('--repeat', type=int, default=50, help='number of timed batches')
+    parser.add_argument('--latency-runs', type=int, default=10000,
+                        help='individually timed operations, used for the latency percentiles')
+    parser.add_argument('--alloc-runs', type=int, default=100, help='operations traced with tracemalloc')
+    parser.add_argument('--filter', default='', help='run only benchmarks containing this string')
+    parser.add_argument('--save', help='save results as a JSON baseline to this file')
+    parser.add_argument('--baseline', help='compare results with the JSON baseline from this file')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed throughput regression in percent')
+    parser.add_argument('--memory', type=int, metavar='COUNT',
+                        help='only measure memory retained by COUNT Command and Tag objects')
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        run_memory_benchmark(args.memory)
+        return 0
+
+    results = {}
+    print(f'{"benchmark":<60} {"ops/sec":>12} {"p50 us":>9} {"p99 us":>9} {"alloc B":>9}')
+    for name, fn in build_benchmarks().items():
+        if args.filter not in name:
+            continue
+        result = run_benchmark(fn, args.number, args.repeat, args.alloc_runs, args.latency_runs)
+        results[name] = result
+        print(f'{name:<60} {result["ops_per_sec"]:>12.0f} {result["p50_us"]:>9.2f} {result["p99_us"]:>9.2f} '
+              f'{result["peak_alloc_bytes"]:>9}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'results': results}, file, indent=2)
+        print(f'Baseline saved to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'Throughput regressed by more than {args.threshold}%:')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print(f'No throughput regression above {args.threshold}% compared to {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
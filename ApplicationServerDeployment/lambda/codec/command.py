@@ -4,10 +4,106 @@
 """
 Class for encoding/decoding Sidewalk Sensor Monitoring Demo Application commands.
 """
+import base64
 import json
+from collections.abc import Mapping
 
 from protocol import *
-from tag import Tag
+from tag import Tag, DECODED_KEYS, TAG_TYPES, TLV_SIZE_OPTIMIZED_4B, TLV_STANDARD
+
+
+def _build_header_lookup() -> list:
+    """
+    Precomputes decoding of every possible command header byte.
+    :return:    List indexed by the header byte with (status header included, Id name or None) tuples.
+    """
+    lookup = []
+    for header in range(256):
+        cmd_id = IdByValue.get(((header & 0b111) << 2) | ((header >> 5) & 0b11))
+        lookup.append((bool(header & 0x80), cmd_id.name if cmd_id is not None else None))
+    return lookup
+
+
+def _build_tlv_lookup() -> list:
+    """
+    Precomputes decoding of every possible TLV header byte.
+    :return:    List indexed by the TLV header byte with (format, type, value length) tuples.
+                Value length is None for the STANDARD format (length is given by the next byte).
+    """
+    lookup = []
+    for tlv_hdr in range(256):
+        frmt = tlv_hdr >> 6
+        if frmt == TLV_STANDARD:
+            length = None
+        else:
+            length = 4 if frmt == TLV_SIZE_OPTIMIZED_4B else frmt + 1
+        lookup.append((frmt, tlv_hdr & 0x3F, length))
+    return lookup
+
+
+HEADER_LOOKUP = _build_header_lookup()
+TLV_LOOKUP = _build_tlv_lookup()
+
+
+class LazyDecodedCommand(Mapping):
+    """
+    Read-only dict-like view of the decoded command, which decodes tag values only when they are accessed.
+    Decoded values are cached, so every tag is decoded at most once.
+
+    Attributes
+    ----------
+        _payload: bytes
+            Raw payload (sequence of TLVs).
+        _tags: [tuple]
+            Tag offsets (format, type, value start, value end, value length), see: Command.scan_tags.
+        _key_to_tag: dict
+            Maps keys of the decoded command to indices of the tags, which carry them.
+        _decoded: dict
+            Already decoded values.
+    """
+    __slots__ = ('_payload', '_tags', '_key_to_tag', '_decoded')
+
+    def __init__(self, payload: bytes, tags: [tuple], cmd_id: str):
+        self._payload = payload
+        self._tags = tags
+        self._key_to_tag = {}
+        for idx, (_, type, _, _, _) in enumerate(tags):
+            for key in DECODED_KEYS[type]:
+                self._key_to_tag[key] = idx
+        self._key_to_tag.pop('id', None)
+        self._decoded = {'id': cmd_id}
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            self._decode_tag(self._key_to_tag[key])
+        return self._decoded[key]
+
+    def __contains__(self, key):
+        return key == 'id' or key in self._key_to_tag
+
+    def __iter__(self):
+        yield from self._key_to_tag
+        yield 'id'
+
+    def __len__(self):
+        return len(self._key_to_tag) + 1
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self) -> dict:
+        """
+        Decodes all remaining tags.
+        :return:    Dict, same as Command.decoded_cmd of the eagerly decoded command.
+        """
+        return {key: self[key] for key in self}
+
+    def _decode_tag(self, idx: int):
+        frmt, type, val_start, val_end, val_len = self._tags[idx]
+        decoded = Tag().decode(type, frmt, self._payload[val_start:val_end], val_len).json
+        for key, val in decoded.items():
+            if self._key_to_tag.get(key) == idx:
+                self._decoded[key] = val
 
 
 class Command:
@@ -17,6 +113,9 @@ class Command:
      - decode hexadecimal byte_stream into the command (for UL messages)
      - encode command into hexadecimal byte_stream (for DL messages)
 
+    Command fields are kept as integers and bytes. Binary string views of the fields
+    (status_hdr_ind, op_code, cls, id, status_code, raw_payload) are computed on demand.
+
     Attributes
     ----------
         status_hdr_ind: str
@@ -34,48 +133,57 @@ class Command:
         payload: [Tag]
             List of Tag objects.
     """
+    __slots__ = ('_status_hdr_ind', '_op_code', '_cls', '_id', '_status_code', '_raw_payload', '_tags', '_payload',
+                 'decoded_cmd')
+
     def __init__(self):
-        self.status_hdr_ind = ''
-        self.op_code = ''
-        self.cls = ''
-        self.id = ''
-        self.status_code = ''
-        self.raw_payload = ''
-        self.payload = []
+        self._status_hdr_ind = None
+        self._op_code = None
+        self._cls = None
+        self._id = None
+        self._status_code = None
+        self._raw_payload = b''
+        self._tags = []
+        self._payload = []
         self.decoded_cmd = {}
 
-    def decode(self, byte_stream):
+    def decode(self, byte_stream, lazy: bool = False):
         """
         Decodes byte_stream into human-readable representation of the command.
 
-        :param byte_stream:     Hexadecimal byte stream.
+        :param byte_stream:     Hexadecimal string or bytes-like object.
+        :param lazy:            If True, only header and tag offsets are parsed.
+                                Tag values are decoded when accessed through decoded_cmd or payload.
         :return:                Command object.
         """
-        raw_cmd = Command.hex_to_bin(byte_stream)
-
-        # decode binary stream
-        status_hdr_ind_bool = True if raw_cmd[0] == '1' else False
-        self.status_hdr_ind = raw_cmd[0]
-        self.op_code = raw_cmd[1:2 + 1]
-        self.cls = raw_cmd[3:4 + 1]
-        self.id = bin((int(raw_cmd[5:7 + 1], 2) << 2) | int(self.op_code, 2))[2:]
-        padding = 3 - len(self.id)
-        if padding:
-            self.id = padding * '0' + self.id
-        self.status_code = raw_cmd[8:16] if status_hdr_ind_bool else ''
-        self.raw_payload = raw_cmd[16:] if status_hdr_ind_bool else raw_cmd[8:]
-        self.payload = []
-        try:
-            if len(self.raw_payload) > 0:
-                extract = Command.extract_tags(self.raw_payload)
-                while True:
-                    self.payload.append((next(extract)))
-        except StopIteration:
-            pass
+        raw_cmd = Command.to_bytes_like(byte_stream)
+        if not raw_cmd:
+            raise ValueError('Empty byte stream')
+
+        # decode header
+        header = raw_cmd[0]
+        self._status_hdr_ind = bool(header & 0x80)
+        self._op_code = (header >> 5) & 0b11
+        self._cls = (header >> 3) & 0b11
+        self._id = ((header & 0b111) << 2) | self._op_code
+        if self._status_hdr_ind:
+            self._status_code = raw_cmd[1] if len(raw_cmd) > 1 else None
+            self._raw_payload = bytes(raw_cmd[2:])
+        else:
+            self._status_code = None
+            self._raw_payload = bytes(raw_cmd[1:])
+        self._tags = Command.scan_tags(self._raw_payload)
+        self._payload = None
 
         # create human-readable dict
-        self.decoded_cmd = self.combine_tags(self.payload)
-        self.decoded_cmd['id'] = Id(self.id).name
+        cmd_id = IdByValue.get(self._id)
+        if cmd_id is None:
+            raise ValueError(f'{self.id!r} is not a valid Id')
+        if lazy:
+            self.decoded_cmd = LazyDecodedCommand(self._raw_payload, self._tags, cmd_id.name)
+        else:
+            self.decoded_cmd = self.combine_tags(self.payload)
+            self.decoded_cmd['id'] = cmd_id.name
 
         return self
 
@@ -91,51 +199,93 @@ class Command:
         :param payload:         List of Tag objects.
         :return:                Command object.
         """
-        self.status_hdr_ind = '1' if status_hdr_ind else '0'
-        self.op_code = op_code.value
-        self.cls = cls.value
-        self.id = id.value
-        self.status_code = status_code
+        self._status_hdr_ind = bool(status_hdr_ind)
+        self._op_code = int(op_code.value, 2)
+        self._cls = int(cls.value, 2)
+        self._id = int(id.value, 2)
+        self._status_code = int(status_code, 2) if status_code else None
         payload = payload or []
-        self.payload = payload
-        self.raw_payload = ''.join([tag.bin_repr() for tag in payload])
+        self._tags = []
+        self._payload = payload
+        self._raw_payload = b''.join([tag.to_bytes() for tag in payload])
         self.decoded_cmd = self.combine_tags(self.payload)
-        self.decoded_cmd['id'] = Id(self.id).name
+        self.decoded_cmd['id'] = id.name
 
         return self
 
+    @property
+    def payload(self) -> [Tag]:
+        if self._payload is None:
+            self._payload = [
+                Tag().decode(type, frmt, self._raw_payload[val_start:val_end], val_len)
+                for frmt, type, val_start, val_end, val_len in self._tags
+            ]
+        return self._payload
+
+    @property
+    def status_hdr_ind(self) -> str:
+        if self._status_hdr_ind is None:
+            return ''
+        return '1' if self._status_hdr_ind else '0'
+
+    @property
+    def op_code(self) -> str:
+        return '' if self._op_code is None else format(self._op_code, '02b')
+
+    @property
+    def cls(self) -> str:
+        return '' if self._cls is None else format(self._cls, '02b')
+
+    @property
+    def id(self) -> str:
+        return '' if self._id is None else format(self._id, '03b')
+
+    @property
+    def status_code(self) -> str:
+        return '' if self._status_code is None else format(self._status_code, '08b')
+
+    @property
+    def raw_payload(self) -> str:
+        return ''.join([format(byte, '08b') for byte in self._raw_payload])
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns byte representation of the command.
+        :return:    Bytes.
+        """
+        if self._id is None:
+            return b''
+        # Id value is (class cmd id << 2) | op code, see: IdToCmdIdValueMap
+        header = (self._status_hdr_ind << 7) | (self._op_code << 5) | (self._cls << 3) | (self._id >> 2)
+        if self._status_code is None:
+            return bytes([header]) + self._raw_payload
+        return bytes([header, self._status_code]) + self._raw_payload
+
     def bin_repr(self, separate_bytes=False):
         """
         Returns binary representation of the command.
         :param separate_bytes:  If true, inserts space, which separates bytes.
         :return:                Binary string.
         """
-        cmd_id = '' if self.id == '' else IdToCmdIdValueMap[Id(self.id)]
-        bin_str = self.status_hdr_ind + self.op_code + self.cls + cmd_id + self.status_code + self.raw_payload
-        if separate_bytes:
-            bin_str = ' '.join(bin_str[i:i + 8] for i in range(0, len(bin_str), 8))
-        return bin_str
+        bytes_str = [format(byte, '08b') for byte in self.to_bytes()]
+        return (' ' if separate_bytes else '').join(bytes_str)
 
     def hex_repr(self):
         """
         Returns hexadecimal representation of the command.
         :return:    Hexadecimal string.
         """
-        try:
-            return Command.bin_to_hex(self.bin_repr()).upper()
-        except ValueError:
-            return ''
+        return self.to_bytes().hex().upper()
 
     def json_repr(self):
         """
         Returns json representation of the command.
         :return:    Human-readable json.
         """
-        return json.dumps(self.decoded_cmd)
+        return json.dumps(dict(self.decoded_cmd))
 
     def __repr__(self):
-        bin_str = self.bin_repr()
-        return f'Command(\'{Command.bin_to_hex(bin_str)}\')'
+        return f'Command(\'{self.to_bytes().hex()}\')'
 
     def __str__(self):
         payload = [(tag.dict_repr()) for tag in self.payload]
@@ -146,10 +296,71 @@ class Command:
             'id': Id(self.id).name,
             'status_code': self.status_code,
             'payload': payload,
-            'decoded': self.decoded_cmd
+            'decoded': dict(self.decoded_cmd)
         }
         return json.dumps(command)
 
+    @staticmethod
+    def decode_many(payloads, encoding: str = 'hex', raise_errors: bool = True) -> [dict]:
+        """
+        Decodes many payloads into human-readable dicts in one call.
+        Neither Command nor Tag objects are created per payload; a single Tag is reused for all tag values.
+
+        :param payloads:        Iterable of payloads. Strings are decoded according to encoding,
+                                bytes-like objects are treated as raw command bytes.
+        :param encoding:        'hex' or 'base64' ('base64' is the PayloadData format of sidewalk/app_data uplinks,
+                                i.e. base64-encoded hexadecimal string).
+        :param raise_errors:    If False, payloads, which can not be decoded, are reported as None.
+        :return:                List of dicts, same as Command.decoded_cmd, in the order of payloads.
+        """
+        if encoding not in ('hex', 'base64'):
+            raise ValueError(f'Unsupported encoding: {encoding}')
+        tag = Tag()
+        decoded = []
+        for payload in payloads:
+            try:
+                if isinstance(payload, str) and encoding == 'base64':
+                    payload = base64.b64decode(payload).decode('ascii')
+                decoded.append(Command._decode_to_dict(Command.to_bytes_like(payload), tag))
+            except (ValueError, IndexError, KeyError, TypeError):
+                if raise_errors:
+                    raise
+                decoded.append(None)
+        return decoded
+
+    @staticmethod
+    def _decode_to_dict(raw_cmd, tag: Tag) -> dict:
+        """
+        Decodes raw command bytes straight into human-readable dict, using precomputed lookup tables.
+        :param raw_cmd:     Bytes-like object.
+        :param tag:         Tag object reused for decoding of the tag values.
+        :return:            Dict, same as Command.decoded_cmd.
+        """
+        if not raw_cmd:
+            raise ValueError('Empty byte stream')
+        status_hdr_ind, cmd_id = HEADER_LOOKUP[raw_cmd[0]]
+        if cmd_id is None:
+            raise ValueError(f'{raw_cmd[0]:#04x} is not a valid command header')
+
+        decoded_cmd = {}
+        for frmt, type, val_start, val_end, val_len in Command.scan_tags(raw_cmd, 2 if status_hdr_ind else 1):
+            decoded_cmd.update(tag.decode(type, frmt, bytes(raw_cmd[val_start:val_end]), val_len).json)
+        decoded_cmd['id'] = cmd_id
+        return decoded_cmd
+
+    @staticmethod
+    def to_bytes_like(byte_stream):
+        """
+        Converts hexadecimal string into bytes. Bytes-like objects are returned unchanged.
+        :param byte_stream:     Hexadecimal string or bytes-like object.
+        :return:                Bytes-like object.
+        """
+        if isinstance(byte_stream, str):
+            return bytes.fromhex(byte_stream)
+        if isinstance(byte_stream, (bytes, bytearray, memoryview)):
+            return byte_stream
+        raise TypeError(f'Unsupported byte_stream type: {type(byte_stream).__name__}')
+
     @staticmethod
     def hex_to_bin(hex_str: str) -> str:
         """
@@ -171,41 +382,46 @@ class Command:
         return hex(int(bin_str, 2))[2:]
 
     @staticmethod
-    def extract_tags(bin_payload: str) -> Tag:
+    def scan_tags(payload, idx: int = 0) -> [tuple]:
         """
-        Generator, which extracts tags from the given binary string, one by one.
-        :param bin_payload:     Binary string, which represents payload.
-        :return:                Generator, which produces Tag objects.
+        Finds tags in the given payload, without decoding their values.
+        :param payload:     Bytes-like object, which represents payload.
+        :param idx:         Index of the first tag in the payload.
+        :return:            List of (format, type, value start, value end, value length) tuples.
+                            Value length is None unless TLV format is STANDARD.
         """
-        exhausted = False
-        while not exhausted:
-            format = bin_payload[0:1 + 1]
-            type = bin_payload[2:7 + 1]
-            frmt = TlvFormat(format)
+        tags = []
+        payload_len = len(payload)
+        while idx < payload_len:
+            frmt, type, length = TLV_LOOKUP[payload[idx]]
+            if TAG_TYPES[type] is None:
+                raise ValueError(f'{type:06b} is not a valid TagType')
 
-            if frmt == TlvFormat.STANDARD:
+            if length is None:
                 # 11 (STANDARD) | 6b key | 1B len | val
-                val_len = bin_payload[8:15 + 1]
-                length = int(val_len, 2)
-                val_start_idx = 16
+                if idx + 1 >= payload_len:
+                    raise ValueError('Missing length of the STANDARD TLV')
+                val_len = length = payload[idx + 1]
+                val_start_idx = idx + 2
             else:
                 # __ (SIZE_OPTIMIZED) | 6b key | val
-                val_len = ''
-                if frmt == TlvFormat.SIZE_OPTIMIZED_4B:
-                    length = 4
-                else:
-                    length = int(frmt.value, 2) + 1
-                val_start_idx = 8
-
-            val_end_idx = val_start_idx + length * 8
-            val = bin_payload[val_start_idx:val_end_idx]
-            bin_payload = bin_payload[val_end_idx:]
+                val_len = None
+                val_start_idx = idx + 1
 
-            if not bin_payload:
-                exhausted = True
+            idx = val_start_idx + length
+            tags.append((frmt, type, val_start_idx, min(idx, payload_len), val_len))
+        return tags
 
+    @staticmethod
+    def extract_tags(payload: bytes) -> Tag:
+        """
+        Generator, which extracts tags from the given payload, one by one.
+        :param payload:     Bytes-like object, which represents payload.
+        :return:            Generator, which produces Tag objects.
+        """
+        for frmt, type, val_start, val_end, val_len in Command.scan_tags(payload):
             tag = Tag()
-            tag.decode(type, format, val, val_len)
+            tag.decode(type, frmt, bytes(payload[val_start:val_end]), val_len)
             yield tag
 
     @staticmethod
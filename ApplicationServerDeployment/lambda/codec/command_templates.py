@@ -0,0 +1,106 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Precompiled byte templates for Sidewalk Sensor Monitoring Demo Application downlink commands.
+
+Command headers are constant, so they are encoded once per (status header, OpCode, Class, Id, status code).
+Payload-bearing commands are memoized in a bounded LRU cache, only the CURRENT_GPS_TIME_IN_SECS tag
+is appended for every message.
+"""
+from functools import lru_cache
+
+from command import Command
+from protocol import *
+from tag import Tag
+
+ENCODE_CACHE_SIZE = 256
+STATUS_CODE_OK = '00000000'
+GPS_TIME_TAG_HEADER = Tag().encode({TagType.CURRENT_GPS_TIME_IN_SECS: 0}).to_bytes()[:1]
+
+
+@lru_cache(maxsize=None)
+def header_template(status_hdr_ind: bool, op_code: OpCode, cls: Class, id: Id, status_code: str = '') -> bytes:
+    """
+    Returns encoded command header (with status code, if included).
+
+    :param status_hdr_ind:  Is status header included (bool).
+    :param op_code:         OpCode enum.
+    :param cls:             Class enum.
+    :param id:              Id enum.
+    :param status_code:     Status code str.
+    :return:                Header bytes.
+    """
+    return Command().encode(status_hdr_ind, op_code, cls, id, status_code).to_bytes()
+
+
+@lru_cache(maxsize=ENCODE_CACHE_SIZE)
+def _indices_command_template(status_hdr_ind: bool, op_code: OpCode, id: Id, status_code: str,
+                              tag_type: TagType, indices: tuple) -> bytes:
+    """
+    Returns encoded command, which carries a single tag with a list of indices.
+    """
+    header = header_template(status_hdr_ind, op_code, Class.DEMO_APP_CLASS, id, status_code)
+    return header + Tag().encode({tag_type: indices}).to_bytes()
+
+
+def encode_cap_discovery_resp() -> bytes:
+    """
+    Encodes DEMO_APP_CAP_DISCOVERY_RESP command.
+
+    :return:    Command bytes.
+    """
+    return header_template(True, OpCode.MSG_TYPE_RESP, Class.DEMO_APP_CLASS, Id.DEMO_APP_CAP_DISCOVERY_RESP,
+                           STATUS_CODE_OK)
+
+
+def encode_button_pressed_resp(button_press: [int]) -> bytes:
+    """
+    Encodes DEMO_APP_ACTION_RESP command, which acknowledges pressed buttons.
+
+    :param button_press:    List of indices of the pressed buttons.
+    :return:                Command bytes.
+    """
+    return _indices_command_template(True, OpCode.MSG_TYPE_RESP, Id.DEMO_APP_ACTION_RESP, STATUS_CODE_OK,
+                                     TagType.BUTTON_PRESSED_RESP, tuple(button_press))
+
+
+def encode_led_action_req(tag_type: TagType, led_id: [int], gps_time: int) -> bytes:
+    """
+    Encodes DEMO_APP_ACTION_REQ command, which turns LEDs on or off.
+
+    :param tag_type:    TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:      List of indices of the LEDs.
+    :param gps_time:    Current GPS time in seconds.
+    :return:            Command bytes.
+    """
+    prefix = _indices_command_template(False, OpCode.MSG_TYPE_WRITE, Id.DEMO_APP_ACTION_REQ, '',
+                                       tag_type, tuple(led_id))
+    return prefix + GPS_TIME_TAG_HEADER + int(gps_time).to_bytes(4, 'big')
+
+
+def encode_led_state_req(led_on: [int], led_off: [int], gps_time: int) -> bytes:
+    """
+    Encodes DEMO_APP_ACTION_REQ command, which sets the net state of the LEDs: it carries the LED_ON tag
+    and the LED_OFF tag in a single message (empty tags are skipped).
+
+    :param led_on:      List of indices of the LEDs to be turned on.
+    :param led_off:     List of indices of the LEDs to be turned off.
+    :param gps_time:    Current GPS time in seconds.
+    :return:            Command bytes.
+    """
+    if not led_on or not led_off:
+        return encode_led_action_req(TagType.LED_ON if led_on else TagType.LED_OFF, led_on or led_off, gps_time)
+    prefix = _indices_command_template(False, OpCode.MSG_TYPE_WRITE, Id.DEMO_APP_ACTION_REQ, '',
+                                       TagType.LED_ON, tuple(led_on))
+    led_off_tag = Tag().encode({TagType.LED_OFF: tuple(led_off)}).to_bytes()
+    return prefix + led_off_tag + GPS_TIME_TAG_HEADER + int(gps_time).to_bytes(4, 'big')
+
+
+def cache_info():
+    """
+    Returns statistics of the payload-bearing commands cache.
+
+    :return:    functools.lru_cache statistics.
+    """
+    return _indices_command_template.cache_info()
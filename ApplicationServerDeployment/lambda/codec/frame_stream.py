@@ -0,0 +1,268 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Streaming decoder for captured Sidewalk Sensor Monitoring Demo Application uplinks.
+
+Reads a file-like object (or an iterable of byte chunks) incrementally and yields decoded commands one by one,
+so that captures, which do not fit into memory, can be processed. Malformed frames are reported
+and skipped, they do not abort the stream.
+
+Supported framings:
+ - 'length_prefixed' - binary stream of frames, each preceded by its big-endian length
+ - 'lines'           - text stream with one payload per line (hex, base64 or JSON uplink record)
+ - 'json'            - text stream of JSON uplink records, concatenated or separated by whitespace
+                       (e.g. Kinesis Data Firehose export of the sidewalk/app_data topic)
+"""
+import base64
+import json
+import re
+from collections import namedtuple
+
+from command import Command
+from tag import Tag
+
+CHUNK_SIZE = 64 * 1024
+MAX_FRAME_SIZE = 64 * 1024
+
+"""
+Single frame read from the stream.
+
+index:                  Index of the frame in the stream.
+offset:                 Offset of the frame in the stream (in bytes).
+wireless_device_id:     Id of the wireless device (only for JSON uplink records).
+decoded:                Dict, same as Command.decoded_cmd. None if frame could not be decoded.
+error:                  Description of the problem, if frame could not be decoded.
+"""
+StreamFrame = namedtuple('StreamFrame', ['index', 'offset', 'wireless_device_id', 'decoded', 'error'])
+
+_RECORD_BOUNDARY = re.compile(r'}\s*{')
+_WHITESPACE = ' \t\r\n'
+
+
+def decode_stream(source, framing: str = 'length_prefixed', **kwargs):
+    """
+    Generator, which decodes frames from the given source.
+
+    :param source:      File-like object opened in binary mode, bytes or iterable of byte chunks.
+    :param framing:     'length_prefixed', 'lines' or 'json'.
+    :param kwargs:      Arguments of the framing specific generator.
+    :return:            Generator, which produces StreamFrame objects.
+    """
+    generators = {
+        'length_prefixed': iter_length_prefixed,
+        'lines': iter_lines,
+        'json': iter_json_records
+    }
+    if framing not in generators:
+        raise ValueError(f'Unsupported framing: {framing}')
+    return generators[framing](source, **kwargs)
+
+
+def iter_length_prefixed(source, prefix_size: int = 2, max_frame_size: int = MAX_FRAME_SIZE,
+                         chunk_size: int = CHUNK_SIZE):
+    """
+    Generator, which decodes binary frames, each preceded by its big-endian length.
+
+    :param source:          File-like object opened in binary mode, bytes or iterable of byte chunks.
+    :param prefix_size:     Size of the length prefix in bytes.
+    :param max_frame_size:  Frames longer than this are reported as malformed and skipped without being buffered.
+    :param chunk_size:      Number of bytes read at once.
+    :return:                Generator, which produces StreamFrame objects.
+    """
+    tag = Tag()
+    buffer = bytearray()
+    offset = 0
+    index = 0
+    skipping = 0  # bytes of the oversized frame, which are still to be dropped
+    for chunk in _iter_chunks(source, chunk_size):
+        if skipping:
+            dropped = min(skipping, len(chunk))
+            skipping -= dropped
+            offset += dropped
+            chunk = chunk[dropped:]
+        buffer += chunk
+        pos = 0
+        while len(buffer) - pos >= prefix_size:
+            frame_len = int.from_bytes(buffer[pos:pos + prefix_size], 'big')
+            if frame_len > max_frame_size:
+                yield StreamFrame(index, offset + pos, None, None,
+                                  f'Frame exceeds {max_frame_size} bytes ({frame_len} bytes)')
+                index += 1
+                pos += prefix_size
+                dropped = min(frame_len, len(buffer) - pos)
+                pos += dropped
+                skipping = frame_len - dropped
+                continue
+            frame_end = pos + prefix_size + frame_len
+            if frame_end > len(buffer):
+                break
+            frame = bytes(buffer[pos + prefix_size:frame_end])
+            yield _decode_frame(index, offset + pos, None, frame, tag)
+            index += 1
+            pos = frame_end
+        del buffer[:pos]
+        offset += pos
+
+    if buffer:
+        yield StreamFrame(index, offset, None, None, f'Truncated frame ({len(buffer)} bytes left in the stream)')
+
+
+def iter_lines(source, encoding: str = 'hex', max_line_size: int = MAX_FRAME_SIZE, chunk_size: int = CHUNK_SIZE):
+    """
+    Generator, which decodes text lines. Each line holds a single payload (hex or base64, see: Command.decode_many)
+    or a JSON uplink record. Empty lines are skipped.
+
+    :param source:          File-like object opened in binary mode, bytes or iterable of byte chunks.
+    :param encoding:        'hex' or 'base64'.
+    :param max_line_size:   Lines longer than this are reported as malformed.
+    :param chunk_size:      Number of bytes read at once.
+    :return:                Generator, which produces StreamFrame objects.
+    """
+    if encoding not in ('hex', 'base64'):
+        raise ValueError(f'Unsupported encoding: {encoding}')
+    tag = Tag()
+    buffer = bytearray()
+    offset = 0
+    index = 0
+    skipping = False
+    for chunk in _iter_chunks(source, chunk_size):
+        buffer += chunk
+        pos = 0
+        while True:
+            line_end = buffer.find(b'\n', pos)
+            if line_end < 0:
+                break
+            line = bytes(buffer[pos:line_end]).strip()
+            if skipping:
+                skipping = False
+            elif line:
+                yield _decode_line(index, offset + pos, line, encoding, max_line_size, tag)
+                index += 1
+            pos = line_end + 1
+        del buffer[:pos]
+        offset += pos
+        if len(buffer) > max_line_size and not skipping:
+            yield StreamFrame(index, offset, None, None, f'Line exceeds {max_line_size} bytes')
+            index += 1
+            skipping = True
+        if skipping:
+            offset += len(buffer)
+            buffer.clear()
+
+    line = bytes(buffer).strip()
+    if line and not skipping:
+        yield _decode_line(index, offset, line, encoding, max_line_size, tag)
+
+
+def iter_json_records(source, max_record_size: int = MAX_FRAME_SIZE, chunk_size: int = CHUNK_SIZE):
+    """
+    Generator, which decodes JSON uplink records. Records may be concatenated or separated by whitespace.
+    Record is either the sidewalk/app_data message ({"WirelessDeviceId": ..., "PayloadData": ...})
+    or the event of the uplink lambda ({"uplink": {...}}).
+
+    :param source:              File-like object opened in binary mode, bytes or iterable of byte chunks.
+    :param max_record_size:     Records longer than this are reported as malformed.
+    :param chunk_size:          Number of bytes read at once.
+    :return:                    Generator, which produces StreamFrame objects.
+    """
+    tag = Tag()
+    decoder = json.JSONDecoder()
+    buffer = bytearray()
+    offset = 0
+    index = 0
+    chunks = _iter_chunks(source, chunk_size)
+    eof = False
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer += chunk
+
+        # latin-1 maps every byte to a single character, so text indices are equal to buffer offsets
+        text = buffer.decode('latin-1')
+        pos = 0
+        while True:
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(text):
+                break
+            try:
+                record, end = decoder.raw_decode(text, pos)
+            except ValueError as err:
+                if not eof and len(text) - pos <= max_record_size:
+                    break  # record is not complete yet, read more data
+                boundary = _RECORD_BOUNDARY.search(text, pos)
+                yield StreamFrame(index, offset + pos, None, None, f'Malformed JSON record: {err}')
+                index += 1
+                pos = boundary.start() + 1 if boundary else len(text)
+                continue
+            yield _decode_record(index, offset + pos, record, tag)
+            index += 1
+            pos = end
+
+        del buffer[:pos]
+        offset += pos
+
+
+def _iter_chunks(source, chunk_size: int):
+    """
+    Generator, which reads the source in chunks.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+    else:
+        for chunk in source:
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def _decode_frame(index: int, offset: int, wireless_device_id, frame: bytes, tag: Tag) -> StreamFrame:
+    """
+    Decodes raw command bytes into StreamFrame.
+    """
+    try:
+        decoded = Command._decode_to_dict(frame, tag)
+    except (ValueError, IndexError, KeyError, TypeError) as err:
+        return StreamFrame(index, offset, wireless_device_id, None, f'Malformed frame {frame.hex()}: {err}')
+    return StreamFrame(index, offset, wireless_device_id, decoded, None)
+
+
+def _decode_line(index: int, offset: int, line: bytes, encoding: str, max_line_size: int, tag: Tag) -> StreamFrame:
+    """
+    Decodes single text line into StreamFrame.
+    """
+    if len(line) > max_line_size:
+        return StreamFrame(index, offset, None, None, f'Line exceeds {max_line_size} bytes')
+    try:
+        if line.startswith(b'{'):
+            return _decode_record(index, offset, json.loads(line), tag)
+        text = line.decode('ascii')
+        if encoding == 'base64':
+            text = base64.b64decode(text).decode('ascii')
+        frame = bytes.fromhex(text)
+    except ValueError as err:
+        return StreamFrame(index, offset, None, None, f'Malformed line: {err}')
+    return _decode_frame(index, offset, None, frame, tag)
+
+
+def _decode_record(index: int, offset: int, record, tag: Tag) -> StreamFrame:
+    """
+    Decodes JSON uplink record into StreamFrame.
+    """
+    if not isinstance(record, dict):
+        return StreamFrame(index, offset, None, None, 'Malformed JSON record: object expected')
+    uplink = record.get('uplink', record)
+    wireless_device_id = uplink.get('WirelessDeviceId') if isinstance(uplink, dict) else None
+    try:
+        payload_data = uplink['PayloadData']
+        frame = bytes.fromhex(base64.b64decode(payload_data).decode('ascii'))
+    except (ValueError, KeyError, TypeError) as err:
+        return StreamFrame(index, offset, wireless_device_id, None, f'Malformed JSON record: {err!r}')
+    return _decode_frame(index, offset, wireless_device_id, frame, tag)
@@ -5,6 +5,7 @@
 Sidewalk Sensor Monitoring Application - protocol constants.
 """
 
+from collections import namedtuple
 from enum import Enum
 
 
@@ -90,6 +91,64 @@ class SensorUnits(Enum):
     FAHRENHEIT = '1'
 
 
+class TagKind(Enum):
+    """
+    Represents kinds of the tag values.
+    """
+    U8_LIST = 'u8_list'     # list of unsigned bytes (e.g. indices of LEDs or buttons)
+    UINT = 'uint'           # big-endian unsigned integer
+    ENUM = 'enum'           # single byte, which represents enum member
+    BITFIELD = 'bitfield'   # bit fields of the big-endian unsigned integer
+
+
+"""
+Describes a single tag type.
+
+kind:       TagKind of the value.
+keys:       Keys of the human-readable dict produced by the decoder (one per field for BITFIELD).
+            Empty for tags, which are never received in uplinks.
+encode:     True if tag is sent in downlinks.
+size:       Size of the encoded UINT value (in bytes).
+enum:       Enum of the ENUM value.
+fields:     Tuple of BitField objects of the BITFIELD value, in the order of keys.
+"""
+TagSpec = namedtuple('TagSpec', ['kind', 'keys', 'encode', 'size', 'enum', 'fields'],
+                     defaults=(False, None, None, None))
+
+"""
+Describes a single field of the BITFIELD value.
+
+shift:      Position of the least significant bit of the field.
+width:      Width of the field (in bits).
+enum:       Enum of the field value, None for boolean flags.
+"""
+BitField = namedtuple('BitField', ['shift', 'width', 'enum'])
+
+
+"""
+Protocol schema: describes value of every tag type.
+Codec dispatch tables are built from the schema (see: tag.py), so adding a new tag type
+only requires new TagType member and its TagSpec.
+"""
+TAG_SCHEMA = {
+    TagType.NUMBER_OF_BUTTONS: TagSpec(TagKind.U8_LIST, ('buttons',)),
+    TagType.NUMBER_OF_LEDS: TagSpec(TagKind.U8_LIST, ('leds',)),
+    TagType.LED_ON: TagSpec(TagKind.U8_LIST, (), encode=True),
+    TagType.LED_OFF: TagSpec(TagKind.U8_LIST, (), encode=True),
+    TagType.BUTTON_PRESS: TagSpec(TagKind.U8_LIST, ('button_press',)),
+    TagType.TEMP_SENSOR_DATA: TagSpec(TagKind.UINT, ('sensor_data',)),
+    TagType.CURRENT_GPS_TIME_IN_SECS: TagSpec(TagKind.UINT, ('gps_time',), encode=True, size=4),
+    TagType.DL_LATENCY_IN_SECS: TagSpec(TagKind.UINT, ('dl_latency',)),
+    TagType.LED_ON_RESP: TagSpec(TagKind.U8_LIST, ('led_on_resp',)),
+    TagType.LED_OFF_RESP: TagSpec(TagKind.U8_LIST, ('led_off_resp',)),
+    TagType.TEMP_SENSOR_AVAILABLE_AND_UNIT_REPRESENTATION: TagSpec(
+        TagKind.BITFIELD, ('sensor', 'sensor_units'),
+        fields=(BitField(shift=0, width=1, enum=None), BitField(shift=1, width=1, enum=SensorUnits))),
+    TagType.LINK_TYPE: TagSpec(TagKind.ENUM, ('link_type',), enum=LinkType),
+    TagType.BUTTON_PRESSED_RESP: TagSpec(TagKind.U8_LIST, (), encode=True)
+}
+
+
 """
 Maps Class Cmd Ids to Id subsets.
 """
@@ -100,3 +159,10 @@ IdToCmdIdValueMap = {
     Id.DEMO_APP_ACTION_RESP: ClassCmdId.DEMO_APP_CLASS_CMD_ACTION.value,
     Id.DEMO_APP_ACTION_NOTIFICATION: ClassCmdId.DEMO_APP_CLASS_CMD_ACTION.value
 }
+
+
+"""
+Maps integer values of the protocol fields to their enums.
+Used by the bytes-native codec to avoid building binary strings for every lookup.
+"""
+IdByValue = {int(item.value, 2): item for item in Id}
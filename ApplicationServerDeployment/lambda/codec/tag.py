@@ -5,7 +5,114 @@
 Class for encoding/decoding Sidewalk Sensor Monitoring Demo Application payload tags.
 """
 from protocol import *
-from textwrap import wrap
+
+TLV_SIZE_OPTIMIZED_1B = int(TlvFormat.SIZE_OPTIMIZED_1B.value, 2)
+TLV_SIZE_OPTIMIZED_2B = int(TlvFormat.SIZE_OPTIMIZED_2B.value, 2)
+TLV_SIZE_OPTIMIZED_4B = int(TlvFormat.SIZE_OPTIMIZED_4B.value, 2)
+TLV_STANDARD = int(TlvFormat.STANDARD.value, 2)
+
+TAG_TYPES_COUNT = 64
+
+
+# -------------------------------------------------
+# Dispatch tables built from the protocol schema
+# -------------------------------------------------
+def _enum_names(enum) -> dict:
+    return {int(item.value, 2): item.name for item in enum}
+
+
+def _build_decoder(tag_type: TagType, spec: TagSpec):
+    """
+    Builds decoder of the tag value.
+
+    :param tag_type:    TagType enum.
+    :param spec:        TagSpec of the tag type.
+    :return:            Function, which takes tag value (bytes) and returns human-readable dict.
+                        None if tag is never received in uplinks.
+    """
+    if not spec.keys:
+        return None
+
+    if spec.kind == TagKind.U8_LIST:
+        key, = spec.keys
+        return lambda val: {key: list(val)}
+
+    if spec.kind == TagKind.UINT:
+        key, = spec.keys
+        return lambda val: {key: int.from_bytes(val, 'big')}
+
+    if spec.kind == TagKind.ENUM:
+        key, = spec.keys
+        names = _enum_names(spec.enum)
+        enum_name = spec.enum.__name__
+
+        def decode_enum(val: bytes) -> dict:
+            name = names.get(val[0]) if len(val) == 1 else None
+            if name is None:
+                raise ValueError(f'{"".join([format(byte, "08b") for byte in val])!r} is not a valid {enum_name}')
+            return {key: name}
+        return decode_enum
+
+    if spec.kind == TagKind.BITFIELD:
+        fields = []
+        for key, field in zip(spec.keys, spec.fields):
+            names = None if field.enum is None else _enum_names(field.enum)
+            fields.append((key, field.shift, (1 << field.width) - 1, names))
+
+        def decode_bitfield(val: bytes) -> dict:
+            if not val:
+                raise ValueError(f'Empty {tag_type.name} value')
+            raw = int.from_bytes(val, 'big')
+            decoded = {}
+            for key, shift, mask, names in fields:
+                field_val = (raw >> shift) & mask
+                decoded[key] = bool(field_val) if names is None else names[field_val]
+            return decoded
+        return decode_bitfield
+
+    raise ValueError(f'Unsupported kind of {tag_type.name}: {spec.kind}')
+
+
+def _build_encoder(tag_type: TagType, spec: TagSpec):
+    """
+    Builds encoder of the tag value.
+
+    :param tag_type:    TagType enum.
+    :param spec:        TagSpec of the tag type.
+    :return:            Function, which takes value from the json dict and returns tag value (bytes).
+                        None if tag is never sent in downlinks.
+    """
+    if not spec.encode:
+        return None
+    if spec.kind == TagKind.U8_LIST:
+        return lambda indices: bytes(list(indices))
+    if spec.kind == TagKind.UINT:
+        size = spec.size
+        return lambda number: number.to_bytes(size, 'big')
+    raise ValueError(f'Encoding of {tag_type.name} ({spec.kind}) is not supported')
+
+
+def _build_dispatch_tables():
+    """
+    Builds flat tables indexed by the integer value of the tag type.
+
+    :return:    Tuple of lists: TagType enums, decoders, decoded keys, encoders.
+    """
+    tag_types = [None] * TAG_TYPES_COUNT
+    decoders = [None] * TAG_TYPES_COUNT
+    decoded_keys = [()] * TAG_TYPES_COUNT
+    encoders = [None] * TAG_TYPES_COUNT
+    for tag_type in TagType:
+        spec = TAG_SCHEMA[tag_type]
+        value = int(tag_type.value, 2)
+        tag_types[value] = tag_type
+        decoders[value] = _build_decoder(tag_type, spec)
+        decoded_keys[value] = tuple(spec.keys)
+        encoders[value] = _build_encoder(tag_type, spec)
+    return tag_types, decoders, decoded_keys, encoders
+
+
+TAG_TYPES, DECODERS, DECODED_KEYS, ENCODERS = _build_dispatch_tables()
 
 
 class Tag:
@@ -13,6 +120,9 @@ class Tag:
     A class representing Sidewalk Sensor Monitoring Demo Application payload tag.
     Used for tags decoding/encoding.
 
+    Tag fields are kept as integers and bytes. Binary string views of the fields
+    (format, type, val_len, val) are computed on demand.
+
     Attributes
     ----------
         format: str
@@ -26,29 +136,30 @@ class Tag:
         json: dict
             Dictionary, which presents above-mentioned attributes in human-readable format.
     """
+    __slots__ = ('_type', '_format', '_val', '_val_len', 'json')
 
     def __init__(self):
-        self.type = ''
-        self.format = ''
-        self.val = ''
-        self.val_len = ''
+        self._type = None
+        self._format = None
+        self._val = b''
+        self._val_len = None
         self.json = {}
 
-    def decode(self, type: str, format: str, val: str, val_len: str = ''):
+    def decode(self, type: int, format: int, val: bytes, val_len: int = None):
         """
         Decodes Tag object based on input parameters.
 
-        :param type:        TagType (binary string).
-        :param format:      TLV format (binary string).
-        :param val:         Payload value (binary string).
-        :param val_len:     Payload length (if TLV format is STANDARD, binary string).
+        :param type:        TagType (integer value).
+        :param format:      TLV format (integer value).
+        :param val:         Payload value (bytes).
+        :param val_len:     Payload length (if TLV format is STANDARD).
         :return:            Tag object.
 
         """
-        self.type = type
-        self.format = format
-        self.val = val
-        self.val_len = val_len
+        self._type = type
+        self._format = format
+        self._val = val
+        self._val_len = val_len
         self._decode_tag()
         return self
 
@@ -63,6 +174,22 @@ class Tag:
         self._encode_tag()
         return self
 
+    @property
+    def type(self) -> str:
+        return '' if self._type is None else format(self._type, '06b')
+
+    @property
+    def format(self) -> str:
+        return '' if self._format is None else format(self._format, '02b')
+
+    @property
+    def val_len(self) -> str:
+        return '' if self._val_len is None else format(self._val_len, '08b')
+
+    @property
+    def val(self) -> str:
+        return ''.join([format(byte, '08b') for byte in self._val])
+
     def dict_repr(self):
         """
         Returns dict representation of the Tag object.
@@ -83,15 +210,26 @@ class Tag:
         """
         return self.format + self.type + self.val_len + self.val
 
+    def to_bytes(self) -> bytes:
+        """
+        Returns byte representation of the Tag object.
+        :return:    Bytes representing Tag object.
+        """
+        if self._type is None:
+            return b''
+        header = bytes([(self._format << 6) | self._type])
+        if self._val_len is not None:
+            header += bytes([self._val_len])
+        return header + self._val
+
     def _decode_tag(self):
         """
         Decodes tag value into human readable json and stores it in json attribute.
         """
-        fn = Tag.DECODERS_MAP.get(TagType(self.type))
-        try:
-            self.json = fn(self)
-        except TypeError:
-            self.json = {}
+        if TAG_TYPES[self._type] is None:
+            raise ValueError(f'{self.type!r} is not a valid TagType')
+        fn = DECODERS[self._type]
+        self.json = {} if fn is None else fn(self._val)
 
     def _encode_tag(self):
         """
@@ -99,172 +237,25 @@ class Tag:
         and stores them in corresponding attributes.
         """
         tag_type = list(self.json.keys())[0]
-        self.type = TagType(tag_type).value
-        fn = Tag.ENCODERS_MAP.get(tag_type)
+        self._type = int(TagType(tag_type).value, 2)
+        fn = ENCODERS[self._type]
         try:
-            self.val = fn(self)
-            val_len = int(len(self.val) / 8)  # get value size in bytes
+            self._val = fn(self.json[tag_type])
+            val_len = len(self._val)
+            self._val_len = None
             if val_len == 1:
-                self.format = TlvFormat.SIZE_OPTIMIZED_1B.value
-                self.val_len = ''
+                self._format = TLV_SIZE_OPTIMIZED_1B
             elif val_len == 2:
-                self.format = TlvFormat.SIZE_OPTIMIZED_2B.value
-                self.val_len = ''
+                self._format = TLV_SIZE_OPTIMIZED_2B
             elif val_len == 4:
-                self.format = TlvFormat.SIZE_OPTIMIZED_4B.value
-                self.val_len = ''
+                self._format = TLV_SIZE_OPTIMIZED_4B
             else:
-                self.format = TlvFormat.STANDARD.value
-                self.val_len = format(val_len, '08b')
-        except TypeError as e:
-            self.format = ''
-            self.type = ''
-            self.val_len = ''
-            self.val = ''
-
-    # -------------
-    # Tag decoders
-    # -------------
-    def _decode_button_press(self):
-        """
-        Decodes BUTTON_PRESS tag and turns it into a human-readable dict.
-        :return:    Dict representing received "button pressed" event.
-        """
-        return {
-            'button_press': [int(id, 2) for id in wrap(self.val, 8)]
-        }
-
-    def _decode_current_gps_time_in_secs(self):
-        """
-        Decodes CURRENT_GPS_TIME_IN_SECS tag and turns it into a human-readable dict.
-        :return:    Dict representing current gps time.
-        """
-        return {
-            'gps_time': int(self.val, 2)
-        }
-
-    def _decode_downlink_latency_in_secs(self):
-        """
-        Decodes DL_LATENCY_IN_SECS tag and turns it into a human-readable dict.
-        :return:    Dict representing downlink latency.
-        """
-        return {
-            'dl_latency': int(self.val, 2)
-        }
-
-    def _decode_led_on_resp(self):
-        """
-        Decodes TAG_LED_ON_RESP tag and turns it into a human-readable dict.
-        :return:    Dict representing received "LEDs on" response.
-        """
-        return {
-            'led_on_resp': [int(id, 2) for id in wrap(self.val, 8)]
-        }
-
-    def _decode_led_off_resp(self):
-        """
-        Decodes TAG_LED_OFF_RESP tag and turns it into a human-readable dict.
-        :return:    Dict representing received "LEDs off" response.
-        """
-        return {
-            'led_off_resp': [int(id, 2) for id in wrap(self.val, 8)]
-        }
-
-    def _decode_link_type(self):
-        """
-        Decodes LINK_TYPE tag and turns it into a human-readable dict.
-        :return:    Dict representing link type.
-        """
-        return {'link_type': LinkType(self.val).name}
-
-    def _decode_number_of_buttons(self):
-        """
-        Decodes NUMBER_OF_BUTTONS tag and turns it into a human-readable dict.
-        :return:    Dict representing number of available buttons.
-        """
-        return {
-            'buttons': [int(id, 2) for id in wrap(self.val, 8)]
-        }
-
-    def _decode_number_of_leds(self):
-        """
-        Decodes NUMBER_OF_LEDS tag and turns it into a human-readable dict.
-        :return:    Dict representing number of available LEDs.
-        """
-        return {
-            'leds': [int(id, 2) for id in wrap(self.val, 8)]
-        }
-
-    def _decode_temp_sensor_available_and_unit_representation(self):
-        """
-        Decodes TEMP_SENSOR_AVAILABLE_AND_UNIT_REPRESENTATION tag and turns it into a human-readable dict.
-        :return:    Dict representing temp sensor metadata.
-        """
-        return {
-            'sensor': True if self.val[-1] == '1' else False,
-            'sensor_units': SensorUnits(self.val[-2]).name
-        }
-
-    def _decode_temp_sensor_data(self):
-        """
-        Decodes TEMP_SENSOR_DATA tag and turns it into a human-readable dict.
-        :return:    Dict representing temp sensor data.
-        """
-        return {
-            'sensor_data': int(self.val, 2)
-        }
-
-    DECODERS_MAP = {
-        TagType.BUTTON_PRESS: _decode_button_press,
-        TagType.CURRENT_GPS_TIME_IN_SECS: _decode_current_gps_time_in_secs,
-        TagType.DL_LATENCY_IN_SECS: _decode_downlink_latency_in_secs,
-        TagType.LED_ON_RESP: _decode_led_on_resp,
-        TagType.LED_OFF_RESP: _decode_led_off_resp,
-        TagType.LINK_TYPE: _decode_link_type,
-        TagType.NUMBER_OF_BUTTONS: _decode_number_of_buttons,
-        TagType.NUMBER_OF_LEDS: _decode_number_of_leds,
-        TagType.TEMP_SENSOR_AVAILABLE_AND_UNIT_REPRESENTATION: _decode_temp_sensor_available_and_unit_representation,
-        TagType.TEMP_SENSOR_DATA: _decode_temp_sensor_data
-    }
-
-    # -------------
-    # Tag encoders
-    # -------------
-    def _encode_button_pressed_resp(self):
-        """
-        Encodes BUTTON_PRESSED_RESP tag value based on json dict.
-        :return:    Tag value (binary string).
-        """
-        indices = self.json[TagType.BUTTON_PRESSED_RESP]
-        return ''.join([format(idx, '08b') for idx in indices])
-
-    def _encode_led_on(self):
-        """
-        Encodes LED_ON tag value based on json dict.
-        :return:    Tag value (binary string).
-        """
-        indices = self.json[TagType.LED_ON]
-        return ''.join([format(idx, '08b') for idx in indices])
-
-    def _encode_led_off(self):
-        """
-        Encodes LED_OFF tag value based on json dict.
-        :return:    Tag value (binary string).
-        """
-        indices = self.json[TagType.LED_OFF]
-        return ''.join([format(idx, '08b') for idx in indices])
-
-    def _encode_current_gps_time_in_secs(self):
-        """
-        Encodes CURRENT_GPS_TIME_IN_SECS tag value based on json dict.
-        :return:    Tag value (binary string).
-        """
-        current_gps_time = self.json[TagType.CURRENT_GPS_TIME_IN_SECS]
-        return format(current_gps_time, '032b')
-
-    ENCODERS_MAP = {
-        TagType.BUTTON_PRESSED_RESP: _encode_button_pressed_resp,
-        TagType.LED_ON: _encode_led_on,
-        TagType.LED_OFF: _encode_led_off,
-        TagType.CURRENT_GPS_TIME_IN_SECS: _encode_current_gps_time_in_secs
-    }
+                self._format = TLV_STANDARD
+                self._val_len = val_len
+        except (ValueError, OverflowError) as err:
+            raise ValueError(f'Unable to encode {TagType(tag_type).name} value {self.json[tag_type]!r}: {err}') from err
+        except TypeError:
+            self._format = None
+            self._type = None
+            self._val_len = None
+            self._val = b''
@@ -8,6 +8,8 @@ import json
 import unittest
 
 from command import Command
+from protocol import *
+from tag import DECODED_KEYS, DECODERS, TAG_TYPES
 
 
 class TestDecoder(unittest.TestCase):
@@ -28,6 +30,27 @@ class TestDecoder(unittest.TestCase):
         with self.assertRaises(ValueError):
             cmd.decode(byte_stream='4Z2010102020B030C01')
 
+    def test_decodeHeader_emptyInput(self):
+        with self.assertRaises(ValueError):
+            Command().decode(b'')
+
+    def test_decodeHeader_truncatedStandardTlv(self):
+        with self.assertRaises(ValueError):
+            Command().decode('41C6')
+
+    # -----------------------------------------------
+    # Decode raw bytes
+    # -----------------------------------------------
+    def test_decodeBytes_sameAsHex_shouldSucceed(self):
+        hex_str = '61C90301020387000003E888000000640C04'
+        from_hex = Command().decode(hex_str)
+        from_bytes = Command().decode(bytes.fromhex(hex_str))
+        from_view = Command().decode(memoryview(bytearray.fromhex(hex_str)))
+        self.assertEqual(from_bytes.decoded_cmd, from_hex.decoded_cmd)
+        self.assertEqual(from_view.decoded_cmd, from_hex.decoded_cmd)
+        self.assertEqual(from_view.__str__(), from_hex.__str__())
+        self.assertEqual(from_bytes.hex_repr(), hex_str)
+
     # -----------------------------------------------
     # Decode DEMO_APP_CAP_DISCOVERY_NOTIFICATION msg
     # -----------------------------------------------
@@ -233,6 +256,82 @@ class TestDecoder(unittest.TestCase):
         self.assertEqual(decoded['gps_time'], 1)
         self.assertEqual(decoded['link_type'], 'BLE')
 
+    # -----------------------------------------
+    # Decode many payloads at once
+    # -----------------------------------------
+    def test_decodeMany_hex_sameAsDecode_shouldSucceed(self):
+        payloads = [
+            '4001014201020B030C01',
+            '61C90301020387000003E888000000640C04',
+            '41850102030487000003E80C04',
+            '41C60301020387000000010C01'
+        ]
+        decoded = Command.decode_many(payloads)
+        self.assertEqual(decoded, [Command().decode(payload).decoded_cmd for payload in payloads])
+
+    def test_decodeMany_base64_shouldSucceed(self):
+        payloads = ['NDEwNjAxODcwMDAwMDAwMTBDMDE=', bytes.fromhex('4146010287000000010C01')]
+        decoded = Command.decode_many(payloads, encoding='base64')
+        self.assertEqual(decoded[0], {'sensor_data': 1, 'gps_time': 1, 'link_type': 'BLE',
+                                      'id': 'DEMO_APP_ACTION_NOTIFICATION'})
+        self.assertEqual(decoded[1]['sensor_data'], 258)
+
+    def test_decodeMany_invalidPayload(self):
+        payloads = ['41060187000000010C01', '4Z', '41C6']
+        with self.assertRaises(ValueError):
+            Command.decode_many(payloads)
+        decoded = Command.decode_many(payloads, raise_errors=False)
+        self.assertEqual(decoded[0]['sensor_data'], 1)
+        self.assertEqual(decoded[1:], [None, None])
+
+    # -----------------------------------------
+    # Decode lazily
+    # -----------------------------------------
+    def test_decodeLazy_sameAsDecode_shouldSucceed(self):
+        for payload in ('4001014201020B030C01', '61C90301020387000003E888000000640C04', '41C60301020387000000010C01'):
+            eager = Command().decode(payload)
+            lazy = Command().decode(payload, lazy=True)
+            self.assertEqual(dict(lazy.decoded_cmd), eager.decoded_cmd)
+            self.assertEqual(lazy.decoded_cmd.to_dict(), eager.decoded_cmd)
+            self.assertEqual(lazy.__str__(), eager.__str__())
+            self.assertEqual(lazy.json_repr(), eager.json_repr())
+
+    def test_decodeLazy_decodesOnlyAccessedTags_shouldSucceed(self):
+        cmd = Command().decode('41060187000000010C03', lazy=True)
+        decoded = cmd.decoded_cmd
+        self.assertEqual(decoded['id'], 'DEMO_APP_ACTION_NOTIFICATION')
+        self.assertEqual(decoded['sensor_data'], 1)
+        self.assertEqual(decoded.get('gps_time'), 1)
+        self.assertTrue('link_type' in decoded)
+        self.assertFalse('button_press' in decoded)
+        self.assertIsNone(decoded.get('button_press'))
+        with self.assertRaises(ValueError):
+            decoded['link_type']  # invalid link type is reported only when accessed
+
+    def test_decodeLazy_invalidTagType(self):
+        with self.assertRaises(ValueError):
+            Command().decode('413F01', lazy=True)
+
+    # -----------------------------------------
+    # Protocol schema
+    # -----------------------------------------
+    def test_dispatchTables_matchSchema_shouldSucceed(self):
+        for tag_type in TagType:
+            value = int(tag_type.value, 2)
+            self.assertIs(TAG_TYPES[value], tag_type)
+            self.assertEqual(DECODED_KEYS[value], TAG_SCHEMA[tag_type].keys)
+            self.assertEqual(DECODERS[value] is None, not TAG_SCHEMA[tag_type].keys)
+        self.assertEqual(sum(tag_type is not None for tag_type in TAG_TYPES), len(TagType))
+
+    def test_decodeBitfield_multiByteValue_shouldSucceed(self):
+        cmd = Command().decode('40CB020003')
+        self.assertEqual(cmd.decoded_cmd['sensor'], True)
+        self.assertEqual(cmd.decoded_cmd['sensor_units'], 'FAHRENHEIT')
+
+    def test_decodeBitfield_emptyValue(self):
+        with self.assertRaises(ValueError):
+            Command().decode('40CB00')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -6,6 +6,7 @@ Unit tests for command decoder.
 """
 import unittest
 
+import command_templates
 from command import Command
 from protocol import *
 from tag import Tag
@@ -32,6 +33,12 @@ class TestEncoder(unittest.TestCase):
         with self.assertRaises(ValueError):
             [Tag().encode(tag) for tag in tags_json]
 
+    def test_encodeTag_outOfRangeValue(self):
+        with self.assertRaisesRegex(ValueError, 'Unable to encode LED_ON'):
+            Tag().encode({TagType.LED_ON: [1, 256]})
+        with self.assertRaisesRegex(ValueError, 'Unable to encode CURRENT_GPS_TIME_IN_SECS'):
+            Tag().encode({TagType.CURRENT_GPS_TIME_IN_SECS: 2 ** 32})
+
     # ----------------------------------------
     # Encode DEMO_APP_CAP_DISCOVERY_RESP  msg
     # ----------------------------------------
@@ -63,6 +70,7 @@ class TestEncoder(unittest.TestCase):
             payload=tags
         )
         self.assertEqual(cmd.hex_repr(), 'E1000D01')
+        self.assertEqual(cmd.to_bytes(), b'\xE1\x00\x0D\x01')
 
     def test_encodeButtonPressedResp_id24_shouldSucceed(self):
         tags_json = [{TagType.BUTTON_PRESSED_RESP: [2, 4]}]
@@ -213,6 +221,60 @@ class TestEncoder(unittest.TestCase):
         )
         self.assertEqual(cmd.hex_repr(), '21840102030487000003E8')
 
+    # -------------------------------
+    # Encode with command templates
+    # -------------------------------
+    def test_templateCapDiscoveryResp_shouldSucceed(self):
+        self.assertEqual(command_templates.encode_cap_discovery_resp().hex().upper(), 'E000')
+
+    def test_templateButtonPressedResp_sameAsCommand_shouldSucceed(self):
+        for button_press in ([1], [2, 4], [1, 2, 4]):
+            tags = [Tag().encode({TagType.BUTTON_PRESSED_RESP: button_press})]
+            cmd = Command().encode(
+                status_hdr_ind=True,
+                op_code=OpCode.MSG_TYPE_RESP,
+                cls=Class.DEMO_APP_CLASS,
+                id=Id.DEMO_APP_ACTION_RESP,
+                status_code='00000000',
+                payload=tags
+            )
+            self.assertEqual(command_templates.encode_button_pressed_resp(button_press), cmd.to_bytes())
+
+    def test_templateLedActionReq_sameAsCommand_shouldSucceed(self):
+        for tag_type in (TagType.LED_ON, TagType.LED_OFF):
+            for led_id in ([1], [1, 2], [1, 2, 3], [1, 2, 3, 4]):
+                for gps_time in (1000, 1386394012):
+                    tags = [Tag().encode({tag_type: led_id}), Tag().encode({TagType.CURRENT_GPS_TIME_IN_SECS: gps_time})]
+                    cmd = Command().encode(
+                        status_hdr_ind=False,
+                        op_code=OpCode.MSG_TYPE_WRITE,
+                        cls=Class.DEMO_APP_CLASS,
+                        id=Id.DEMO_APP_ACTION_REQ,
+                        payload=tags
+                    )
+                    self.assertEqual(command_templates.encode_led_action_req(tag_type, led_id, gps_time),
+                                     cmd.to_bytes())
+
+    def test_templateLedStateReq_sameAsCommand_shouldSucceed(self):
+        for led_on, led_off in (([1, 3], [2, 4]), ([2], []), ([], [1, 2])):
+            tags = [Tag().encode({tag_type: led_id})
+                    for tag_type, led_id in ((TagType.LED_ON, led_on), (TagType.LED_OFF, led_off)) if led_id]
+            tags.append(Tag().encode({TagType.CURRENT_GPS_TIME_IN_SECS: 1000}))
+            cmd = Command().encode(
+                status_hdr_ind=False,
+                op_code=OpCode.MSG_TYPE_WRITE,
+                cls=Class.DEMO_APP_CLASS,
+                id=Id.DEMO_APP_ACTION_REQ,
+                payload=tags
+            )
+            self.assertEqual(command_templates.encode_led_state_req(led_on, led_off, 1000), cmd.to_bytes())
+
+    def test_templateLedActionReq_cachedPrefix_shouldSucceed(self):
+        hits = command_templates.cache_info().hits
+        command_templates.encode_led_action_req(TagType.LED_ON, [3, 4], 1)
+        command_templates.encode_led_action_req(TagType.LED_ON, [3, 4], 2)
+        self.assertEqual(command_templates.cache_info().hits, hits + 1)
+
 
 if __name__ == '__main__':
     unittest.main()
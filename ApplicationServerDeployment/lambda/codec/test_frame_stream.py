@@ -0,0 +1,122 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for streaming frame decoder.
+"""
+import base64
+import io
+import json
+import unittest
+
+from command import Command
+from frame_stream import decode_stream
+
+PAYLOADS = [
+    '41060187000000010C01',
+    '61C90301020387000003E888000000640C04',
+    '4001014201020B030C01'
+]
+
+
+def length_prefixed(frames: [bytes]) -> bytes:
+    return b''.join(len(frame).to_bytes(2, 'big') + frame for frame in frames)
+
+
+def uplink_record(wireless_device_id: str, payload_hex: str) -> dict:
+    return {
+        'WirelessDeviceId': wireless_device_id,
+        'PayloadData': base64.b64encode(payload_hex.encode('ascii')).decode('ascii'),
+        'WirelessMetadata': {'Sidewalk': {'Seq': 1}}
+    }
+
+
+class TestFrameStream(unittest.TestCase):
+
+    # -----------------------------------------------
+    # Length-prefixed frames
+    # -----------------------------------------------
+    def test_lengthPrefixed_smallChunks_shouldSucceed(self):
+        stream = io.BytesIO(length_prefixed([bytes.fromhex(payload) for payload in PAYLOADS]))
+        frames = list(decode_stream(stream, framing='length_prefixed', chunk_size=3))
+        self.assertEqual([frame.decoded for frame in frames], [Command().decode(p).decoded_cmd for p in PAYLOADS])
+        self.assertEqual([frame.offset for frame in frames], [0, 12, 32])
+        self.assertTrue(all(frame.error is None for frame in frames))
+
+    def test_lengthPrefixed_malformedFrame_shouldContinue(self):
+        data = length_prefixed([bytes.fromhex(PAYLOADS[0]), bytes.fromhex('41C6'), bytes.fromhex(PAYLOADS[1])])
+        frames = list(decode_stream(data + b'\x00\x10\x41', framing='length_prefixed'))
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[0].decoded['sensor_data'], 1)
+        self.assertIsNone(frames[1].decoded)
+        self.assertIn('Malformed frame', frames[1].error)
+        self.assertEqual(frames[2].decoded['led_on_resp'], [1, 2, 3])
+        self.assertIn('Truncated frame', frames[3].error)
+
+    def test_lengthPrefixed_tooLongFrame_shouldContinue(self):
+        stream = io.BytesIO(length_prefixed([bytes.fromhex(payload) for payload in PAYLOADS]))
+        frames = list(decode_stream(stream, framing='length_prefixed', max_frame_size=16, chunk_size=3))
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0].decoded, Command().decode(PAYLOADS[0]).decoded_cmd)
+        self.assertIn('exceeds', frames[1].error)
+        self.assertEqual(frames[2].decoded, Command().decode(PAYLOADS[2]).decoded_cmd)
+        self.assertEqual([frame.offset for frame in frames], [0, 12, 32])
+
+    # -----------------------------------------------
+    # Lines
+    # -----------------------------------------------
+    def test_lines_mixedContent_shouldSucceed(self):
+        lines = [
+            PAYLOADS[0],
+            '',
+            json.dumps({'uplink': uplink_record('device-1', PAYLOADS[1])}),
+            'not-a-payload',
+            PAYLOADS[2]
+        ]
+        frames = list(decode_stream(io.BytesIO('\n'.join(lines).encode('ascii')), framing='lines', chunk_size=7))
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[0].decoded, Command().decode(PAYLOADS[0]).decoded_cmd)
+        self.assertEqual(frames[1].wireless_device_id, 'device-1')
+        self.assertEqual(frames[1].decoded, Command().decode(PAYLOADS[1]).decoded_cmd)
+        self.assertIn('Malformed line', frames[2].error)
+        self.assertEqual(frames[3].decoded, Command().decode(PAYLOADS[2]).decoded_cmd)
+
+    def test_lines_tooLongLine_shouldContinue(self):
+        data = ('A' * 100 + '\n' + PAYLOADS[0] + '\n').encode('ascii')
+        frames = list(decode_stream(data, framing='lines', max_line_size=32, chunk_size=16))
+        self.assertEqual(len(frames), 2)
+        self.assertIn('exceeds', frames[0].error)
+        self.assertEqual(frames[1].decoded['sensor_data'], 1)
+
+    # -----------------------------------------------
+    # Concatenated JSON records
+    # -----------------------------------------------
+    def test_jsonRecords_concatenated_shouldSucceed(self):
+        records = [json.dumps(uplink_record(f'device-{idx}', payload)) for idx, payload in enumerate(PAYLOADS)]
+        data = (records[0] + records[1] + '\n' + records[2]).encode('ascii')
+        frames = list(decode_stream(iter([data[i:i + 10] for i in range(0, len(data), 10)]), framing='json'))
+        self.assertEqual([frame.wireless_device_id for frame in frames], ['device-0', 'device-1', 'device-2'])
+        self.assertEqual([frame.decoded for frame in frames], [Command().decode(p).decoded_cmd for p in PAYLOADS])
+
+    def test_jsonRecords_malformedRecord_shouldContinue(self):
+        records = [
+            json.dumps(uplink_record('device-0', PAYLOADS[0])),
+            '{"WirelessDeviceId": "device-1", "PayloadData": }',
+            json.dumps(uplink_record('device-2', '41C6')),
+            json.dumps(uplink_record('device-3', PAYLOADS[2]))
+        ]
+        frames = list(decode_stream(''.join(records).encode('ascii'), framing='json'))
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[0].decoded['sensor_data'], 1)
+        self.assertIn('Malformed JSON record', frames[1].error)
+        self.assertEqual(frames[2].wireless_device_id, 'device-2')
+        self.assertIn('Malformed frame', frames[2].error)
+        self.assertEqual(frames[3].decoded, Command().decode(PAYLOADS[2]).decoded_cmd)
+
+    def test_unsupportedFraming(self):
+        with self.assertRaises(ValueError):
+            decode_stream(b'', framing='csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for vectorized telemetry decoder.
+"""
+import unittest
+
+from command import Command
+from vectorized_decoder import np, decode_action_notifications, to_dicts
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TestVectorizedDecoder(unittest.TestCase):
+
+    def test_decodeSensorData_allSizes_sameAsDecode_shouldSucceed(self):
+        payloads = [
+            '41060187000000010C01',
+            '4146010287000000010C01',
+            '41C6030102038700002710' + '0C02',
+            '418601020304870000000A0C04',
+            '41060587000003E80C02',
+            '410C0487000003E80612'
+        ]
+        records, fallback = decode_action_notifications(payloads)
+        self.assertEqual(fallback, {})
+        self.assertEqual(records['index'].tolist(), list(range(len(payloads))))
+        self.assertEqual(to_dicts(records), [Command().decode(payload).decoded_cmd for payload in payloads])
+
+    def test_decodeMixedLayouts_fallbackToScalar_shouldSucceed(self):
+        payloads = [
+            '41060187000000010C01',
+            '41050187000000010C01',
+            '61090187000003E8880000000A0C01',
+            '41060187000000010C03',
+            '4Z',
+            'NDEwNjAxODcwMDAwMDAwMTBDMDE='
+        ]
+        records, fallback = decode_action_notifications(payloads)
+        self.assertEqual(records['index'].tolist(), [0])
+        self.assertEqual(sorted(fallback), [1, 2, 3, 4, 5])
+        self.assertEqual(fallback[1], Command().decode(payloads[1]).decoded_cmd)
+        self.assertEqual(fallback[2], Command().decode(payloads[2]).decoded_cmd)
+        self.assertIsNone(fallback[3])
+        self.assertIsNone(fallback[4])
+        self.assertIsNone(fallback[5])
+
+    def test_decodeBase64_shouldSucceed(self):
+        records, fallback = decode_action_notifications(['NDEwNjAxODcwMDAwMDAwMTBDMDE='], encoding='base64')
+        self.assertEqual(fallback, {})
+        self.assertEqual(to_dicts(records), [Command().decode('41060187000000010C01').decoded_cmd])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Vectorized decoder for DEMO_APP_ACTION_NOTIFICATION telemetry frames.
+
+Intended for offline re-processing of stored uplinks. Frames of the same length are stacked into a 2D uint8 array
+and decoded with NumPy column operations. Frames, which do not match any of the known telemetry layouts,
+are decoded with the scalar Command path.
+
+NumPy is not available in the Lambda runtime, it needs to be installed to use this module.
+"""
+import base64
+from itertools import permutations
+
+from command import Command
+from protocol import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NOTIFICATION_ID = int(Id.DEMO_APP_ACTION_NOTIFICATION.value, 2)
+SENSOR_DATA_TYPE = int(TagType.TEMP_SENSOR_DATA.value, 2)
+GPS_TIME_TYPE = int(TagType.CURRENT_GPS_TIME_IN_SECS.value, 2)
+LINK_TYPE_TYPE = int(TagType.LINK_TYPE.value, 2)
+
+"""
+Sizes of the TEMP_SENSOR_DATA value, mapped to the TLV format used to send them.
+"""
+SENSOR_DATA_FORMATS = {
+    1: TlvFormat.SIZE_OPTIMIZED_1B,
+    2: TlvFormat.SIZE_OPTIMIZED_2B,
+    3: TlvFormat.STANDARD,
+    4: TlvFormat.SIZE_OPTIMIZED_4B
+}
+
+"""
+Link type values, indexed by the link_type field of the decoded records.
+"""
+LINK_TYPE_NAMES = {int(item.value, 2): item.name for item in LinkType}
+
+RECORD_FIELDS = [
+    ('index', 'i8'),
+    ('op_code', 'u1'),
+    ('cls', 'u1'),
+    ('sensor_data', 'u4'),
+    ('gps_time', 'u4'),
+    ('link_type', 'u1')
+]
+
+
+def _tlv(tag_type: int, tlv_format: TlvFormat, length: int) -> (bytes, int):
+    """
+    Returns TLV header bytes and value length of the tag with a given type and format.
+    """
+    frmt = int(tlv_format.value, 2)
+    header = bytes([(frmt << 6) | tag_type])
+    if tlv_format == TlvFormat.STANDARD:
+        header += bytes([length])
+    return header, length
+
+
+def _build_layouts() -> dict:
+    """
+    Builds all supported telemetry layouts: TEMP_SENSOR_DATA (any size), CURRENT_GPS_TIME_IN_SECS and LINK_TYPE tags,
+    in any order, following a header without status code.
+
+    :return:    Dict of frame length: list of layouts.
+                Layout is a tuple of constant TLV header columns ([(column, value)]) and value slices ({key: (start, end)}).
+    """
+    layouts = {}
+    for sensor_len, sensor_format in SENSOR_DATA_FORMATS.items():
+        tags = {
+            'sensor_data': _tlv(SENSOR_DATA_TYPE, sensor_format, sensor_len),
+            'gps_time': _tlv(GPS_TIME_TYPE, TlvFormat.SIZE_OPTIMIZED_4B, 4),
+            'link_type': _tlv(LINK_TYPE_TYPE, TlvFormat.SIZE_OPTIMIZED_1B, 1)
+        }
+        for order in permutations(tags):
+            constants = []
+            slices = {}
+            column = 1
+            for key in order:
+                header, length = tags[key]
+                constants.extend((column + i, byte) for i, byte in enumerate(header))
+                column += len(header)
+                slices[key] = (column, column + length)
+                column += length
+            layouts.setdefault(column, []).append((constants, slices))
+    return layouts
+
+
+LAYOUTS = _build_layouts()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('NumPy is required for vectorized decoding. Install it with: pip install numpy')
+
+
+def _big_endian(frames, start: int, end: int):
+    """
+    Combines byte columns [start, end) into big-endian unsigned integers.
+    """
+    value = np.zeros(frames.shape[0], dtype=np.uint32)
+    for column in range(start, end):
+        value = (value << np.uint32(8)) | frames[:, column]
+    return value
+
+
+def decode_action_notification_array(frames) -> (object, object):
+    """
+    Decodes 2D uint8 array of same-length frames.
+
+    :param frames:  NumPy uint8 array of shape (number of frames, frame length).
+    :return:        Tuple of structured array with decoded records (index refers to frames row)
+                    and array of indices of the rows, which do not match any telemetry layout.
+    """
+    _require_numpy()
+    frames = np.asarray(frames, dtype=np.uint8)
+    rows, frame_len = frames.shape
+    records = np.zeros(0, dtype=RECORD_FIELDS)
+    pending = np.ones(rows, dtype=bool)
+
+    if rows and frame_len:
+        header = frames[:, 0]
+        cmd_id = ((header & 0b111) << 2) | ((header >> 5) & 0b11)
+        pending_header = ((header & 0x80) == 0) & (cmd_id == NOTIFICATION_ID)
+        chunks = []
+        for constants, slices in LAYOUTS.get(frame_len, []):
+            match = pending & pending_header
+            for column, value in constants:
+                match &= frames[:, column] == value
+            link_start, _ = slices['link_type']
+            link_type = frames[:, link_start]
+            match &= (link_type == 1) | (link_type == 2) | (link_type == 4)
+            if not match.any():
+                continue
+            matched = frames[match]
+            chunk = np.zeros(matched.shape[0], dtype=RECORD_FIELDS)
+            chunk['index'] = np.nonzero(match)[0]
+            chunk['op_code'] = (matched[:, 0] >> 5) & 0b11
+            chunk['cls'] = (matched[:, 0] >> 3) & 0b11
+            chunk['sensor_data'] = _big_endian(matched, *slices['sensor_data'])
+            chunk['gps_time'] = _big_endian(matched, *slices['gps_time'])
+            chunk['link_type'] = link_type[match]
+            chunks.append(chunk)
+            pending &= ~match
+        if chunks:
+            records = np.concatenate(chunks)
+
+    return records, np.nonzero(pending)[0]
+
+
+def decode_action_notifications(payloads, encoding: str = 'hex') -> (object, dict):
+    """
+    Decodes payloads, grouping them by length and decoding telemetry frames column-wise.
+    Rows with a different layout fall back to the scalar Command decoder.
+
+    :param payloads:    List of payloads (see: Command.decode_many).
+    :param encoding:    'hex' or 'base64'.
+    :return:            Tuple of structured array with decoded telemetry records, sorted by index (position in payloads)
+                        and dict {index: decoded dict or None} of the payloads decoded with the scalar path.
+    """
+    _require_numpy()
+    if encoding not in ('hex', 'base64'):
+        raise ValueError(f'Unsupported encoding: {encoding}')
+
+    groups = {}
+    fallback_indices = []
+    for idx, payload in enumerate(payloads):
+        try:
+            if isinstance(payload, str):
+                if encoding == 'base64':
+                    payload = base64.b64decode(payload).decode('ascii')
+                payload = bytes.fromhex(payload)
+            groups.setdefault(len(payload), ([], []))
+            indices, frames = groups[len(payload)]
+            indices.append(idx)
+            frames.append(bytes(payload))
+        except (ValueError, TypeError):
+            fallback_indices.append(idx)
+
+    chunks = []
+    for frame_len, (indices, frames) in groups.items():
+        indices = np.asarray(indices, dtype=np.int64)
+        array = np.frombuffer(b''.join(frames), dtype=np.uint8).reshape(len(frames), frame_len)
+        records, unmatched = decode_action_notification_array(array)
+        records['index'] = indices[records['index']]
+        chunks.append(records)
+        fallback_indices.extend(indices[unmatched].tolist())
+
+    records = np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD_FIELDS)
+    records = records[np.argsort(records['index'], kind='stable')]
+
+    fallback_indices.sort()
+    fallback_payloads = [payloads[idx] for idx in fallback_indices]
+    fallback = dict(zip(fallback_indices, Command.decode_many(fallback_payloads, encoding=encoding, raise_errors=False)))
+    return records, fallback
+
+
+def to_dicts(records) -> [dict]:
+    """
+    Converts decoded telemetry records into dicts, same as Command.decoded_cmd.
+
+    :param records:     Structured array returned by decode_action_notifications.
+    :return:            List of dicts.
+    """
+    return [
+        {
+            'sensor_data': int(sensor_data),
+            'gps_time': int(gps_time),
+            'link_type': LINK_TYPE_NAMES[int(link_type)],
+            'id': Id.DEMO_APP_ACTION_NOTIFICATION.name
+        }
+        for sensor_data, gps_time, link_type in zip(records['sensor_data'], records['gps_time'], records['link_type'])
+    ]
@@ -0,0 +1,35 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Makes common modules importable by the tests the same way they are in the deployed Lambdas,
+where codec, database and utils directories are zipped flat next to the handler (see: deploy_stack.py).
+"""
+import os
+import sys
+
+for common_dir in ('codec', 'database', 'utils'):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), common_dir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class FakeClock:
+    """
+    Clock of the tests, which only moves when the test (or the code under test) sleeps or sets it.
+    Shared by the tests with: from conftest import FakeClock.
+    """
+
+    def __init__(self, now: float = 0.0):
+        """
+        :param now: Initial time, in seconds.
+        """
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
@@ -0,0 +1,108 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Memory benchmark for the Device and Measurement records.
+
+Builds the given number of objects from DynamoDB-shaped items (Decimal numbers, list of dicts)
+and reports memory retained per object (tracemalloc) by the slotted classes and by dict-backed objects,
+which keep the items as they were returned by DynamoDB.
+
+Usage:
+    python benchmark_models.py --count 100000
+"""
+import argparse
+import sys
+import tracemalloc
+from decimal import Decimal
+from types import SimpleNamespace
+
+from device import Device
+from link_type import LinkType
+from measurement import Measurement
+from unit import Unit
+
+
+def device_item(idx: int) -> dict:
+    return {
+        'wireless_device_id': f'{idx:08x}-0000-0000-0000-000000000000',
+        'led': [Decimal(1), Decimal(2), Decimal(3), Decimal(4)],
+        'led_on': [Decimal(1), Decimal(3)],
+        'button': [Decimal(1), Decimal(2), Decimal(3), Decimal(4)],
+        'button_pressed': [{'id': Decimal(i), 'seqN': Decimal(idx), 'state': Decimal(i % 2)} for i in range(1, 5)],
+        'link_type': 'BLE',
+        'sensor': True,
+        'sensor_unit': 'CELSIUS',
+        'last_uplink': Decimal(1700000000 + idx),
+        'time_to_live': Decimal(1700086400 + idx)
+    }
+
+
+def measurement_item(idx: int) -> dict:
+    return {
+        'wireless_device_id': f'{idx:08x}-0000-0000-0000-000000000000',
+        'temperature': Decimal(idx % 40),
+        'timestamp': Decimal(1700000000000 + idx),
+        'time_to_live': Decimal(1700003600 + idx)
+    }
+
+
+def dict_backed_device(item: dict) -> SimpleNamespace:
+    """
+    Returns dict-backed object, which holds the item the same way as Device did before switching to __slots__.
+    """
+    return SimpleNamespace(_wireless_device_id=item['wireless_device_id'], _led=item['led'], _led_on=item['led_on'],
+                           _button=item['button'], _button_pressed=item['button_pressed'],
+                           _link_type=LinkType(item['link_type']), _sensor=item['sensor'],
+                           _sensor_unit=Unit(item['sensor_unit']), _last_uplink=item['last_uplink'],
+                           _time_to_live=item['time_to_live'])
+
+
+def dict_backed_measurement(item: dict) -> SimpleNamespace:
+    """
+    Returns dict-backed object, which holds the item the same way as Measurement did before switching to __slots__.
+    """
+    return SimpleNamespace(_wireless_device_id=item['wireless_device_id'], _value=item['temperature'],
+                           _time=item['timestamp'], _time_to_live=item['time_to_live'])
+
+
+def measure_memory(factory, count: int) -> float:
+    """
+    Measures memory retained by objects created by the factory.
+
+    :param factory:     Callable, which takes object index and returns the object.
+    :param count:       Number of created objects.
+    :return:            Retained memory per object (in bytes).
+    """
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        objects = [factory(idx) for idx in range(count)]
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (retained - baseline) / count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Device and Measurement memory benchmark.')
+    parser.add_argument('--count', type=int, default=100000, help='number of created objects')
+    args = parser.parse_args(argv)
+
+    benchmarks = {
+        'Device': (lambda idx: Device(**device_item(idx)), lambda idx: dict_backed_device(device_item(idx))),
+        'Measurement': (lambda idx: Measurement(**measurement_item(idx)),
+                        lambda idx: dict_backed_measurement(measurement_item(idx)))
+    }
+    print(f'{"class":<16} {"dict-backed B/obj":>18} {"slotted B/obj":>14} {"total MB":>10} {"reduction":>10}')
+    for name, (slotted_factory, dict_backed_factory) in benchmarks.items():
+        dict_backed = measure_memory(dict_backed_factory, args.count)
+        slotted = measure_memory(slotted_factory, args.count)
+        print(f'{name:<16} {dict_backed:>18.0f} {slotted:>14.0f} {slotted * args.count / 2 ** 20:>10.1f} '
+              f'{(1 - slotted / dict_backed) * 100:>9.1f}%')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
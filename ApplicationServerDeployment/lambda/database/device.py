@@ -16,14 +16,14 @@ class Device(object):
     ----------
         _wireless_device_id: str
             Wireless device ID.
-        _led: [int]
-            List of indices of the LEDs available on the board.
-        _led_on: [int]
-            List of indices of the LEDs, which are turned on.
-        _button: [int]
-            List of indices of the buttons available on the board.
-        _button_pressed: [dict]
-            List of dicts of the following shape:
+        _led: (int)
+            Tuple of indices of the LEDs available on the board.
+        _led_on: (int)
+            Tuple of indices of the LEDs, which are turned on (stored in the table as number set).
+        _button: (int)
+            Tuple of indices of the buttons available on the board.
+        _button_pressed: ((int, int, int))
+            Tuple of (id, seqN, state) tuples, exposed as list of dicts of the following shape:
                 {
                     id: int
                         Index of the button.
@@ -32,6 +32,8 @@ class Device(object):
                     state: int
                         Button state (1 - engaged, 0 - disengaged)
                 }
+            Stored in the table as map keyed by the button index: {"<id>": {"seqN": int, "state": int}}.
+            Records written by the previous versions keep it as list of the above-mentioned dicts.
         _link_type: LinkType
             Enum that describes link type.
         _sensor: bool
@@ -42,13 +44,18 @@ class Device(object):
             UTC time of last received uplink (in seconds).
         _time_to_live: int
             UTC time when record should be removed from the table (in seconds; equals last_uplink + 24 hours).
+
+    last_uplink_bucket attribute of the record (key of the last_uplink index) is derived from last_uplink
+    and wireless_device_id and is not kept.
     """
+    __slots__ = ('_wireless_device_id', '_led', '_led_on', '_button', '_button_pressed', '_link_type', '_sensor',
+                 '_sensor_unit', '_last_uplink', '_time_to_live')
 
     def __init__(self, wireless_device_id, led=None, led_on=None, button=None, button_pressed=None, link_type=None,
-                 sensor=False, sensor_unit=None, last_uplink=0, time_to_live=None):
+                 sensor=False, sensor_unit=None, last_uplink=0, time_to_live=None, last_uplink_bucket=None):
 
-        self._button = [] if button is None else button
-        self._led = [] if led is None else led
+        self._button = self._to_indices(button)
+        self._led = self._to_indices(led)
 
         self._wireless_device_id = wireless_device_id
         self._link_type = LinkType(link_type)
@@ -56,36 +63,45 @@ class Device(object):
         self._sensor = sensor
         self._sensor_unit = Unit(sensor_unit)
 
-        self._last_uplink = last_uplink
-        self._time_to_live = time_to_live
+        self._last_uplink = int(last_uplink)
+        self._time_to_live = None if time_to_live is None else int(time_to_live)
 
-        self._button_pressed = {} if button_pressed is None else button_pressed
-        self._led_on = [] if led_on is None else led_on
+        self.set_button_pressed(button_pressed)
+        self.set_led_on(led_on)
 
     def set_led_on(self, led_on: [int]):
-        self._led_on = led_on
+        self._led_on = self._to_indices(led_on)
+
+    def set_button_pressed(self, button_pressed):
+        if not button_pressed:
+            self._button_pressed = ()
+        elif isinstance(button_pressed, dict):
+            self._button_pressed = tuple(sorted((int(id), int(button["seqN"]), int(button["state"]))
+                                                for id, button in button_pressed.items()))
+        else:
+            self._button_pressed = tuple((int(button["id"]), int(button["seqN"]), int(button["state"]))
+                                         for button in button_pressed)
 
     def get_wireless_device_id(self) -> str:
         return self._wireless_device_id
 
     def get_led(self) -> [int]:
-        return [int(x) for x in self._led]
+        return list(self._led)
 
     def get_led_on(self) -> [int]:
-        return [int(x) for x in self._led_on]
+        return list(self._led_on)
 
     def get_button(self) -> [int]:
-        return [int(x) for x in self._button]
+        return list(self._button)
+
+    def get_button_pressed(self) -> [dict]:
+        return [{"id": id, "seqN": seq_n, "state": state} for id, seq_n, state in self._button_pressed]
 
-    def get_button_pressed(self) -> dict:
-        return self._button_pressed
+    def get_button_pressed_map(self) -> dict:
+        return {str(id): {"seqN": seq_n, "state": state} for id, seq_n, state in self._button_pressed}
 
     def get_enabled_button_pressed_state(self) -> [int]:
-        button_pressed = []
-        for button in self.get_button_pressed():
-            if button["state"] == 1:
-                button_pressed.append(int(button["id"]))
-        return button_pressed
+        return [id for id, _, state in self._button_pressed if state == 1]
 
     def get_link_type(self) -> LinkType:
         return self._link_type
@@ -100,7 +116,7 @@ class Device(object):
         return int(self._last_uplink)
 
     def get_time_to_live(self) -> int:
-        return int(self._time_to_live)
+        return self._time_to_live
 
     def to_dict(self) -> dict:
         """
@@ -120,3 +136,14 @@ class Device(object):
                 'last_uplink': self.get_last_uplink(),
                 'time_to_live': self.get_time_to_live()
             }
+
+    # -----------------
+    # For internal use
+    # -----------------
+    @staticmethod
+    def _to_indices(values) -> tuple:
+        if not values:
+            return ()
+        if isinstance(values, (set, frozenset)):
+            return tuple(sorted(int(x) for x in values))
+        return tuple(int(x) for x in values)
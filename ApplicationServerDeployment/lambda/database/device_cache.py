@@ -0,0 +1,136 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+from collections import OrderedDict
+
+from device import Device
+
+
+class _CacheEntry:
+    """
+    Single entry of the DeviceCache.
+
+    Attributes
+    ----------
+        device: Device
+            Cached Device object (None if device state is not trusted anymore).
+        expires_at: float
+            Monotonic time, when cached Device object expires.
+        seq: int
+            Sidewalk Seq of the last uplink received from the device (None if unknown).
+    """
+    __slots__ = ('device', 'expires_at', 'seq')
+
+    def __init__(self, device: Device = None, expires_at: float = 0.0, seq: int = None):
+        self.device = device
+        self.expires_at = expires_at
+        self.seq = seq
+
+
+class DeviceCache:
+    """
+    Read-through cache of the SidewalkDevices table records, intended to live in the module scope
+    of the warm Lambda container. Entries expire after ttl seconds; least recently used entries
+    are evicted when the cache grows above max_size.
+
+    Cached state is trusted only while uplinks of the device arrive in order (each Seq is the previous one + 1).
+    Any gap, duplicate or out-of-order Seq means that another container may have handled the device meanwhile
+    (or that the uplink is retried), so the cached state is dropped and the next read goes to the table.
+    """
+
+    DEFAULT_TTL = 60
+    DEFAULT_MAX_SIZE = 1024
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE, clock=time.monotonic):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, wireless_device_id: str) -> Device:
+        """
+        Returns cached Device object.
+
+        :param wireless_device_id:  Wireless device ID.
+        :return:                    Device object or None, if device is not cached or cached state expired.
+        """
+        with self._lock:
+            entry = self._entries.get(wireless_device_id)
+            if entry is None or entry.device is None or entry.expires_at <= self._clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(wireless_device_id)
+            self.hits += 1
+            return entry.device
+
+    def put(self, device: Device):
+        """
+        Stores Device object (e.g. ALL_NEW result of the update) in the cache.
+
+        :param device:  Device object.
+        """
+        with self._lock:
+            entry = self._get_or_create_entry(device.get_wireless_device_id())
+            entry.device = device
+            entry.expires_at = self._clock() + self._ttl
+
+    def track_seq(self, wireless_device_id: str, seq: int):
+        """
+        Records Seq of the uplink received from the device. Drops cached device state,
+        unless Seq directly follows the previously recorded one.
+
+        :param wireless_device_id:  Wireless device ID.
+        :param seq:                 Sidewalk Seq of the uplink (None if unknown).
+        """
+        with self._lock:
+            entry = self._get_or_create_entry(wireless_device_id)
+            if entry.device is not None and (seq is None or entry.seq is None or seq != entry.seq + 1):
+                entry.device = None
+                self.invalidations += 1
+            entry.seq = seq
+
+    def invalidate(self, wireless_device_id: str):
+        """
+        Removes device from the cache.
+
+        :param wireless_device_id:  Wireless device ID.
+        """
+        with self._lock:
+            if self._entries.pop(wireless_device_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Returns cache statistics.
+
+        :return:    Dict with size, hits, misses, evictions and invalidations counters.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    # -----------------
+    # For internal use
+    # -----------------
+    def _get_or_create_entry(self, wireless_device_id: str) -> _CacheEntry:
+        entry = self._entries.get(wireless_device_id)
+        if entry is None:
+            entry = self._entries[wireless_device_id] = _CacheEntry()
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._entries.move_to_end(wireless_device_id)
+        return entry
@@ -0,0 +1,119 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import time
+import uuid
+
+import boto3
+from botocore.exceptions import ClientError
+
+from protocol import TagType
+
+
+class LedRequestCoalescer:
+    """
+    Merges LED_ON/LED_OFF requests sent to the same device within a time window into a single net-state command.
+
+    A Lambda container handles one request at a time, so pending requests are merged in the SidewalkPendingDownlinks
+    table. The first request of the window becomes its leader: it waits until the window ends, takes the pending
+    state of the LEDs (the last requested state of every LED wins) and sends it in one downlink. The requests, which
+    arrive meanwhile, only record their state and return. Leader, which did not flush its window within
+    STALE_AFTER seconds (e.g. its Lambda timed out), is replaced by the next request.
+    """
+
+    TABLE_NAME = 'SidewalkPendingDownlinks'
+    TIME_TO_LIVE = 3600  # seconds, pending items of the failed leaders are removed by the table TTL
+    STALE_AFTER = 30  # seconds after the end of the window
+    MAX_ATTEMPTS = 3
+    LED_ATTRIBUTE_PREFIX = 'led_'
+
+    def __init__(self, window: float, table=None, clock=time.time, sleep=time.sleep):
+        """
+        :param window:  Coalescing window in seconds.
+        :param table:   SidewalkPendingDownlinks Table resource (created, if not given).
+        :param clock:   Wall clock, in seconds (shared by the Lambda containers).
+        :param sleep:   Sleep function, in seconds.
+        """
+        self._window = window
+        self._table = table if table is not None else boto3.resource('dynamodb').Table(self.TABLE_NAME)
+        self._clock = clock
+        self._sleep = sleep
+
+    def submit(self, wireless_device_id: str, tag_type: TagType, led_id: [int]) -> ([int], [int]):
+        """
+        Records the requested state of the LEDs. Returns merged state of the window, if the request is its leader.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param tag_type:            TagType.LED_ON or TagType.LED_OFF.
+        :param led_id:              List of indices of the LEDs.
+        :return:                    Tuple of sorted lists of the LEDs to be turned on and off, or None if the request
+                                    was merged into the window of another request.
+        """
+        state = 1 if tag_type == TagType.LED_ON else 0
+        led_id = sorted({int(led) for led in led_id})  # duplicate LEDs would overlap in the update expression
+        names = {f'#l{idx}': f'{self.LED_ATTRIBUTE_PREFIX}{led}' for idx, led in enumerate(led_id)}
+        values = {f':l{idx}': state for idx in range(len(led_id))}
+        set_actions = [f'#l{idx} = :l{idx}' for idx in range(len(led_id))]
+
+        for _ in range(self.MAX_ATTEMPTS):
+            now = self._clock()
+            flush_at = int((now + self._window) * 1000)  # milliseconds, DynamoDB does not accept floats
+            token = uuid.uuid4().hex
+            if self._update(wireless_device_id, set_actions + ['leader = :token', 'flush_at = :flush_at',
+                                                               'time_to_live = :TTL'],
+                            names, dict(values, **{':token': token, ':flush_at': flush_at,
+                                                   ':TTL': int(now) + self.TIME_TO_LIVE,
+                                                   ':stale': int((now - self.STALE_AFTER) * 1000)}),
+                            'attribute_not_exists(leader) OR flush_at < :stale'):
+                return self._flush(wireless_device_id, token, flush_at)
+            if self._update(wireless_device_id, set_actions, names, values, 'attribute_exists(leader)'):
+                return None
+        raise RuntimeError(f'Request to device {wireless_device_id} was neither merged nor sent')
+
+    def _update(self, wireless_device_id: str, set_actions: [str], names: dict, values: dict,
+                condition: str) -> bool:
+        """
+        Updates pending item of the device.
+
+        :return:    False if the condition was not met.
+        """
+        try:
+            self._table.update_item(
+                Key={'wireless_device_id': wireless_device_id},
+                UpdateExpression='SET ' + ', '.join(set_actions),
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def _flush(self, wireless_device_id: str, token: str, flush_at: int) -> ([int], [int]):
+        """
+        Waits until the end of the window and takes its pending state.
+
+        :return:    Tuple of sorted lists of the LEDs to be turned on and off, or None if the window was taken over
+                    by another request (which sends the pending state instead).
+        """
+        wait = flush_at / 1000 - self._clock()
+        if wait > 0:
+            self._sleep(wait)
+        try:
+            response = self._table.delete_item(
+                Key={'wireless_device_id': wireless_device_id},
+                ConditionExpression='leader = :token',
+                ExpressionAttributeValues={':token': token},
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return None
+        led_on, led_off = [], []
+        for name, state in response.get('Attributes', {}).items():
+            if name.startswith(self.LED_ATTRIBUTE_PREFIX):
+                (led_on if int(state) else led_off).append(int(name[len(self.LED_ATTRIBUTE_PREFIX):]))
+        return sorted(led_on), sorted(led_off)
@@ -0,0 +1,194 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import logging
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from latency_histogram import LatencyHistogram
+from link_type import LinkType
+
+logger = logging.getLogger(__name__)
+
+
+class DownlinkDeliveryHandler:
+    """
+    A class that tracks delivery of the DEMO_APP_ACTION_REQ downlinks and keeps histograms of their round-trip time.
+
+    Every sent downlink is recorded in the SidewalkDownlinkDeliveries table under (wireless_device_id, seq).
+    DEMO_APP_ACTION_RESP uplink does not carry Seq of the request, so it is matched with the oldest pending downlink
+    to the device, which requested the same LED state (or with the oldest pending one, if none did). Only the
+    downlinks sent within MATCH_TIMEOUT are read, through the SENT_AT_INDEX of the table.
+    Round-trip time of the matched downlink is added to the histograms of the device and of its link type, stored
+    in the SidewalkDownlinkLatency table as bucket counters (see: LatencyHistogram), which are updated atomically.
+    """
+
+    TABLE_NAME = 'SidewalkDownlinkDeliveries'
+    LATENCY_TABLE_NAME = 'SidewalkDownlinkLatency'
+    TIME_TO_LIVE = 24 * 3600  # seconds
+    MATCH_TIMEOUT = 10 * 60 * 1000  # milliseconds, older downlinks are considered lost
+    SENT_AT_INDEX = 'sent_at'  # GSI: wireless_device_id HASH, sent_at RANGE
+    BUCKET_ATTRIBUTE_PREFIX = 'b'
+
+    def __init__(self):
+        dynamodb = boto3.resource('dynamodb')
+        self._table = dynamodb.Table(self.TABLE_NAME)
+        self._latency_table = dynamodb.Table(self.LATENCY_TABLE_NAME)
+
+    # ----------------
+    # Read operations
+    # ----------------
+    def get_device_latency(self, wireless_device_id: str) -> LatencyHistogram:
+        """
+        Gets round-trip time histogram of the downlinks to the device.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :return:                    LatencyHistogram object (empty if nothing was recorded).
+        """
+        return self._get_histogram(self._device_histogram_id(wireless_device_id))
+
+    def get_link_type_latency(self) -> {str: LatencyHistogram}:
+        """
+        Gets round-trip time histograms of the downlinks, by link type.
+
+        :return:    Dict of LatencyHistogram objects keyed by the link type name (only the recorded ones).
+        """
+        histograms = {}
+        for link_type in LinkType:
+            histogram = self._get_histogram(self._link_type_histogram_id(link_type))
+            if histogram.total_count:
+                histograms[link_type.name] = histogram
+        return histograms
+
+    def get_sent_since(self, wireless_device_id: str, since: int) -> [dict]:
+        """
+        Gets downlinks sent to the device since the given time.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param since:               UTC time in milliseconds (inclusive).
+        :return:                    List of recorded downlinks (see: record_sent), oldest first.
+        """
+        query_kwargs = {
+            'IndexName': self.SENT_AT_INDEX,
+            'KeyConditionExpression': Key('wireless_device_id').eq(wireless_device_id) & Key('sent_at').gte(since)
+        }
+        items = []
+        while True:
+            response = self._table.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # -----------------
+    # Write operations
+    # -----------------
+    def record_sent(self, wireless_device_id: str, seq: int, led_on: [int], led_off: [int], link_type: LinkType,
+                    sent_at: int = None):
+        """
+        Records downlink sent to the device.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param seq:                 Sidewalk Seq of the downlink.
+        :param led_on:              LEDs requested to be turned on.
+        :param led_off:             LEDs requested to be turned off.
+        :param link_type:           LinkType of the device.
+        :param sent_at:             UTC time in milliseconds (now, if not given).
+        """
+        sent_at = sent_at if sent_at is not None else int(time.time() * 1000)
+        self._table.put_item(Item={
+            'wireless_device_id': wireless_device_id,
+            'seq': seq,
+            'sent_at': sent_at,
+            'led_on': sorted(led_on),
+            'led_off': sorted(led_off),
+            'link_type': link_type.name,
+            'time_to_live': sent_at // 1000 + self.TIME_TO_LIVE
+        })
+
+    def match_response(self, wireless_device_id: str, led_on: [int], led_off: [int],
+                       received_at: int = None) -> dict:
+        """
+        Matches DEMO_APP_ACTION_RESP with the pending downlink and records its round-trip time.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param led_on:              LEDs reported as turned on.
+        :param led_off:             LEDs reported as turned off.
+        :param received_at:         UTC time of the response in milliseconds (now, if not given).
+        :return:                    Dict with seq, link_type and round_trip (milliseconds) of the matched downlink,
+                                    None if there was no pending downlink.
+        """
+        received_at = received_at if received_at is not None else int(time.time() * 1000)
+        pending = []
+        query_kwargs = {
+            'IndexName': self.SENT_AT_INDEX,
+            'KeyConditionExpression': Key('wireless_device_id').eq(wireless_device_id) &
+                                      Key('sent_at').between(received_at - self.MATCH_TIMEOUT, received_at),
+            'FilterExpression': Attr('acked_at').not_exists()
+        }
+        while True:
+            response = self._table.query(**query_kwargs)
+            pending.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        pending.sort(key=lambda item: int(item['sent_at']))
+        requested = (sorted(led_on), sorted(led_off))
+        pending.sort(key=lambda item: ([int(led) for led in item.get('led_on', [])],
+                                       [int(led) for led in item.get('led_off', [])]) != requested)
+        for item in pending:
+            round_trip = received_at - int(item['sent_at'])
+            try:
+                self._table.update_item(
+                    Key={'wireless_device_id': wireless_device_id, 'seq': item['seq']},
+                    UpdateExpression='SET acked_at = :acked_at, round_trip = :round_trip',
+                    ConditionExpression='attribute_not_exists(acked_at)',
+                    ExpressionAttributeValues={':acked_at': received_at, ':round_trip': round_trip}
+                )
+            except ClientError as err:
+                if err.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    continue  # matched by a concurrent (or retried) response
+                raise
+            link_type = LinkType(item.get('link_type'))
+            for histogram_id in (self._device_histogram_id(wireless_device_id),
+                                 self._link_type_histogram_id(link_type)):
+                self._record_latency(histogram_id, round_trip)
+            return {'seq': int(item['seq']), 'link_type': link_type.name, 'round_trip': round_trip}
+        return None
+
+    def _record_latency(self, histogram_id: str, value: int):
+        """
+        Atomically adds the value to the stored histogram.
+        """
+        histogram = LatencyHistogram()
+        histogram.record(value)
+        index, = histogram.counts
+        self._latency_table.update_item(
+            Key={'histogram_id': histogram_id},
+            UpdateExpression='ADD #bucket :one, total_count :one, total_sum :value',
+            ExpressionAttributeNames={'#bucket': f'{self.BUCKET_ATTRIBUTE_PREFIX}{index}'},
+            ExpressionAttributeValues={':one': 1, ':value': max(int(value), 0)}
+        )
+
+    def _get_histogram(self, histogram_id: str) -> LatencyHistogram:
+        try:
+            response = self._latency_table.get_item(Key={'histogram_id': histogram_id})
+        except ClientError as err:
+            logger.error(f'Error while reading latency histogram {histogram_id}: {err}')
+            raise
+        item = response.get('Item', {})
+        prefix = self.BUCKET_ATTRIBUTE_PREFIX
+        counts = {name[len(prefix):]: count for name, count in item.items()
+                  if name.startswith(prefix) and name[len(prefix):].isdigit()}
+        return LatencyHistogram(counts, total_sum=item.get('total_sum', 0))
+
+    @staticmethod
+    def _device_histogram_id(wireless_device_id: str) -> str:
+        return f'device#{wireless_device_id}'
+
+    @staticmethod
+    def _link_type_histogram_id(link_type: LinkType) -> str:
+        return f'link_type#{link_type.name}'
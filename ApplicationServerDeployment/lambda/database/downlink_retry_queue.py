@@ -0,0 +1,222 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import random
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+
+class DownlinkRetryQueue:
+    """
+    A class that provides persistent queue of the downlinks, which failed with transient errors after all in-call
+    retries. Queued downlinks are re-sent by the sweeper (scheduled invocation of SidewalkDownlinkLambda).
+
+    The SidewalkDownlinkRetries table holds at most one downlink per (wireless_device_id, command). A newer failed
+    downlink replaces the queued one, since it carries the newer acknowledgement (buttons), except for the LED state:
+    it is merged per LED into the queued one (the last requested state of every LED wins), as stored under
+    led_<index> with the time it was queued. Acknowledgements can be queued with an expiry, after which they are
+    not worth re-sending.
+    Downlinks, which failed in MAX_ATTEMPTS sweeps or with a permanent error, are kept with status DEAD (dead letters)
+    until they expire. Pending downlinks are read through the DUE_INDEX, which holds them by the next attempt.
+    """
+
+    TABLE_NAME = 'SidewalkDownlinkRetries'
+    STATUS_PENDING = 'PENDING'
+    STATUS_DEAD = 'DEAD'
+    MAX_ATTEMPTS = 10  # sweeps
+    BACKOFF_BASE = 60 * 1000  # milliseconds
+    BACKOFF_CAP = 3600 * 1000  # milliseconds
+    TIME_TO_LIVE = 7 * 24 * 3600  # seconds
+    DUE_INDEX = 'due'  # GSI: status HASH, next_attempt_at RANGE
+    LED_ATTRIBUTE_PREFIX = 'led_'
+
+    def __init__(self, table=None, clock=time.time, rng=random.random):
+        """
+        :param table:   SidewalkDownlinkRetries Table resource (created, if not given).
+        :param clock:   Wall clock, in seconds.
+        :param rng:     Random number generator (0-1), used for the jitter of the backoff.
+        """
+        self._table = table if table is not None else boto3.resource('dynamodb').Table(self.TABLE_NAME)
+        self._clock = clock
+        self._rng = rng
+
+    # ----------------
+    # Read operations
+    # ----------------
+    def get_due(self) -> [dict]:
+        """
+        Queries the queue for the pending downlinks, which are due to be re-sent.
+
+        :return:    List of queued items, oldest first.
+        """
+        query_kwargs = {
+            'IndexName': self.DUE_INDEX,
+            'KeyConditionExpression': Key('status').eq(self.STATUS_PENDING) & Key('next_attempt_at').lte(self._now())
+        }
+        items = []
+        while True:
+            response = self._table.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return sorted(items, key=lambda item: int(item['queued_at']))
+
+    @classmethod
+    def get_led_state(cls, item: dict) -> {int: (bool, int)}:
+        """
+        Gets the queued LED state.
+
+        :param item:    Queued item.
+        :return:        Dict keyed by the LED index: tuple of the state (True if on) and the time it was queued
+                        (UTC time in milliseconds). Empty if the item holds no LED state.
+        """
+        prefix = cls.LED_ATTRIBUTE_PREFIX
+        return {int(name[len(prefix):]): (bool(value['state']), int(value['queued_at']))
+                for name, value in item.items() if name.startswith(prefix)}
+
+    def is_expired(self, item: dict) -> bool:
+        """
+        Checks if the queued downlink is not worth re-sending anymore.
+
+        :param item:    Queued item.
+        :return:        True if the item has expired.
+        """
+        return 'expires_at' in item and int(item['expires_at']) <= self._now()
+
+    # -----------------
+    # Write operations
+    # -----------------
+    def enqueue(self, wireless_device_id: str, command: str, payload: bytes, error_code: str,
+                led_state: tuple = None, expires_in: int = None) -> dict:
+        """
+        Queues downlink to be re-sent by the sweeper. Replaces downlink with the same command queued for the device,
+        LED state is merged into the pending one instead (see: get_led_state).
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param command:             Demo app command.
+        :param payload:             Encoded command.
+        :param error_code:          Error code of the last attempt.
+        :param led_state:           Tuple of the LEDs turned on and off by the command (None if not tracked).
+        :param expires_in:          Milliseconds, after which the downlink is not re-sent (no expiry, if None).
+        :return:                    Queued item.
+        """
+        now = self._now()
+        item = {
+            'wireless_device_id': wireless_device_id,
+            'command': command,
+            'payload': payload,
+            'status': self.STATUS_PENDING,
+            'attempts': 0,
+            'queued_at': now,
+            'next_attempt_at': now + self._backoff(1),
+            'last_error': error_code,
+            'time_to_live': now // 1000 + self.TIME_TO_LIVE
+        }
+        if expires_in is not None:
+            item['expires_at'] = now + expires_in
+        if led_state is not None:
+            for leds, state in zip(led_state, (1, 0)):
+                for led in leds:
+                    item[f'{self.LED_ATTRIBUTE_PREFIX}{int(led)}'] = {'state': state, 'queued_at': now}
+            merged = self._merge(item)
+            if merged is not None:
+                return merged
+        self._table.put_item(Item=item)
+        return item
+
+    def delete_sent(self, item: dict) -> bool:
+        """
+        Removes downlink re-sent by the sweeper, unless it was replaced meanwhile.
+
+        :param item:    Queued item.
+        :return:        False if the item was replaced by a newer downlink.
+        """
+        return self._update_if_unchanged(item, self._table.delete_item)
+
+    def reschedule(self, item: dict, error_code: str) -> bool:
+        """
+        Schedules the next attempt of the downlink, which failed again with a transient error.
+        The downlink becomes a dead letter after MAX_ATTEMPTS attempts.
+
+        :param item:        Queued item.
+        :param error_code:  Error code of the attempt.
+        :return:            False if the item was replaced by a newer downlink.
+        """
+        attempts = int(item['attempts']) + 1
+        if attempts >= self.MAX_ATTEMPTS:
+            return self.mark_dead(item, error_code)
+        return self._update_if_unchanged(item, self._table.update_item,
+                                         UpdateExpression='SET attempts = :attempts, next_attempt_at = :next, '
+                                                          'last_error = :error',
+                                         values={':attempts': attempts,
+                                                 ':next': self._now() + self._backoff(attempts + 1),
+                                                 ':error': error_code})
+
+    def mark_dead(self, item: dict, error_code: str) -> bool:
+        """
+        Moves the downlink to the dead letters, which are kept for TIME_TO_LIVE since they died.
+
+        :param item:        Queued item.
+        :param error_code:  Error code of the last attempt.
+        :return:            False if the item was replaced by a newer downlink.
+        """
+        return self._update_if_unchanged(item, self._table.update_item,
+                                         UpdateExpression='SET #status = :dead, attempts = attempts + :one, '
+                                                          'last_error = :error, time_to_live = :ttl',
+                                         names={'#status': 'status'},
+                                         values={':dead': self.STATUS_DEAD, ':one': 1, ':error': error_code,
+                                                 ':ttl': self._now() // 1000 + self.TIME_TO_LIVE})
+
+    def _merge(self, item: dict) -> dict:
+        """
+        Merges the item into the pending item with the same key (or creates it).
+
+        :return:    Merged item, None if the queued item is a dead letter (which must not be revived).
+        """
+        key = {'wireless_device_id': item['wireless_device_id'], 'command': item['command']}
+        attributes = [name for name in item if name not in key]
+        try:
+            response = self._table.update_item(
+                Key=key,
+                UpdateExpression='SET ' + ', '.join(f'#a{idx} = :a{idx}' for idx in range(len(attributes))),
+                ConditionExpression='attribute_not_exists(queued_at) OR #status = :pending',
+                ExpressionAttributeNames=dict({f'#a{idx}': name for idx, name in enumerate(attributes)},
+                                              **{'#status': 'status'}),
+                ExpressionAttributeValues=dict({f':a{idx}': item[name] for idx, name in enumerate(attributes)},
+                                               **{':pending': self.STATUS_PENDING}),
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as err:
+            if err.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return None
+        return response['Attributes']
+
+    def _update_if_unchanged(self, item: dict, operation, values: dict = None, names: dict = None, **kwargs) -> bool:
+        """
+        Calls update_item or delete_item on the item, if it was not replaced since it was read.
+        """
+        try:
+            operation(Key={'wireless_device_id': item['wireless_device_id'], 'command': item['command']},
+                      ConditionExpression='queued_at = :queued_at',
+                      ExpressionAttributeValues=dict(values or {}, **{':queued_at': item['queued_at']}),
+                      **({'ExpressionAttributeNames': names} if names else {}),
+                      **kwargs)
+            return True
+        except ClientError as err:
+            if err.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def _backoff(self, attempt: int) -> int:
+        """
+        Returns delay of the attempt in milliseconds: exponential backoff with full jitter, at least BACKOFF_BASE / 2.
+        """
+        delay = min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** (attempt - 1))
+        return int(delay / 2 + self._rng() * delay / 2)
+
+    def _now(self) -> int:
+        return int(self._clock() * 1000)
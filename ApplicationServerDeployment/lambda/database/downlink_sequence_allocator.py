@@ -0,0 +1,100 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+
+import boto3
+
+
+class _SequenceBlock:
+    """
+    Block of the sequence numbers reserved for a single device.
+
+    Attributes
+    ----------
+        next: int
+            Next counter value to be allocated.
+        end: int
+            End of the block (exclusive).
+        expires_at: float
+            Monotonic time, when the unused part of the block is abandoned.
+        lock: threading.Lock
+            Serializes allocations for the device.
+    """
+    __slots__ = ('next', 'end', 'expires_at', 'lock')
+
+    def __init__(self):
+        self.next = 0
+        self.end = 0
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+
+class DownlinkSequenceAllocator:
+    """
+    Allocates Sidewalk Seq of the downlink messages, unique and increasing per device, intended to live
+    in the module scope of the warm Lambda container.
+
+    Every device has a counter in the SidewalkDownlinkSequences table. The allocator reserves a block
+    of BLOCK_SIZE counter values with a single atomic ADD and hands them out from memory, so only every
+    BLOCK_SIZE-th downlink reaches the table. Seq is the counter modulo SEQ_MODULUS, so it wraps around to 0
+    after the max Seq, and stays unique within any SEQ_MODULUS consecutive allocations.
+
+    Blocks reserved by different containers do not overlap, but downlinks sent concurrently from two containers
+    are ordered by their blocks, not by the time they were sent. Unused part of a block is abandoned after
+    BLOCK_TTL seconds, so an idle container does not send Seq older than the ones already sent by the others.
+    """
+
+    TABLE_NAME = 'SidewalkDownlinkSequences'
+    SEQ_MODULUS = 16384  # Sidewalk Seq is in range 0-16383
+    BLOCK_SIZE = 32
+    BLOCK_TTL = 60  # seconds
+
+    def __init__(self, block_size: int = BLOCK_SIZE, block_ttl: float = BLOCK_TTL, table=None,
+                 clock=time.monotonic):
+        self._block_size = block_size
+        self._block_ttl = block_ttl
+        self._table = table if table is not None else boto3.resource('dynamodb').Table(self.TABLE_NAME)
+        self._clock = clock
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self.reservations = 0
+
+    def allocate(self, wireless_device_id: str) -> int:
+        """
+        Allocates Seq of the next downlink message sent to the device.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :return:                    Sequence number (0 - SEQ_MODULUS-1).
+        """
+        with self._lock:
+            block = self._blocks.get(wireless_device_id)
+            if block is None:
+                block = self._blocks[wireless_device_id] = _SequenceBlock()
+
+        with block.lock:
+            if block.next >= block.end or self._clock() >= block.expires_at:
+                block.end = self._reserve_block(wireless_device_id)
+                block.next = block.end - self._block_size
+                block.expires_at = self._clock() + self._block_ttl
+            counter = block.next
+            block.next += 1
+        return counter % self.SEQ_MODULUS
+
+    def _reserve_block(self, wireless_device_id: str) -> int:
+        """
+        Atomically advances counter of the device by the block size.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :return:                    Counter value after the update (end of the reserved block, exclusive).
+        """
+        response = self._table.update_item(
+            Key={'wireless_device_id': wireless_device_id},
+            UpdateExpression='ADD next_seq :block_size',
+            ExpressionAttributeValues={':block_size': self._block_size},
+            ReturnValues='UPDATED_NEW'
+        )
+        with self._lock:
+            self.reservations += 1
+        return int(response['Attributes']['next_seq'])
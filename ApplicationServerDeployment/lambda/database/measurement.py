@@ -7,31 +7,35 @@ from typing import final
 @final
 class Measurement(object):
     """
-    A class that represents the Measurements table record.
+    A class that represents the SidewalkDeviceMeasurements table record.
 
     Attributes
     ----------
         _wireless_device_id: str
             Measurement source.
-        _value: int
+        _value: float
             Measured value.
         _time: int
-            UTC time in seconds.
+            UTC time of the reading in milliseconds (range key of the record).
+        _time_to_live: int
+            UTC time when record should be removed from the table (in seconds).
     """
+    __slots__ = ('_wireless_device_id', '_value', '_time', '_time_to_live')
 
     def __init__(self, wireless_device_id, temperature: int = None, timestamp: int = None, time_to_live: int = None):
         self._wireless_device_id = wireless_device_id
-        self._value = temperature
-        self._time = timestamp
+        self._value = None if temperature is None else float(temperature)
+        self._time = None if timestamp is None else int(timestamp)
+        self._time_to_live = None if time_to_live is None else int(time_to_live)
 
     def get_wireless_device_id(self) -> str:
         return self._wireless_device_id
 
     def get_value(self) -> float:
-        return float(self._value)
+        return self._value
 
     def get_time(self) -> int:
-        return int(self._time)
+        return self._time
 
     def to_dict(self) -> dict:
         """
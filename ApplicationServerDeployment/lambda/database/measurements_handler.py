@@ -2,65 +2,131 @@
 # SPDX-License-Identifier: MIT-0
 import boto3
 import logging
+import random
 import time
 
 from botocore.exceptions import ClientError
 from decimal import Decimal
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Key
 
 from measurement import Measurement
 
 logger = logging.getLogger(__name__)
 
 
+class UnprocessedMeasurementsError(Exception):
+    """
+    Raised when some of the measurements were not written, after all retries of the batch write.
+
+    Attributes
+    ----------
+        measurements: [Measurement]
+            Measurements, which were not written.
+    """
+
+    def __init__(self, measurements: [Measurement]):
+        super().__init__(f'{len(measurements)} measurements were not written')
+        self.measurements = measurements
+
+
 class MeasurementsHandler:
     """
     A class that provides read and write methods for the Measurements table.
+    Records are keyed by the device (HASH) and the time of the reading in milliseconds (RANGE).
     """
 
-    TABLE_NAME = 'SidewalkMeasurements'
+    TABLE_NAME = 'SidewalkDeviceMeasurements'
+    BATCH_SIZE = 25  # max number of items in a single BatchWriteItem request
+    MAX_ATTEMPTS = 8
+    BACKOFF_BASE = 0.05  # seconds
+    BACKOFF_CAP = 2.0  # seconds
+    DEFAULT_TIME_SPAN = 3600 * 1000  # milliseconds, equal to the time to live of the records
+    FIELD_ATTRIBUTES = {'wireless_device_id': 'wireless_device_id', 'value': 'temperature', 'time': 'timestamp'}
 
-    def __init__(self):
-        self._table = boto3.resource('dynamodb').Table(self.TABLE_NAME)
+    def __init__(self, sleep=time.sleep):
+        self._dynamodb = boto3.resource('dynamodb')
+        self._table = self._dynamodb.Table(self.TABLE_NAME)
+        self._sleep = sleep
 
     # ----------------
     # Read operations
     # ----------------
 
-    def get_measurements_for_device(self, wireless_device_id: str) -> [Measurement]:
+    def get_measurements_for_device(self, wireless_device_id: str, start: int = None, end: int = None,
+                                    limit: int = None) -> [Measurement]:
         """
-        Queries Measurements table for the records coming from given device withing a given time span.
+        Queries the Measurements table for the records coming from given device within a given time span,
+        newest first.
 
         :param wireless_device_id:  Id of the wireless device.
+        :param start:               Start of the time span (UTC time in milliseconds, inclusive).
+                                    Defaults to the end - DEFAULT_TIME_SPAN.
+        :param end:                 End of the time span (UTC time in milliseconds, inclusive). Defaults to now.
+        :param limit:               Max number of the returned records (all records from the time span, if not given).
         :return:                    List of Measurement objects.
         """
+        measurements, _ = self.get_measurements_page(wireless_device_id, start, end, limit)
+        return measurements
+
+    def get_measurements_page(self, wireless_device_id: str, start: int = None, end: int = None, limit: int = None,
+                              start_key: dict = None, fields: tuple = None) -> ([Measurement], dict):
+        """
+        Queries the Measurements table for a page of the records coming from given device within a given time span,
+        newest first.
+
+        :param wireless_device_id:  Id of the wireless device.
+        :param start:               Start of the time span, see: get_measurements_for_device.
+        :param end:                 End of the time span, see: get_measurements_for_device.
+        :param limit:               Max number of the returned records (all records from the time span, if not given).
+        :param start_key:           LastEvaluatedKey returned with the previous page (None for the first page).
+        :param fields:              Names of the fetched fields of Measurement.to_dict (all fields, if None).
+        :return:                    Tuple of list of Measurement objects and LastEvaluatedKey
+                                    (None if there are no more pages).
+        """
+        if end is None:
+            end = int(time.time_ns() / 1000000)
+        if start is None:
+            start = end - self.DEFAULT_TIME_SPAN
         items = []
+        last_evaluated_key = None
         try:
-            t_now = int(time.time())
-            filter_expression = Attr('wireless_device_id').eq(wireless_device_id) & Attr('time_to_live').gte(t_now)
-            response = self._table.scan(IndexName='wireless_device_id', FilterExpression=filter_expression)
-            items.extend(response.get('Items', []))
-            while "NextToken" in response:
-                response = self._table.scan(IndexName='wireless_device_id',
-                                            FilterExpression=filter_expression,
-                                            NextToken=response["NextToken"])
+            query_kwargs = {
+                'KeyConditionExpression': Key('wireless_device_id').eq(wireless_device_id) &
+                                          Key('timestamp').between(start, end),
+                'ScanIndexForward': False
+            }
+            if start_key is not None:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            if fields:
+                names = {f'#a{idx}': self.FIELD_ATTRIBUTES[field] for idx, field in enumerate(fields)}
+                query_kwargs['ProjectionExpression'] = ', '.join(names)
+                query_kwargs['ExpressionAttributeNames'] = names
+            while True:
+                if limit is not None:
+                    query_kwargs['Limit'] = limit - len(items)
+                response = self._table.query(**query_kwargs)
                 items.extend(response.get('Items', []))
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                if last_evaluated_key is None or (limit is not None and len(items) >= limit):
+                    break
+                query_kwargs['ExclusiveStartKey'] = last_evaluated_key
         except ClientError as err:
-            logger.error(f'Error while calling get_all_devices: {err}')
+            logger.error(f'Error while calling get_measurements_for_device: {err}')
             raise
         else:
             measurements = []
             for item in items:
+                item.setdefault('wireless_device_id', wireless_device_id)
                 measurement = Measurement(**item)
                 measurements.append(measurement)
-            return measurements
+            return measurements, last_evaluated_key
 
     # -----------------
     # Write operations
     # -----------------
     def add_measurement(self, measurement: Measurement):
         """
-        Adds measurement object to the SidewalkMeasurement table.
+        Adds measurement object to the SidewalkDeviceMeasurements table.
 
         _time_to_live attribute is ignored.
         time_to_live field is set to the current_time + 24 hours.
@@ -77,8 +143,7 @@ class MeasurementsHandler:
                     'wireless_device_id': measurement.get_wireless_device_id(),
                     'temperature': Decimal(measurement.get_value()),
                     'time_to_live': ttl
-                },
-                ReturnValues="ALL_OLD"
+                }
             )
         except ClientError as err:
             logger.error(
@@ -89,9 +154,85 @@ class MeasurementsHandler:
             measurement._time_to_live = ttl
             return measurement
 
+    def add_measurements(self, measurements: [Measurement]) -> [Measurement]:
+        """
+        Adds measurement objects to the SidewalkDeviceMeasurements table with BatchWriteItem requests of up to 25 items.
+        UnprocessedItems are retried with exponential backoff and full jitter.
+
+        Measurement time is used as the timestamp (current time, if not set). Measurements of the same device
+        with the same timestamp share the key, only the last of them is written.
+        time_to_live field is set to the current_time + 1 hour.
+
+        :param measurements:    List of Measurement objects.
+        :return:                List of updated Measurement objects.
+        :raises UnprocessedMeasurementsError: If some of the measurements were not written after all retries.
+        """
+        ttl = self._get_dynamodb_item_time_to_live(int(time.time()))
+        now = int(time.time_ns() / 1000000)
+        items = {}
+        for measurement in measurements:
+            if measurement._time is None:
+                measurement._time = now
+            measurement._time_to_live = ttl
+            # BatchWriteItem rejects requests with duplicate keys
+            items[self._key(measurement)] = measurement
+        if len(items) < len(measurements):
+            logger.warning(f'{len(measurements) - len(items)} measurements with duplicate keys were skipped')
+
+        unprocessed = []
+        requests = [self._put_request(measurement) for measurement in items.values()]
+        for i in range(0, len(requests), self.BATCH_SIZE):
+            unprocessed.extend(self._batch_write(requests[i:i + self.BATCH_SIZE]))
+
+        if unprocessed:
+            not_written = [items[(request['PutRequest']['Item']['wireless_device_id'],
+                                  int(request['PutRequest']['Item']['timestamp']))] for request in unprocessed]
+            logger.error(f'Error while calling add_measurements: {len(not_written)} measurements were not written')
+            raise UnprocessedMeasurementsError(not_written)
+        return list(items.values())
+
     # -----------------
     # For internal use
     # -----------------
+    @staticmethod
+    def _key(measurement: Measurement) -> (str, int):
+        return measurement.get_wireless_device_id(), measurement.get_time()
+
+    @staticmethod
+    def _put_request(measurement: Measurement) -> dict:
+        return {
+            'PutRequest': {
+                'Item': {
+                    'timestamp': measurement.get_time(),
+                    'wireless_device_id': measurement.get_wireless_device_id(),
+                    'temperature': Decimal(measurement.get_value()),
+                    'time_to_live': measurement._time_to_live
+                }
+            }
+        }
+
+    def _batch_write(self, requests: [dict]) -> [dict]:
+        """
+        Writes up to 25 put requests, retrying UnprocessedItems.
+
+        :param requests:    List of PutRequest dicts.
+        :return:            List of requests, which were not processed after MAX_ATTEMPTS.
+        """
+        for attempt in range(self.MAX_ATTEMPTS):
+            if attempt > 0:
+                self._sleep(random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt)))
+            try:
+                response = self._dynamodb.batch_write_item(RequestItems={self.TABLE_NAME: requests})
+            except ClientError as err:
+                if err.response['Error']['Code'] != 'ProvisionedThroughputExceededException':
+                    logger.error(f'Error while calling batch_write_item: {err}')
+                    raise
+                continue
+            requests = response.get('UnprocessedItems', {}).get(self.TABLE_NAME, [])
+            if not requests:
+                break
+        return requests
+
     @staticmethod
     def _get_dynamodb_item_time_to_live(timestamp: int) -> int:
         return timestamp + 3600
@@ -3,26 +3,48 @@
 
 import boto3
 import logging
+import queue
+import threading
 import time
+import zlib
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
 from device import Device
+from device_cache import DeviceCache
 from link_type import LinkType
 from unit import Unit
 
 
 logger = logging.getLogger(__name__)
 
+# Attributes read by Device.to_dict
+DEVICE_ATTRIBUTES = ('wireless_device_id', 'led', 'led_on', 'button', 'button_pressed', 'link_type', 'sensor',
+                     'sensor_unit', 'last_uplink', 'time_to_live')
+
+_SEGMENT_DONE = object()
+
 
 class SidewalkDevicesHandler:
     """
     A class that provides read and write methods for the SidewalkDevices table.
+
+    If DeviceCache is given, get_device reads through the cache and every write refreshes it
+    with the updated record.
     """
 
     TABLE_NAME = 'SidewalkDevices'
+    TIME_TO_LIVE = 24 * 3600  # seconds
+    LAST_UPLINK_INDEX = 'last_uplink'  # sparse GSI: last_uplink_bucket HASH, last_uplink RANGE
+    LAST_UPLINK_BUCKET_SIZE = 3600  # seconds
+    LAST_UPLINK_SHARDS = 8  # buckets of the same hour, devices are spread by the hash of wireless_device_id
+    LAST_UPLINK_ACTIONS = 'last_uplink=:last_uplink, last_uplink_bucket=:last_uplink_bucket, time_to_live=:TTL'
 
-    def __init__(self):
+    def __init__(self, cache: DeviceCache = None):
         self._table = boto3.resource('dynamodb').Table(self.TABLE_NAME)
+        self._cache = cache
+        self._thread_local = threading.local()
 
     # ----------------
     # Read operations
@@ -34,6 +56,10 @@ class SidewalkDevicesHandler:
         :param wireless_device_id:  Wireless device ID.
         :return:                    Device object.
         """
+        if self._cache is not None:
+            device = self._cache.get(wireless_device_id)
+            if device is not None:
+                return device
         try:
             response = self._table.get_item(Key={'wireless_device_id': wireless_device_id})
         except ClientError as err:
@@ -41,30 +67,147 @@ class SidewalkDevicesHandler:
             raise
         else:
             if 'Item' in response:
-                return Device(**response['Item'])
+                return self._cache_device(Device(**response['Item']))
 
-    def get_all_devices(self) -> [Device]:
+    def get_all_devices(self, total_segments: int = 1, attributes: tuple = DEVICE_ATTRIBUTES) -> [Device]:
         """
         Gets all available records from the SidewalkDevices table.
 
-        :return:    List of Device objects.
+        :param total_segments:  Number of segments scanned in parallel, see: iter_all_devices.
+        :param attributes:      Names of the fetched attributes (all attributes, if None).
+        :return:                List of Device objects.
+        """
+        return list(self.iter_all_devices(total_segments, attributes))
+
+    def get_devices_page(self, limit: int, start_key: dict = None,
+                         attributes: tuple = DEVICE_ATTRIBUTES) -> ([Device], dict):
+        """
+        Gets a page of records from the SidewalkDevices table.
+
+        :param limit:           Max number of the returned records.
+        :param start_key:       LastEvaluatedKey returned with the previous page (None for the first page).
+        :param attributes:      Names of the fetched attributes (all attributes, if None).
+        :return:                Tuple of list of Device objects and LastEvaluatedKey (None if there are no more pages).
         """
+        scan_kwargs = self._projection(attributes)
+        if start_key is not None:
+            scan_kwargs['ExclusiveStartKey'] = start_key
         items = []
+        last_evaluated_key = None
         try:
-            response = self._table.scan()
-            items.extend(response.get('Items', []))
-            while "NextToken" in response:
-                response = self._table.scan(NextToken=response["NextToken"])
+            while len(items) < limit:
+                response = self._table.scan(Limit=limit - len(items), **scan_kwargs)
                 items.extend(response.get('Items', []))
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                if last_evaluated_key is None:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+        except ClientError as err:
+            logger.error(f'Error while calling get_devices_page: {err}')
+            raise
+        else:
+            return [Device(**item) for item in items], last_evaluated_key
+
+    def iter_all_devices(self, total_segments: int = 1, attributes: tuple = DEVICE_ATTRIBUTES):
+        """
+        Scans the SidewalkDevices table and yields the devices page by page, as the pages are read.
+
+        If total_segments is greater than 1, table is split into segments (Segment/TotalSegments),
+        which are scanned by the thread pool. Every thread uses its own boto3 resource,
+        since resources are not thread safe. Order of the devices is not defined.
+
+        :param total_segments:  Number of segments scanned in parallel.
+        :param attributes:      Names of the fetched attributes (all attributes, if None).
+        :return:                Generator of Device objects.
+        """
+        scan_kwargs = self._projection(attributes)
+        try:
+            if total_segments <= 1:
+                for items in self._scan_pages(self._table, scan_kwargs):
+                    yield from (Device(**item) for item in items)
+                return
+
+            pages = queue.Queue()
+            stopped = threading.Event()
+
+            def scan_segment(segment: int):
+                try:
+                    segment_kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+                    for items in self._scan_pages(self._get_thread_table(), segment_kwargs):
+                        if stopped.is_set():
+                            break
+                        pages.put(items)
+                except Exception as err:
+                    pages.put(err)
+                finally:
+                    pages.put(_SEGMENT_DONE)
+
+            with ThreadPoolExecutor(max_workers=total_segments) as executor:
+                for segment in range(total_segments):
+                    executor.submit(scan_segment, segment)
+                try:
+                    done = 0
+                    while done < total_segments:
+                        page = pages.get()
+                        if page is _SEGMENT_DONE:
+                            done += 1
+                        elif isinstance(page, Exception):
+                            raise page
+                        else:
+                            yield from (Device(**item) for item in page)
+                finally:
+                    stopped.set()
         except ClientError as err:
             logger.error(f'Error while calling get_all_devices: {err}')
             raise
+
+    def get_devices_changed_since(self, since: int, now: int = None,
+                                  attributes: tuple = DEVICE_ATTRIBUTES) -> [Device]:
+        """
+        Queries last_uplink index for the devices, which sent an uplink after the given time.
+
+        Index is partitioned by last_uplink_bucket (hour of last_uplink and shard of the device, see:
+        _get_last_uplink_bucket), so that writes of an hour are spread over LAST_UPLINK_SHARDS partitions.
+        Every bucket between since and now is queried, shards of the buckets in parallel. Buckets older than
+        the time to live of the records are skipped. Records written before the index was sharded are indexed
+        with their next uplink.
+
+        :param since:       UTC time in seconds (exclusive).
+        :param now:         UTC time in seconds (current time, if not given).
+        :param attributes:  Names of the fetched attributes (all attributes, if None).
+        :return:            List of Device objects.
+        """
+        if now is None:
+            now = int(time.time())
+        first_hour = max(since, now - self.TIME_TO_LIVE) // self.LAST_UPLINK_BUCKET_SIZE
+        buckets = [hour * self.LAST_UPLINK_SHARDS + shard
+                   for hour in range(first_hour, now // self.LAST_UPLINK_BUCKET_SIZE + 1)
+                   for shard in range(self.LAST_UPLINK_SHARDS)]
+
+        def query_bucket(bucket: int) -> [dict]:
+            query_kwargs = dict(self._projection(attributes),
+                                IndexName=self.LAST_UPLINK_INDEX,
+                                KeyConditionExpression=Key('last_uplink_bucket').eq(bucket) &
+                                                       Key('last_uplink').gt(since))
+            table = self._get_thread_table()
+            bucket_items = []
+            while True:
+                response = table.query(**query_kwargs)
+                bucket_items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return bucket_items
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        items = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.LAST_UPLINK_SHARDS) as executor:
+                for bucket_items in executor.map(query_bucket, buckets):
+                    items.extend(bucket_items)
+        except ClientError as err:
+            logger.error(f'Error while calling get_devices_changed_since: {err}')
+            raise
         else:
-            devices = []
-            for item in items:
-                device = Device(**item)
-                devices.append(device)
-            return devices
+            return [Device(**item) for item in items]
 
     # -----------------
     # Write operations
@@ -81,30 +224,34 @@ class SidewalkDevicesHandler:
         :return:        Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
-            self._table.put_item(
-                Item={
-                    'wireless_device_id': device.get_wireless_device_id(),
-                    'led': device.get_led(),
-                    'led_on': device.get_led_on(),
-                    'button': device.get_button(),
-                    'button_pressed': device.get_button_pressed(),
-                    'link_type': device.get_link_type().value,
-                    'sensor': device.is_sensor(),
-                    'sensor_unit': device.get_sensor_unit().value,
-                    'last_uplink': int(time.time()),
-                    'time_to_live': ttl
-                },
-                ReturnValues="ALL_OLD"
-            )
+            values = self._last_uplink_values(device.get_wireless_device_id())
+            ttl = values[':TTL']
+            last_uplink = values[':last_uplink']
+            item = {
+                'wireless_device_id': device.get_wireless_device_id(),
+                'led': device.get_led(),
+                'button': device.get_button(),
+                'button_pressed': device.get_button_pressed_map(),
+                'link_type': device.get_link_type().value,
+                'sensor': device.is_sensor(),
+                'sensor_unit': device.get_sensor_unit().value,
+                'last_uplink': last_uplink,
+                'last_uplink_bucket': values[':last_uplink_bucket'],
+                'time_to_live': ttl
+            }
+            if device.get_led_on():
+                item['led_on'] = set(device.get_led_on())
+            self._table.put_item(Item=item, ReturnValues="ALL_OLD")
         except ClientError as err:
             logger.error(
                 f'Error while calling add_device for wireless_device_id: {device.get_wireless_device_id()}: {err}'
             )
+            self._invalidate_device(device.get_wireless_device_id())
             raise
         else:
+            device._last_uplink = last_uplink
             device._time_to_live = ttl
-            return device
+            return self._cache_device(device)
 
     def update_device(self, wireless_device_id: str, led_on: [int], button_pressed: dict,
                       link_type: LinkType, is_sensor: bool, sensor_unit: Unit) -> Device:
@@ -113,39 +260,37 @@ class SidewalkDevicesHandler:
 
         :param wireless_device_id:  Wireless device ID.
         :param led_on:              List of indices of the LEDs, which are turned on.
-        :param button_pressed:      List of dicts indicating buttons state, see: Device class.
+        :param button_pressed:      List of dicts (or map) indicating buttons state, see: Device class.
         :param link_type:           LinkType object.
         :param is_sensor:           True if sensor is available on the board, False otherwise.
         :param sensor_unit:         Enum that describes sensor units.
         :return:                    Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
+            values = {
+                ':button_pressed': self._to_button_pressed_map(button_pressed),
+                ':link_type': link_type.name,
+                ':sensor': is_sensor,
+                ':sensor_unit': sensor_unit.value,
+                **self._last_uplink_values(wireless_device_id)
+            }
+            led_on_expression = self._led_on_expression(led_on, values)
             response = self._table.update_item(
                 Key={'wireless_device_id': wireless_device_id},
                 UpdateExpression="set "
-                                 "led_on=:led_on, "
                                  "button_pressed=:button_pressed, "
                                  "link_type=:link_type, "
                                  "sensor=:sensor, "
-                                 "sensor_unit=:sensor_unit, "
-                                 "last_uplink=:last_uplink, "
-                                 "time_to_live=:TTL",
-                ExpressionAttributeValues={
-                    ':led_on': led_on,
-                    ':button_pressed': button_pressed,
-                    ':link_type': link_type.name,
-                    ':sensor': is_sensor,
-                    ':sensor_unit': sensor_unit.value,
-                    ':last_uplink': int(time.time()),
-                    ':TTL': ttl
-                },
+                                 "sensor_unit=:sensor_unit, " +
+                                 self.LAST_UPLINK_ACTIONS + led_on_expression,
+                ExpressionAttributeValues=values,
                 ReturnValues="ALL_NEW")
         except ClientError as err:
             logger.error(f'Error while calling update_device for wireless_device_id: {wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
             raise
         else:
-            return Device(**response['Attributes'])
+            return self._cache_device(Device(**response['Attributes']))
 
     def update_link_type_and_last_uplink(self, wireless_device_id: str, link_type: LinkType) -> Device:
         """
@@ -156,22 +301,21 @@ class SidewalkDevicesHandler:
         :return:                    Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
             response = self._table.update_item(
                 Key={'wireless_device_id': wireless_device_id},
-                UpdateExpression="set last_uplink=:last_uplink, time_to_live=:TTL, link_type=:link_type",
+                UpdateExpression="set " + self.LAST_UPLINK_ACTIONS + ", link_type=:link_type",
                 ExpressionAttributeValues={
-                    ':last_uplink': int(time.time()),
                     ':link_type': link_type.name,
-                    ':TTL': ttl
+                    **self._last_uplink_values(wireless_device_id)
                 },
                 ReturnValues="ALL_NEW")
         except ClientError as err:
             logger.error(f'Error while calling update_link_type_and_last_uplink for wireless_device_id: '
                          f'{wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
             raise
         else:
-            return Device(**response['Attributes'])
+            return self._cache_device(Device(**response['Attributes']))
 
     def update_last_uplink(self, wireless_device_id: str) -> Device:
         """
@@ -181,76 +325,343 @@ class SidewalkDevicesHandler:
         :return:                    Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
             response = self._table.update_item(
                 Key={'wireless_device_id': wireless_device_id},
-                UpdateExpression="set last_uplink=:last_uplink, time_to_live=:TTL",
-                ExpressionAttributeValues={
-                    ':last_uplink': int(time.time()),
-                    ':TTL': ttl
-                },
+                UpdateExpression="set " + self.LAST_UPLINK_ACTIONS,
+                ExpressionAttributeValues=self._last_uplink_values(wireless_device_id),
                 ReturnValues="ALL_NEW")
         except ClientError as err:
             logger.error(f'Error while calling update_last_uplink for wireless_device_id: {wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
             raise
         else:
-            return Device(**response['Attributes'])
+            return self._cache_device(Device(**response['Attributes']))
 
     def update_button_and_last_uplink(self, wireless_device_id: str, button_pressed: dict) -> Device:
         """
         Updates button_pressed, last_uplink and time_to_live fields of the record stored in SidewalkDevices table.
+        Overwrites state of all buttons, see: toggle_buttons_and_last_uplink for atomic update.
 
         :param wireless_device_id:  Wireless device ID.
-        :param button_pressed:      List of dicts indicating buttons state, see: Device class.
+        :param button_pressed:      List of dicts (or map) indicating buttons state, see: Device class.
         :return:                    Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
             response = self._table.update_item(
                 Key={'wireless_device_id': wireless_device_id},
-                UpdateExpression="set last_uplink=:last_uplink, button_pressed=:button_pressed, time_to_live=:TTL",
+                UpdateExpression="set " + self.LAST_UPLINK_ACTIONS + ", button_pressed=:button_pressed",
                 ExpressionAttributeValues={
-                    ':last_uplink': int(time.time()),
-                    ':button_pressed': button_pressed,
-                    ':TTL': ttl
+                    ':button_pressed': self._to_button_pressed_map(button_pressed),
+                    **self._last_uplink_values(wireless_device_id)
                 },
                 ReturnValues="ALL_NEW")
         except ClientError as err:
             logger.error(f'Error while calling update_button_and_last_uplink for wireless_device_id: '
                          f'{wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
             raise
         else:
-            return Device(**response['Attributes'])
+            return self._cache_device(Device(**response['Attributes']))
 
     def update_led_and_last_uplink(self, wireless_device_id: str, led_on: [int]) -> Device:
         """
         Updates led_on, last_uplink and time_to_live fields of the record stored in SidewalkDevices table.
+        Overwrites state of all LEDs, see: update_led_state_and_last_uplink for atomic update.
 
         :param wireless_device_id:  Wireless device ID.
         :param led_on:              List of indices of the LEDs, which are turned on.
         :return:                    Updated Device object.
         """
         try:
-            ttl = self._get_dynamodb_item_time_to_live()
+            values = self._last_uplink_values(wireless_device_id)
             response = self._table.update_item(
                 Key={'wireless_device_id': wireless_device_id},
-                UpdateExpression="set last_uplink=:last_uplink, led_on=:led_on, time_to_live=:TTL",
-                ExpressionAttributeValues={
-                    ':last_uplink': int(time.time()),
-                    ':led_on': led_on,
-                    ':TTL': ttl
-                },
+                UpdateExpression="set " + self.LAST_UPLINK_ACTIONS + self._led_on_expression(led_on, values),
+                ExpressionAttributeValues=values,
                 ReturnValues="ALL_NEW")
         except ClientError as err:
             logger.error(f'Error while calling update_led_and_last_uplink for wireless_device_id: '
                          f'{wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
             raise
         else:
-            return Device(**response['Attributes'])
+            return self._cache_device(Device(**response['Attributes']))
+
+    def toggle_buttons_and_last_uplink(self, wireless_device_id: str, button_ids: [int], seq_n: int) -> Device:
+        """
+        Toggles state of the pressed buttons and updates last_uplink and time_to_live fields
+        of the record stored in SidewalkDevices table.
+
+        Button is toggled only if its seqN is lower than seq_n, so retried or out-of-order uplinks do not
+        toggle it twice. Condition is evaluated by DynamoDB, which makes the update atomic and, as long as no button
+        was toggled already, done in a single UpdateItem call. Records with list-shaped button_pressed
+        (written by the previous versions) are updated with read-modify-write and converted into map shape.
+        Record of an unknown device is not created.
+
+        :param wireless_device_id:  Wireless device ID.
+        :param button_ids:          List of indices of the pressed buttons.
+        :param seq_n:               Sidewalk Seq of the uplink.
+        :return:                    Updated Device object, None if the device does not exist.
+        """
+        button_ids = sorted(set(int(button_id) for button_id in button_ids))
+        if not button_ids:
+            return self.update_last_uplink(wireless_device_id)
+        try:
+            try:
+                return self._toggle_buttons(wireless_device_id, {button_id: {seq_n} for button_id in button_ids})
+            except ClientError as err:
+                error_code = err.response['Error']['Code']
+                if error_code == 'ValidationException':
+                    return self._toggle_buttons_read_modify_write(wireless_device_id, button_ids, seq_n)
+                if error_code != 'ConditionalCheckFailedException':
+                    raise
+
+            # some of the buttons were toggled already (or are not available), toggle the rest one by one
+            device = None
+            if len(button_ids) > 1:
+                for button_id in button_ids:
+                    try:
+                        device = self._toggle_buttons(wireless_device_id, {button_id: {seq_n}})
+                    except ClientError as err:
+                        if err.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                            raise
+            return device if device is not None else self._update_last_uplink_if_exists(wireless_device_id)
+        except ClientError as err:
+            logger.error(f'Error while calling toggle_buttons_and_last_uplink for wireless_device_id: '
+                         f'{wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
+            raise
+
+    def apply_button_presses_and_last_uplink(self, wireless_device_id: str, presses: [tuple]) -> Device:
+        """
+        Applies button presses reported by multiple uplinks (e.g. a batch of uplinks of the same device)
+        in a single UpdateItem call. Button pressed in an odd number of uplinks is toggled, seqN of every pressed
+        button is set to the newest Seq. If any of the uplinks was applied already, presses are applied
+        one by one, see: toggle_buttons_and_last_uplink.
+
+        :param wireless_device_id:  Wireless device ID.
+        :param presses:             List of (Sidewalk Seq of the uplink, list of indices of the pressed buttons).
+        :return:                    Updated Device object.
+        """
+        seqs_by_button = {}
+        for seq_n, button_ids in presses:
+            for button_id in button_ids:
+                seqs_by_button.setdefault(int(button_id), set()).add(seq_n)
+        if len(presses) == 1 or not seqs_by_button:
+            seq_n, button_ids = presses[0] if presses else (None, [])
+            return self.toggle_buttons_and_last_uplink(wireless_device_id, button_ids, seq_n)
+        try:
+            return self._toggle_buttons(wireless_device_id, seqs_by_button)
+        except ClientError as err:
+            if err.response['Error']['Code'] not in ('ConditionalCheckFailedException', 'ValidationException'):
+                logger.error(f'Error while calling apply_button_presses_and_last_uplink for wireless_device_id: '
+                             f'{wireless_device_id}: {err}')
+                self._invalidate_device(wireless_device_id)
+                raise
+        device = None
+        for seq_n, button_ids in sorted(presses, key=lambda press: press[0]):
+            device = self.toggle_buttons_and_last_uplink(wireless_device_id, button_ids, seq_n)
+        return device
+
+    def update_led_state_and_last_uplink(self, wireless_device_id: str, led_on: [int], led_off: [int]) -> Device:
+        """
+        Adds LEDs to and removes them from the led_on number set and updates last_uplink and time_to_live fields
+        of the record stored in SidewalkDevices table. LED present in both lists ends up turned off.
+
+        Sets are updated by DynamoDB (ADD/DELETE), so concurrent updates are not lost. ADD and DELETE
+        of the same attribute can not be combined in one expression, so two UpdateItem calls are made
+        if both lists are not empty. Records with list-shaped led_on (written by the previous versions)
+        are updated with read-modify-write and converted into number set.
+
+        :param wireless_device_id:  Wireless device ID.
+        :param led_on:              List of indices of the LEDs, which were turned on.
+        :param led_off:             List of indices of the LEDs, which were turned off.
+        :return:                    Updated Device object.
+        """
+        led_on = set(int(led_id) for led_id in led_on)
+        led_off = set(int(led_id) for led_id in led_off)
+        if not led_on and not led_off:
+            return self.update_last_uplink(wireless_device_id)
+        try:
+            device = None
+            if led_on:
+                device = self._update_with_last_uplink(wireless_device_id, {':led_ids': led_on},
+                                                       other_actions="add led_on :led_ids")
+            if led_off:
+                device = self._update_with_last_uplink(wireless_device_id, {':led_ids': led_off},
+                                                       other_actions="delete led_on :led_ids")
+            return device
+        except ClientError as err:
+            if err.response['Error']['Code'] == 'ValidationException':
+                device = self.get_device(wireless_device_id)
+                led_on_set = set(device.get_led_on() if device is not None else [])
+                led_on_set.update(led_on)
+                led_on_set.difference_update(led_off)
+                return self.update_led_and_last_uplink(wireless_device_id, sorted(led_on_set))
+            logger.error(f'Error while calling update_led_state_and_last_uplink for wireless_device_id: '
+                         f'{wireless_device_id}: {err}')
+            self._invalidate_device(wireless_device_id)
+            raise
 
     # -----------------
     # For internal use
     # -----------------
+    def _toggle_buttons(self, wireless_device_id: str, seqs_by_button: dict) -> Device:
+        """
+        Toggles buttons pressed in an odd number of uplinks, sets seqN of every button to the newest Seq.
+        Fails with ConditionalCheckFailedException if any of the uplinks was applied already.
+        """
+        set_actions = []
+        conditions = []
+        names = {'#state': 'state'}
+        values = {':one': 1}
+        for idx, (button_id, seqs) in enumerate(sorted(seqs_by_button.items())):
+            names[f'#b{idx}'] = str(button_id)
+            values[f':first{idx}'] = min(seqs)
+            values[f':last{idx}'] = max(seqs)
+            if len(seqs) % 2:
+                set_actions.append(f'button_pressed.#b{idx}.#state = :one - button_pressed.#b{idx}.#state')
+            set_actions.append(f'button_pressed.#b{idx}.seqN = :last{idx}')
+            conditions.append(f'button_pressed.#b{idx}.seqN < :first{idx}')
+        return self._update_with_last_uplink(wireless_device_id, values, set_actions=set_actions, names=names,
+                                             condition=' and '.join(conditions))
+
+    def _toggle_buttons_read_modify_write(self, wireless_device_id: str, button_ids: [int], seq_n: int) -> Device:
+        device = self.get_device(wireless_device_id)
+        if device is None:
+            logger.warning(f'Device with wireless_device_id: {wireless_device_id} does not exist, buttons not toggled')
+            return None
+        buttons = device.get_button_pressed()
+        for button in buttons:
+            if button["id"] in button_ids and button["seqN"] < seq_n:
+                button["state"] = 1 - button["state"]
+                button["seqN"] = seq_n
+        return self.update_button_and_last_uplink(wireless_device_id, buttons)
+
+    def _update_last_uplink_if_exists(self, wireless_device_id: str) -> Device:
+        """
+        Updates last_uplink and time_to_live fields, unless the record does not exist (no record is created).
+        """
+        try:
+            return self._update_with_last_uplink(wireless_device_id, {},
+                                                 condition='attribute_exists(wireless_device_id)')
+        except ClientError as err:
+            if err.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.warning(f'Device with wireless_device_id: {wireless_device_id} does not exist, '
+                           f'last_uplink not updated')
+            return None
+
+    def _update_with_last_uplink(self, wireless_device_id: str, values: dict, set_actions: [str] = (),
+                                 other_actions: str = '', names: dict = None, condition: str = None) -> Device:
+        """
+        Updates last_uplink and time_to_live fields along with the given actions in a single UpdateItem call.
+        """
+        values = dict(values, **self._last_uplink_values(wireless_device_id))
+        kwargs = {
+            'Key': {'wireless_device_id': wireless_device_id},
+            'UpdateExpression': ' '.join(['set ' + ', '.join([self.LAST_UPLINK_ACTIONS, *set_actions]),
+                                          other_actions]).strip(),
+            'ExpressionAttributeValues': values,
+            'ReturnValues': 'ALL_NEW'
+        }
+        if names:
+            kwargs['ExpressionAttributeNames'] = names
+        if condition:
+            kwargs['ConditionExpression'] = condition
+        response = self._table.update_item(**kwargs)
+        return self._cache_device(Device(**response['Attributes']))
+
     @staticmethod
-    def _get_dynamodb_item_time_to_live() -> int:
-        return int(time.time() + 24 * 3600)
+    def _led_on_expression(led_on: [int], values: dict) -> str:
+        """
+        Returns update expression clause, which stores led_on as number set (empty sets are not allowed,
+        so attribute is removed instead).
+        """
+        if not led_on:
+            return " remove led_on"
+        values[':led_on'] = set(int(led_id) for led_id in led_on)
+        return ", led_on=:led_on"
+
+    @staticmethod
+    def _to_button_pressed_map(button_pressed) -> dict:
+        if isinstance(button_pressed, dict):
+            return button_pressed
+        return {str(int(button["id"])): {"seqN": button["seqN"], "state": button["state"]} for button in button_pressed}
+
+    @staticmethod
+    def _projection(attributes: tuple) -> dict:
+        """
+        Creates ProjectionExpression arguments of the scan call (attribute names are replaced with placeholders,
+        since some of them are reserved words).
+
+        :param attributes:  Names of the fetched attributes (all attributes, if None).
+        :return:            Dict with ProjectionExpression and ExpressionAttributeNames (empty, if attributes is None).
+        """
+        if not attributes:
+            return {}
+        names = {f'#a{idx}': attribute for idx, attribute in enumerate(attributes)}
+        return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+    @staticmethod
+    def _scan_pages(table, scan_kwargs: dict):
+        """
+        Scans the table (or its segment) following LastEvaluatedKey.
+
+        :param table:           DynamoDB Table resource.
+        :param scan_kwargs:     Arguments of the scan call.
+        :return:                Generator of the lists of items.
+        """
+        scan_kwargs = dict(scan_kwargs)
+        while True:
+            response = table.scan(**scan_kwargs)
+            yield response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _get_thread_table(self):
+        """
+        Returns SidewalkDevices Table resource of the current thread, created with its own session.
+
+        :return:    DynamoDB Table resource.
+        """
+        table = getattr(self._thread_local, 'table', None)
+        if table is None:
+            table = boto3.session.Session().resource('dynamodb').Table(self.TABLE_NAME)
+            self._thread_local.table = table
+        return table
+
+    def _cache_device(self, device: Device) -> Device:
+        if self._cache is not None:
+            self._cache.put(device)
+        return device
+
+    def _invalidate_device(self, wireless_device_id: str):
+        if self._cache is not None:
+            self._cache.invalidate(wireless_device_id)
+
+    @classmethod
+    def _last_uplink_values(cls, wireless_device_id: str) -> dict:
+        """
+        Returns values of the LAST_UPLINK_ACTIONS update expression clause for the current time.
+        """
+        last_uplink = int(time.time())
+        return {
+            ':last_uplink': last_uplink,
+            ':last_uplink_bucket': cls._get_last_uplink_bucket(last_uplink, wireless_device_id),
+            ':TTL': cls._get_dynamodb_item_time_to_live()
+        }
+
+    @classmethod
+    def _get_last_uplink_bucket(cls, last_uplink: int, wireless_device_id: str) -> int:
+        """
+        Returns key of the last_uplink index: hour of the last uplink * LAST_UPLINK_SHARDS + shard of the device.
+        Shard is derived from a stable hash (crc32), since hash() of str is randomized per process.
+        """
+        shard = zlib.crc32(wireless_device_id.encode('utf-8')) % cls.LAST_UPLINK_SHARDS
+        return last_uplink // cls.LAST_UPLINK_BUCKET_SIZE * cls.LAST_UPLINK_SHARDS + shard
+
+    @classmethod
+    def _get_dynamodb_item_time_to_live(cls) -> int:
+        return int(time.time() + cls.TIME_TO_LIVE)
@@ -0,0 +1,65 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for device state cache.
+"""
+import unittest
+
+from conftest import FakeClock
+from device import Device
+from device_cache import DeviceCache
+
+
+class TestDeviceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = DeviceCache(ttl=10, max_size=2, clock=self.clock)
+
+    def test_getPut_shouldSucceed(self):
+        self.assertIsNone(self.cache.get('device-1'))
+        device = Device('device-1', led=[1])
+        self.cache.put(device)
+        self.assertIs(self.cache.get('device-1'), device)
+        self.assertEqual(self.cache.stats(), {'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0,
+                                              'invalidations': 0})
+
+    def test_ttlExpired_shouldMiss(self):
+        self.cache.put(Device('device-1'))
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('device-1'))
+
+    def test_lruEviction_shouldSucceed(self):
+        self.cache.put(Device('device-1'))
+        self.cache.put(Device('device-2'))
+        self.cache.get('device-1')
+        self.cache.put(Device('device-3'))
+        self.assertIsNone(self.cache.get('device-2'))
+        self.assertIsNotNone(self.cache.get('device-1'))
+        self.assertIsNotNone(self.cache.get('device-3'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_trackSeq_inOrder_shouldKeepState(self):
+        self.cache.track_seq('device-1', 5)
+        self.cache.put(Device('device-1'))
+        self.cache.track_seq('device-1', 6)
+        self.assertIsNotNone(self.cache.get('device-1'))
+
+    def test_trackSeq_outOfOrderOrDuplicate_shouldDropState(self):
+        for next_seq in (5, 4, 8, None):
+            self.cache.track_seq('device-1', 5)
+            self.cache.put(Device('device-1'))
+            self.cache.track_seq('device-1', next_seq)
+            self.assertIsNone(self.cache.get('device-1'), f'Seq 5 followed by {next_seq}')
+        self.assertEqual(self.cache.stats()['invalidations'], 4)
+
+    def test_invalidate_shouldSucceed(self):
+        self.cache.put(Device('device-1'))
+        self.cache.invalidate('device-1')
+        self.assertIsNone(self.cache.get('device-1'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for coalescing of the LED requests.
+"""
+import unittest
+
+from botocore.exceptions import ClientError
+
+from conftest import FakeClock
+from downlink_coalescer import LedRequestCoalescer
+from protocol import TagType
+
+
+class FakePendingTable:
+    """
+    Emulates conditional UpdateItem and DeleteItem calls with the expressions used by LedRequestCoalescer.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.on_delete = None
+
+    @staticmethod
+    def _condition_failed():
+        return ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues):
+        paths = [ExpressionAttributeNames.get(name, name)
+                 for name, _ in (action.split(' = ') for action in UpdateExpression[len('SET '):].split(', '))]
+        if len(paths) != len(set(paths)):
+            raise ClientError({'Error': {'Code': 'ValidationException'}}, 'UpdateItem')
+        item = self.items.get(Key['wireless_device_id'])
+        if ConditionExpression == 'attribute_exists(leader)':
+            allowed = item is not None
+        else:
+            allowed = item is None or item['flush_at'] < ExpressionAttributeValues[':stale']
+        if not allowed:
+            raise self._condition_failed()
+        item = self.items.setdefault(Key['wireless_device_id'], {})
+        for action in UpdateExpression[len('SET '):].split(', '):
+            name, value = action.split(' = ')
+            item[ExpressionAttributeNames.get(name, name)] = ExpressionAttributeValues[value]
+
+    def delete_item(self, Key, ConditionExpression, ExpressionAttributeValues, ReturnValues):
+        if self.on_delete is not None:
+            self.on_delete()
+        item = self.items.get(Key['wireless_device_id'])
+        if item is None or item['leader'] != ExpressionAttributeValues[':token']:
+            raise self._condition_failed()
+        return {'Attributes': self.items.pop(Key['wireless_device_id'])}
+
+
+class TestLedRequestCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.table = FakePendingTable()
+        self.clock = FakeClock(1700000000.0)
+        self.coalescer = LedRequestCoalescer(0.5, table=self.table, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_submit_singleRequest_shouldSendItsState(self):
+        self.assertEqual(self.coalescer.submit('device-1', TagType.LED_ON, [2, 1]), ([1, 2], []))
+        self.assertAlmostEqual(self.clock.now, 1700000000.5)
+        self.assertEqual(self.table.items, {})
+
+    def test_submit_requestsWithinWindow_shouldBeMerged(self):
+        def other_requests():
+            self.table.on_delete = None
+            self.assertIsNone(self.coalescer.submit('device-1', TagType.LED_OFF, [1, 3]))
+            self.assertIsNone(self.coalescer.submit('device-1', TagType.LED_ON, [3]))
+
+        self.table.on_delete = other_requests
+        self.assertEqual(self.coalescer.submit('device-1', TagType.LED_ON, [1, 2]), ([2, 3], [1]))
+        self.assertEqual(self.coalescer.submit('device-1', TagType.LED_OFF, [2]), ([], [2]))
+
+    def test_submit_duplicateLeds_shouldBeMergedOnce(self):
+        self.assertEqual(self.coalescer.submit('device-1', TagType.LED_ON, [1, 1, 2]), ([1, 2], []))
+
+    def test_submit_staleLeader_shouldBeReplaced(self):
+        self.table.items['device-1'] = {'leader': 'crashed', 'flush_at': 1600000000000, 'led_4': 1}
+        self.assertEqual(self.coalescer.submit('device-1', TagType.LED_OFF, [1]), ([4], [1]))
+
+    def test_submit_takenOver_shouldNotSend(self):
+        def take_over():
+            self.table.items['device-1']['leader'] = 'other'
+
+        self.table.on_delete = take_over
+        self.assertIsNone(self.coalescer.submit('device-1', TagType.LED_ON, [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
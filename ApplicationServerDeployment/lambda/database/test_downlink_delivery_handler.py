@@ -0,0 +1,124 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for downlink delivery tracking and round-trip time histograms.
+"""
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from downlink_delivery_handler import DownlinkDeliveryHandler
+from link_type import LinkType
+
+
+class FakeDeliveriesTable:
+    """
+    Keeps items in memory. Query of the sent_at index returns items of the device sent within the time window
+    (not acknowledged ones only, if filtered).
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.queries = []
+
+    def put_item(self, Item):
+        self.items[(Item['wireless_device_id'], Item['seq'])] = {key: Decimal(value) if type(value) is int else value
+                                                                 for key, value in Item.items()}
+
+    def query(self, IndexName, KeyConditionExpression, FilterExpression=None):
+        self.queries.append(IndexName)
+        device_condition, sent_at_condition = KeyConditionExpression.get_expression()['values']
+        device_id = device_condition.get_expression()['values'][1]
+        sent_from, sent_to = (sent_at_condition.get_expression()['values'][1:] + (float('inf'),))[:2]
+        return {'Items': [dict(item) for (item_device_id, _), item in self.items.items()
+                          if item_device_id == device_id and sent_from <= item['sent_at'] <= sent_to and
+                          (FilterExpression is None or 'acked_at' not in item)]}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        item = self.items[(Key['wireless_device_id'], Key['seq'])]
+        if 'acked_at' in item:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        item['acked_at'] = ExpressionAttributeValues[':acked_at']
+        item['round_trip'] = ExpressionAttributeValues[':round_trip']
+
+
+class FakeLatencyTable:
+    """
+    Emulates ADD update expression of the histogram counters.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        item = self.items.setdefault(Key['histogram_id'], {'histogram_id': Key['histogram_id']})
+        for action in UpdateExpression[len('ADD '):].split(', '):
+            name, value = action.split(' ')
+            name = ExpressionAttributeNames.get(name, name)
+            item[name] = item.get(name, Decimal(0)) + ExpressionAttributeValues[value]
+
+    def get_item(self, Key):
+        item = self.items.get(Key['histogram_id'])
+        return {'Item': item} if item is not None else {}
+
+
+class TestDownlinkDeliveryHandler(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch('boto3.resource'):
+            self.handler = DownlinkDeliveryHandler()
+        self.deliveries = FakeDeliveriesTable()
+        self.latency = FakeLatencyTable()
+        self.handler._table = self.deliveries
+        self.handler._latency_table = self.latency
+
+    def test_matchResponse_shouldRecordRoundTrip(self):
+        self.handler.record_sent('device-1', 7, [1], [], LinkType.LORA, sent_at=1000)
+        self.handler.record_sent('device-1', 8, [], [2], LinkType.LORA, sent_at=2000)
+        self.assertEqual(self.handler.match_response('device-1', [], [2], received_at=9000),
+                         {'seq': 8, 'link_type': 'LORA', 'round_trip': 7000})
+        self.assertEqual(self.handler.match_response('device-1', [3], [], received_at=9500),
+                         {'seq': 7, 'link_type': 'LORA', 'round_trip': 8500})
+        self.assertIsNone(self.handler.match_response('device-1', [1], [], received_at=9900))
+
+        self.assertEqual(self.handler.get_device_latency('device-1').summary()['count'], 2)
+        self.assertEqual(self.handler.get_device_latency('device-2').summary(), {'count': 0})
+        histograms = self.handler.get_link_type_latency()
+        self.assertEqual(list(histograms), ['LORA'])
+        summary = histograms['LORA'].summary()
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['mean'], 7750)
+        self.assertTrue(7000 <= summary['p50'] < 7000 * (1 + 1 / 64))
+
+    def test_matchResponse_expired_shouldNotMatch(self):
+        self.handler.record_sent('device-1', 1, [1], [], LinkType.BLE, sent_at=1000)
+        received_at = 1000 + DownlinkDeliveryHandler.MATCH_TIMEOUT + 1
+        self.assertIsNone(self.handler.match_response('device-1', [1], [], received_at=received_at))
+        self.assertEqual(self.deliveries.queries, [DownlinkDeliveryHandler.SENT_AT_INDEX])
+
+    def test_getSentSince_shouldIncludeAcked(self):
+        self.handler.record_sent('device-1', 1, [1], [], LinkType.BLE, sent_at=1000)
+        self.handler.record_sent('device-1', 2, [], [1], LinkType.BLE, sent_at=2000)
+        self.handler.record_sent('device-2', 1, [1], [], LinkType.BLE, sent_at=2000)
+        self.handler.match_response('device-1', [], [1], received_at=2500)
+        self.assertEqual([int(item['seq']) for item in self.handler.get_sent_since('device-1', 1500)], [2])
+
+    def test_matchResponse_alreadyAcked_shouldTryNext(self):
+        self.handler.record_sent('device-1', 1, [1], [], LinkType.BLE, sent_at=1000)
+        self.handler.record_sent('device-1', 2, [1], [], LinkType.BLE, sent_at=1500)
+        original_update = self.deliveries.update_item
+
+        def concurrent_ack(**kwargs):
+            self.deliveries.items[('device-1', 1)]['acked_at'] = Decimal(1900)
+            self.deliveries.update_item = original_update
+            return original_update(**kwargs)
+
+        self.deliveries.update_item = concurrent_ack
+        self.assertEqual(self.handler.match_response('device-1', [1], [], received_at=2000)['seq'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for the queue of the downlinks to be retried.
+"""
+import unittest
+
+from botocore.exceptions import ClientError
+
+from downlink_retry_queue import DownlinkRetryQueue
+
+
+class FakeRetryTable:
+    """
+    Emulates the calls made by DownlinkRetryQueue. Query of the due index ignores the key condition, conditions of
+    the updates of the read items compare queued_at only.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    @staticmethod
+    def _key(Key: dict) -> tuple:
+        return Key['wireless_device_id'], Key['command']
+
+    def _check(self, Key: dict, ExpressionAttributeValues: dict) -> dict:
+        item = self.items.get(self._key(Key))
+        if item is None or item['queued_at'] != ExpressionAttributeValues[':queued_at']:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        return item
+
+    def put_item(self, Item):
+        self.items[self._key(Item)] = dict(Item)
+
+    def query(self, IndexName, KeyConditionExpression):
+        return {'Items': [dict(item) for item in self.items.values()
+                          if item['status'] == DownlinkRetryQueue.STATUS_PENDING]}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, ReturnValues=None):
+        if ConditionExpression.startswith('attribute_not_exists(queued_at)'):
+            item = self.items.get(self._key(Key))
+            if item is not None and item['status'] != ExpressionAttributeValues[':pending']:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+            item = self.items.setdefault(self._key(Key), dict(Key))
+        else:
+            item = self._check(Key, ExpressionAttributeValues)
+        for action in UpdateExpression[len('SET '):].split(', '):
+            name, value = action.split(' = ')
+            name = (ExpressionAttributeNames or {}).get(name, name)
+            if ' + ' in value:
+                value = item[name] + ExpressionAttributeValues[value.split(' + ')[1]]
+            else:
+                value = ExpressionAttributeValues[value]
+            item[name] = value
+        return {'Attributes': dict(item)}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None):
+        if ConditionExpression is not None:
+            self._check(Key, ExpressionAttributeValues)
+        self.items.pop(self._key(Key), None)
+
+
+class TestDownlinkRetryQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1700000000.0
+        self.table = FakeRetryTable()
+        self.queue = DownlinkRetryQueue(table=self.table, clock=lambda: self.now, rng=lambda: 0.5)
+
+    def test_enqueue_shouldReplaceQueuedCommand(self):
+        self.queue.enqueue('device-1', 'DEMO_APP_ACTION_RESP', b'\x01', 'ThrottlingException')
+        self.now += 1
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_RESP', b'\x02', 'InternalServerException',
+                                  expires_in=1000)
+        self.assertEqual(self.table.items[('device-1', 'DEMO_APP_ACTION_RESP')], item)
+        self.assertEqual(item['next_attempt_at'] - item['queued_at'], DownlinkRetryQueue.BACKOFF_BASE * 3 // 4)
+        self.assertEqual([item['payload'] for item in self.queue.get_due()], [b'\x02'])
+        self.assertFalse(self.queue.is_expired(item))
+        self.now += 1
+        self.assertTrue(self.queue.is_expired(item))
+
+    def test_enqueue_ledState_shouldBeMergedPerLed(self):
+        self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x01', 'ThrottlingException', ([1, 2], []))
+        queued_at = int(self.now * 1000)
+        self.now += 1
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x02', 'ThrottlingException', ([], [1, 3]))
+        self.assertEqual(self.table.items[('device-1', 'DEMO_APP_ACTION_REQ')], item)
+        self.assertEqual(self.queue.get_led_state(item), {1: (False, queued_at + 1000), 2: (True, queued_at),
+                                                          3: (False, queued_at + 1000)})
+        self.assertEqual(item['queued_at'], queued_at + 1000)
+
+    def test_enqueue_ledStateAfterDeadLetter_shouldReplaceIt(self):
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x01', 'ThrottlingException', ([1], []))
+        self.queue.mark_dead(item, 'ResourceNotFoundException')
+        self.assertEqual(self.queue.get_due(), [])
+        self.now += 1
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x02', 'ThrottlingException', ([2], []))
+        self.assertEqual(item['status'], DownlinkRetryQueue.STATUS_PENDING)
+        self.assertEqual(list(self.queue.get_led_state(item)), [2])
+        self.assertEqual(self.queue.get_due(), [item])
+
+    def test_reschedule_shouldBackOffAndDie(self):
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_RESP', b'\x01', 'ThrottlingException')
+        self.now += 3600
+        for attempt in range(1, DownlinkRetryQueue.MAX_ATTEMPTS):
+            self.assertTrue(self.queue.reschedule(item, 'ThrottlingException'))
+            item = self.table.items[('device-1', 'DEMO_APP_ACTION_RESP')]
+            self.assertEqual(item['attempts'], attempt)
+            self.assertEqual(item['status'], DownlinkRetryQueue.STATUS_PENDING)
+        self.assertEqual(item['next_attempt_at'] - int(self.now * 1000), DownlinkRetryQueue.BACKOFF_CAP * 3 // 4)
+        self.assertTrue(self.queue.reschedule(item, 'InternalServerException'))
+        item = self.table.items[('device-1', 'DEMO_APP_ACTION_RESP')]
+        self.assertEqual(item['status'], DownlinkRetryQueue.STATUS_DEAD)
+        self.assertEqual(item['attempts'], DownlinkRetryQueue.MAX_ATTEMPTS)
+        self.assertEqual(item['last_error'], 'InternalServerException')
+        self.assertEqual(item['time_to_live'], int(self.now) + DownlinkRetryQueue.TIME_TO_LIVE)
+
+    def test_deleteSent_replaced_shouldKeepNewerDownlink(self):
+        item = self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x01', 'ThrottlingException')
+        self.now += 1
+        self.queue.enqueue('device-1', 'DEMO_APP_ACTION_REQ', b'\x02', 'ThrottlingException')
+        self.assertFalse(self.queue.delete_sent(item))
+        self.assertFalse(self.queue.mark_dead(item, 'ResourceNotFoundException'))
+        self.assertEqual(self.table.items[('device-1', 'DEMO_APP_ACTION_REQ')]['payload'], b'\x02')
+        self.assertTrue(self.queue.delete_sent(self.table.items[('device-1', 'DEMO_APP_ACTION_REQ')]))
+        self.assertEqual(self.table.items, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
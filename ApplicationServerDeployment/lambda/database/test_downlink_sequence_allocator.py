@@ -0,0 +1,74 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for downlink sequence number allocation.
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from conftest import FakeClock
+from downlink_sequence_allocator import DownlinkSequenceAllocator
+
+
+class FakeCounterTable:
+    """
+    Emulates atomic ADD of the UpdateItem call, shared by several allocators (Lambda containers).
+    """
+
+    def __init__(self, initial: int = 0, delay: float = 0.0):
+        self.counters = {}
+        self.initial = initial
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ReturnValues):
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls += 1
+            device_id = Key['wireless_device_id']
+            value = self.counters.get(device_id, self.initial) + ExpressionAttributeValues[':block_size']
+            self.counters[device_id] = value
+        return {'Attributes': {'next_seq': Decimal(value)}}
+
+
+class TestDownlinkSequenceAllocator(unittest.TestCase):
+
+    def test_allocate_shouldReserveBlocks(self):
+        table = FakeCounterTable()
+        allocator = DownlinkSequenceAllocator(block_size=4, table=table)
+        self.assertEqual([allocator.allocate('device-1') for _ in range(10)], list(range(10)))
+        self.assertEqual([allocator.allocate('device-2') for _ in range(2)], [0, 1])
+        self.assertEqual(table.calls, 4)
+        self.assertEqual(table.counters, {'device-1': 12, 'device-2': 4})
+
+    def test_allocate_shouldWrapAround(self):
+        allocator = DownlinkSequenceAllocator(block_size=4, table=FakeCounterTable(initial=16382))
+        self.assertEqual([allocator.allocate('device-1') for _ in range(4)], [16382, 16383, 0, 1])
+
+    def test_allocate_blockExpired_shouldReserveNewBlock(self):
+        clock = FakeClock()
+        table = FakeCounterTable()
+        allocator = DownlinkSequenceAllocator(block_size=4, block_ttl=60, table=table, clock=clock)
+        self.assertEqual(allocator.allocate('device-1'), 0)
+        clock.now = 60
+        self.assertEqual(allocator.allocate('device-1'), 4)
+        self.assertEqual(table.calls, 2)
+
+    def test_allocate_concurrentThreads_shouldBeUnique(self):
+        table = FakeCounterTable(delay=0.001)
+        containers = [DownlinkSequenceAllocator(block_size=8, table=table) for _ in range(3)]
+        allocations = 3000
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            seqs = list(executor.map(lambda idx: containers[idx % 3].allocate('device-1'), range(allocations)))
+        self.assertEqual(len(set(seqs)), allocations)
+        self.assertEqual(sum(container.reservations for container in containers), table.calls)
+        self.assertLessEqual(table.calls, allocations // 8 + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for queries and batch writes of the SidewalkDeviceMeasurements table records.
+"""
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from measurement import Measurement
+from measurements_handler import MeasurementsHandler, UnprocessedMeasurementsError
+
+TABLE_NAME = MeasurementsHandler.TABLE_NAME
+
+
+class FakeDynamoDB:
+    """
+    Records batch_write_item calls; leaves the given number of items unprocessed in the consecutive calls.
+    """
+
+    def __init__(self, unprocessed=None, errors=None):
+        self.unprocessed = list(unprocessed or [])
+        self.errors = list(errors or [])
+        self.requests = []
+
+    def batch_write_item(self, RequestItems):
+        requests = RequestItems[TABLE_NAME]
+        self.requests.append(requests)
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise ClientError({'Error': {'Code': error, 'Message': error}}, 'BatchWriteItem')
+        count = self.unprocessed.pop(0) if self.unprocessed else 0
+        return {'UnprocessedItems': {TABLE_NAME: requests[:count]} if count else {}}
+
+
+class FakeTable:
+    """
+    Serves query calls from the given pages of items.
+    """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        items = self.pages.pop(0)[:kwargs.get('Limit')]
+        response = {'Items': items}
+        if self.pages:
+            response['LastEvaluatedKey'] = {'timestamp': items[-1]['timestamp']}
+        return response
+
+
+def item(timestamp: int) -> dict:
+    return {'timestamp': Decimal(timestamp), 'wireless_device_id': 'device-1', 'temperature': Decimal(20),
+            'time_to_live': Decimal(timestamp // 1000 + 3600)}
+
+
+class TestMeasurementsHandler(unittest.TestCase):
+
+    def handler(self, dynamodb: FakeDynamoDB) -> MeasurementsHandler:
+        self.sleeps = []
+        with mock.patch('boto3.resource'):
+            handler = MeasurementsHandler(sleep=self.sleeps.append)
+        handler._dynamodb = dynamodb
+        return handler
+
+    @staticmethod
+    def measurements(count: int, timestamp: int = None) -> [Measurement]:
+        return [Measurement('device-1', temperature=i, timestamp=1000 + i if timestamp is None else timestamp)
+                for i in range(count)]
+
+    # -----------------------------------------------
+    # Read
+    # -----------------------------------------------
+    def test_getMeasurements_paginated_shouldSucceed(self):
+        table = FakeTable([[item(5000), item(4000)], [item(3000)]])
+        handler = self.handler(FakeDynamoDB())
+        handler._table = table
+        measurements = handler.get_measurements_for_device('device-1', start=1000, end=5000)
+        self.assertEqual([measurement.get_time() for measurement in measurements], [5000, 4000, 3000])
+        self.assertNotIn('IndexName', table.queries[0])
+        self.assertFalse(table.queries[0]['ScanIndexForward'])
+        self.assertNotIn('ExclusiveStartKey', table.queries[0])
+        self.assertEqual(table.queries[1]['ExclusiveStartKey'], {'timestamp': Decimal(4000)})
+        key_condition = table.queries[0]['KeyConditionExpression'].get_expression()
+        self.assertEqual(key_condition['values'][1].get_expression()['values'][1:], (1000, 5000))
+
+    def test_getMeasurements_limit_shouldStop(self):
+        table = FakeTable([[item(5000), item(4000)], [item(3000), item(2000)], [item(1000)]])
+        handler = self.handler(FakeDynamoDB())
+        handler._table = table
+        measurements = handler.get_measurements_for_device('device-1', limit=3)
+        self.assertEqual([measurement.get_time() for measurement in measurements], [5000, 4000, 3000])
+        self.assertEqual([query['Limit'] for query in table.queries], [3, 1])
+
+    def test_getMeasurementsPage_cursorAndFields_shouldSucceed(self):
+        table = FakeTable([[{'timestamp': Decimal(5000)}, {'timestamp': Decimal(4000)}], [{'timestamp': Decimal(3000)}]])
+        handler = self.handler(FakeDynamoDB())
+        handler._table = table
+        measurements, last_evaluated_key = handler.get_measurements_page('device-1', limit=2,
+                                                                         start_key={'timestamp': 6000},
+                                                                         fields=('time',))
+        self.assertEqual([measurement.to_dict() for measurement in measurements],
+                         [{'wireless_device_id': 'device-1', 'value': None, 'time': 5000},
+                          {'wireless_device_id': 'device-1', 'value': None, 'time': 4000}])
+        self.assertEqual(last_evaluated_key, {'timestamp': Decimal(4000)})
+        self.assertEqual(table.queries[0]['ExclusiveStartKey'], {'timestamp': 6000})
+        self.assertEqual(table.queries[0]['ExpressionAttributeNames'], {'#a0': 'timestamp'})
+
+    def test_getMeasurements_defaultTimeSpan_shouldSucceed(self):
+        table = FakeTable([[]])
+        handler = self.handler(FakeDynamoDB())
+        handler._table = table
+        handler.get_measurements_for_device('device-1', end=10000000)
+        key_condition = table.queries[0]['KeyConditionExpression'].get_expression()
+        self.assertEqual(key_condition['values'][1].get_expression()['values'][1:],
+                         (10000000 - MeasurementsHandler.DEFAULT_TIME_SPAN, 10000000))
+
+    # -----------------------------------------------
+    # Write
+    # -----------------------------------------------
+    def test_addMeasurements_chunks_shouldSucceed(self):
+        dynamodb = FakeDynamoDB()
+        written = self.handler(dynamodb).add_measurements(self.measurements(60))
+        self.assertEqual([len(requests) for requests in dynamodb.requests], [25, 25, 10])
+        self.assertEqual(len(written), 60)
+        self.assertEqual(self.sleeps, [])
+
+    def test_addMeasurements_sameTimestamp_shouldKeepTimes(self):
+        dynamodb = FakeDynamoDB()
+        measurements = self.measurements(2, timestamp=1000) + [Measurement('device-2', temperature=5, timestamp=1000)]
+        written = self.handler(dynamodb).add_measurements(measurements)
+        self.assertEqual([(measurement.get_wireless_device_id(), measurement.get_time(), measurement.get_value())
+                          for measurement in written], [('device-1', 1000, 1.0), ('device-2', 1000, 5.0)])
+        self.assertEqual([(request['PutRequest']['Item']['wireless_device_id'],
+                           request['PutRequest']['Item']['timestamp']) for request in dynamodb.requests[0]],
+                         [('device-1', 1000), ('device-2', 1000)])
+
+    def test_addMeasurements_unprocessedItems_shouldRetry(self):
+        dynamodb = FakeDynamoDB(unprocessed=[5, 2], errors=[None, 'ProvisionedThroughputExceededException'])
+        self.handler(dynamodb).add_measurements(self.measurements(10))
+        self.assertEqual([len(requests) for requests in dynamodb.requests], [10, 5, 5, 2])
+        self.assertEqual(len(self.sleeps), 3)
+        self.assertTrue(all(0 <= delay <= MeasurementsHandler.BACKOFF_CAP for delay in self.sleeps))
+
+    def test_addMeasurements_stillUnprocessed(self):
+        dynamodb = FakeDynamoDB(unprocessed=[1] * MeasurementsHandler.MAX_ATTEMPTS)
+        with self.assertRaises(UnprocessedMeasurementsError) as context:
+            self.handler(dynamodb).add_measurements(self.measurements(3))
+        self.assertEqual([measurement.get_time() for measurement in context.exception.measurements], [1000])
+
+    def test_addMeasurements_otherError(self):
+        dynamodb = FakeDynamoDB(errors=['ValidationException'])
+        with self.assertRaises(ClientError):
+            self.handler(dynamodb).add_measurements(self.measurements(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
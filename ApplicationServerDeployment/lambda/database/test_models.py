@@ -0,0 +1,91 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for Device and Measurement records.
+"""
+import unittest
+from decimal import Decimal
+
+from device import Device
+from link_type import LinkType
+from measurement import Measurement
+from unit import Unit
+
+DEVICE_ITEM = {
+    'wireless_device_id': 'device-1',
+    'led': [Decimal(1), Decimal(2), Decimal(3)],
+    'led_on': [Decimal(2)],
+    'button': [Decimal(1), Decimal(2)],
+    'button_pressed': [{'id': Decimal(1), 'seqN': Decimal(7), 'state': Decimal(1)},
+                       {'id': Decimal(2), 'seqN': Decimal(3), 'state': Decimal(0)}],
+    'link_type': 'LORA',
+    'sensor': True,
+    'sensor_unit': 'CELSIUS',
+    'last_uplink': Decimal(1700000000),
+    'time_to_live': Decimal(1700086400)
+}
+
+
+class TestModels(unittest.TestCase):
+
+    # -----------------------------------------------
+    # Device
+    # -----------------------------------------------
+    def test_deviceFromItem_toDict_shouldSucceed(self):
+        device = Device(**DEVICE_ITEM)
+        self.assertEqual(device.to_dict(), {
+            'wireless_device_id': 'device-1',
+            'led': [1, 2, 3],
+            'led_on': [2],
+            'button': [1, 2],
+            'button_pressed': [1],
+            'link_type': LinkType.LORA.value,
+            'sensor': True,
+            'sensor_unit': Unit.CELSIUS.value,
+            'last_uplink': 1700000000,
+            'time_to_live': 1700086400
+        })
+
+    def test_deviceButtonPressed_roundTrip_shouldSucceed(self):
+        device = Device(**DEVICE_ITEM)
+        buttons = device.get_button_pressed()
+        self.assertEqual(buttons, [{'id': 1, 'seqN': 7, 'state': 1}, {'id': 2, 'seqN': 3, 'state': 0}])
+        buttons[1]['state'] = 1
+        self.assertEqual(device.get_enabled_button_pressed_state(), [1])
+        device.set_button_pressed(buttons)
+        self.assertEqual(device.get_enabled_button_pressed_state(), [1, 2])
+
+    def test_deviceMapAndSetShape_shouldSucceed(self):
+        device = Device('device-1', led_on={Decimal(3), Decimal(1)},
+                        button_pressed={'2': {'seqN': Decimal(3), 'state': Decimal(1)},
+                                        '1': {'seqN': Decimal(7), 'state': Decimal(0)}})
+        self.assertEqual(device.get_led_on(), [1, 3])
+        self.assertEqual(device.get_button_pressed(), [{'id': 1, 'seqN': 7, 'state': 0}, {'id': 2, 'seqN': 3, 'state': 1}])
+        self.assertEqual(device.get_button_pressed_map(), {'1': {'seqN': 7, 'state': 0}, '2': {'seqN': 3, 'state': 1}})
+        self.assertEqual(device.get_enabled_button_pressed_state(), [2])
+
+    def test_deviceDefaults_shouldSucceed(self):
+        device = Device('device-2', link_type='BLE')
+        self.assertEqual(device.get_led(), [])
+        self.assertEqual(device.get_button_pressed(), [])
+        self.assertEqual(device.get_link_type(), LinkType.BLE)
+        self.assertEqual(device.get_last_uplink(), 0)
+
+    def test_deviceUnknownAttribute_shouldFail(self):
+        with self.assertRaises(AttributeError):
+            Device('device-3').button_pressed = []
+
+    # -----------------------------------------------
+    # Measurement
+    # -----------------------------------------------
+    def test_measurementFromItem_toDict_shouldSucceed(self):
+        measurement = Measurement(wireless_device_id='device-1', temperature=Decimal('21.5'),
+                                  timestamp=Decimal(1700000000000), time_to_live=Decimal(1700003600))
+        self.assertEqual(measurement.to_dict(), {'wireless_device_id': 'device-1', 'value': 21.5,
+                                                 'time': 1700000000000})
+        self.assertFalse(hasattr(measurement, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
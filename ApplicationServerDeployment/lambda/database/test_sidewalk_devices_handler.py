@@ -0,0 +1,279 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for scans and atomic updates of the SidewalkDevices table records.
+"""
+import threading
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from sidewalk_devices_handler import SidewalkDevicesHandler
+
+WIRELESS_DEVICE_ID = 'device-1'
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'UpdateItem')
+
+
+class FakeTable:
+    """
+    Records update_item calls; raises errors from the given list (None means success).
+    """
+
+    def __init__(self, errors=None, item=None):
+        self.errors = list(errors or [])
+        self.item = item
+        self.updates = []
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise client_error(error)
+        return {'Attributes': {'wireless_device_id': WIRELESS_DEVICE_ID}}
+
+    def get_item(self, Key):
+        return {'Item': self.item} if self.item is not None else {}
+
+
+class FakeScanTable:
+    """
+    Serves scan calls from pages of items per segment; thread safe.
+    """
+
+    def __init__(self, segments, error_segment=None):
+        self.segments = segments
+        self.error_segment = error_segment
+        self.scans = []
+        self._lock = threading.Lock()
+
+    def scan(self, **kwargs):
+        with self._lock:
+            self.scans.append(kwargs)
+        segment = kwargs.get('Segment', 0)
+        if segment == self.error_segment:
+            raise client_error('ProvisionedThroughputExceededException')
+        pages = self.segments[segment]
+        page = kwargs.get('ExclusiveStartKey', {}).get('page', 0)
+        response = {'Items': pages[page]}
+        if page + 1 < len(pages):
+            response['LastEvaluatedKey'] = {'page': page + 1}
+        return response
+
+
+class FakeIndexTable:
+    """
+    Serves query calls of the last_uplink index from the items of the given buckets (one page per bucket).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        bucket_condition, last_uplink_condition = kwargs['KeyConditionExpression'].get_expression()['values']
+        bucket = bucket_condition.get_expression()['values'][1]
+        since = last_uplink_condition.get_expression()['values'][1]
+        return {'Items': [item for item in self.buckets.get(bucket, []) if item['last_uplink'] > since]}
+
+
+def device_items(*wireless_device_ids) -> [dict]:
+    return [{'wireless_device_id': wireless_device_id, 'link_type': 'BLE'} for wireless_device_id in wireless_device_ids]
+
+
+class TestSidewalkDevicesHandler(unittest.TestCase):
+
+    def handler(self, table: FakeTable) -> SidewalkDevicesHandler:
+        with mock.patch('boto3.resource'):
+            handler = SidewalkDevicesHandler()
+        handler._table = table
+        return handler
+
+    # -----------------------------------------------
+    # Scan
+    # -----------------------------------------------
+    def test_getAllDevices_paginated_shouldSucceed(self):
+        table = FakeScanTable([[device_items('a', 'b'), device_items('c')]])
+        devices = self.handler(table).get_all_devices()
+        self.assertEqual([device.get_wireless_device_id() for device in devices], ['a', 'b', 'c'])
+        self.assertEqual(table.scans[1]['ExclusiveStartKey'], {'page': 1})
+        self.assertEqual(table.scans[0]['ExpressionAttributeNames']['#a0'], 'wireless_device_id')
+        self.assertEqual(table.scans[0]['ProjectionExpression'].count('#a'), 10)
+
+    def test_getAllDevices_parallel_shouldSucceed(self):
+        table = FakeScanTable([[device_items('a'), device_items('b')], [device_items('c')], [[]]])
+        handler = self.handler(table)
+        handler._get_thread_table = lambda: table
+        devices = handler.get_all_devices(total_segments=3, attributes=None)
+        self.assertEqual(sorted(device.get_wireless_device_id() for device in devices), ['a', 'b', 'c'])
+        self.assertEqual(sorted((scan['Segment'], scan['TotalSegments']) for scan in table.scans),
+                         [(0, 3), (0, 3), (1, 3), (2, 3)])
+        self.assertNotIn('ProjectionExpression', table.scans[0])
+
+    def test_getAllDevices_parallelSegmentFails(self):
+        table = FakeScanTable([[device_items('a')], [device_items('b')]], error_segment=1)
+        handler = self.handler(table)
+        handler._get_thread_table = lambda: table
+        with self.assertRaises(ClientError):
+            handler.get_all_devices(total_segments=2)
+
+    def test_getDevicesPage_shouldSucceed(self):
+        table = FakeScanTable([[device_items('a', 'b'), device_items('c'), device_items('d')]])
+        devices, last_evaluated_key = self.handler(table).get_devices_page(3, attributes=('wireless_device_id',))
+        self.assertEqual([device.get_wireless_device_id() for device in devices], ['a', 'b', 'c'])
+        self.assertEqual(last_evaluated_key, {'page': 2})
+        self.assertEqual([scan['Limit'] for scan in table.scans], [3, 1])
+        self.assertEqual(table.scans[0]['ProjectionExpression'], '#a0')
+
+    def test_getDevicesPage_lastPage_shouldSucceed(self):
+        table = FakeScanTable([[device_items('a', 'b'), device_items('c')]])
+        devices, last_evaluated_key = self.handler(table).get_devices_page(5, start_key={'page': 1})
+        self.assertEqual([device.get_wireless_device_id() for device in devices], ['c'])
+        self.assertIsNone(last_evaluated_key)
+
+    def test_getDevicesChangedSince_shouldQueryBuckets(self):
+        size = SidewalkDevicesHandler.LAST_UPLINK_BUCKET_SIZE
+        buckets = {}
+        for wireless_device_id, last_uplink in [('a', 10 * size + 5), ('b', 10 * size + 50), ('c', 12 * size + 1)]:
+            bucket = SidewalkDevicesHandler._get_last_uplink_bucket(last_uplink, wireless_device_id)
+            buckets.setdefault(bucket, []).append({'wireless_device_id': wireless_device_id,
+                                                   'last_uplink': Decimal(last_uplink)})
+        table = FakeIndexTable(buckets)
+        handler = self.handler(table)
+        handler._get_thread_table = lambda: table
+        devices = handler.get_devices_changed_since(10 * size + 10, now=12 * size + 2)
+        self.assertEqual(sorted(device.get_wireless_device_id() for device in devices), ['b', 'c'])
+        self.assertEqual(len(table.queries), 3 * SidewalkDevicesHandler.LAST_UPLINK_SHARDS)
+        self.assertEqual(table.queries[0]['IndexName'], SidewalkDevicesHandler.LAST_UPLINK_INDEX)
+
+    def test_getDevicesChangedSince_expiredBuckets_shouldBeSkipped(self):
+        table = FakeIndexTable({})
+        handler = self.handler(table)
+        handler._get_thread_table = lambda: table
+        now = 100 * SidewalkDevicesHandler.LAST_UPLINK_BUCKET_SIZE
+        handler.get_devices_changed_since(0, now=now)
+        self.assertEqual(len(table.queries),
+                         (SidewalkDevicesHandler.TIME_TO_LIVE // SidewalkDevicesHandler.LAST_UPLINK_BUCKET_SIZE + 1) *
+                         SidewalkDevicesHandler.LAST_UPLINK_SHARDS)
+
+    def test_getLastUplinkBucket_shouldSpreadDevices(self):
+        size = SidewalkDevicesHandler.LAST_UPLINK_BUCKET_SIZE
+        buckets = {SidewalkDevicesHandler._get_last_uplink_bucket(10 * size, f'device-{idx}') for idx in range(100)}
+        self.assertEqual(buckets, {10 * SidewalkDevicesHandler.LAST_UPLINK_SHARDS + shard
+                                   for shard in range(SidewalkDevicesHandler.LAST_UPLINK_SHARDS)})
+
+    def test_iterAllDevices_stoppedEarly_shouldSucceed(self):
+        table = FakeScanTable([[device_items('a'), device_items('b')], [device_items('c'), device_items('d')]])
+        handler = self.handler(table)
+        handler._get_thread_table = lambda: table
+        devices = handler.iter_all_devices(total_segments=2)
+        self.assertIsNotNone(next(devices))
+        devices.close()
+
+    # -----------------------------------------------
+    # Buttons
+    # -----------------------------------------------
+    def test_toggleButtons_singleUpdate_shouldSucceed(self):
+        table = FakeTable()
+        self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [2, 1, 2], 7)
+        self.assertEqual(len(table.updates), 1)
+        update = table.updates[0]
+        self.assertEqual(update['ExpressionAttributeNames'], {'#state': 'state', '#b0': '1', '#b1': '2'})
+        self.assertIn('last_uplink_bucket=:last_uplink_bucket', update['UpdateExpression'])
+        self.assertEqual(update['ExpressionAttributeValues'][':last_uplink_bucket'],
+                         SidewalkDevicesHandler._get_last_uplink_bucket(
+                             update['ExpressionAttributeValues'][':last_uplink'], WIRELESS_DEVICE_ID))
+        self.assertEqual(update['ConditionExpression'],
+                         'button_pressed.#b0.seqN < :first0 and button_pressed.#b1.seqN < :first1')
+        self.assertIn('button_pressed.#b0.#state = :one - button_pressed.#b0.#state', update['UpdateExpression'])
+        self.assertEqual(update['ExpressionAttributeValues'][':first0'], 7)
+        self.assertEqual(update['ExpressionAttributeValues'][':last1'], 7)
+
+    def test_toggleButtons_someAlreadyToggled_shouldToggleRest(self):
+        table = FakeTable(errors=['ConditionalCheckFailedException', 'ConditionalCheckFailedException', None])
+        device = self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1, 2], 7)
+        self.assertIsNotNone(device)
+        self.assertEqual([update['ExpressionAttributeNames']['#b0'] for update in table.updates], ['1', '1', '2'])
+
+    def test_toggleButtons_noneToggled_shouldUpdateLastUplink(self):
+        table = FakeTable(errors=['ConditionalCheckFailedException'])
+        self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1], 7)
+        self.assertEqual(len(table.updates), 2)
+        self.assertEqual(table.updates[1]['ConditionExpression'], 'attribute_exists(wireless_device_id)')
+        self.assertNotIn('button_pressed', table.updates[1]['UpdateExpression'])
+
+    def test_toggleButtons_unknownDevice_shouldNotCreateRecord(self):
+        table = FakeTable(errors=['ConditionalCheckFailedException', 'ConditionalCheckFailedException'])
+        self.assertIsNone(self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1], 7))
+        self.assertEqual(len(table.updates), 2)
+        self.assertTrue(all('ConditionExpression' in update for update in table.updates))
+
+    def test_toggleButtons_legacyListShapeUnknownDevice_shouldNotCreateRecord(self):
+        table = FakeTable(errors=['ValidationException'])
+        self.assertIsNone(self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1], 7))
+        self.assertEqual(len(table.updates), 1)
+
+    def test_toggleButtons_legacyListShape_shouldReadModifyWrite(self):
+        item = {
+            'wireless_device_id': WIRELESS_DEVICE_ID,
+            'button_pressed': [{'id': Decimal(1), 'seqN': Decimal(3), 'state': Decimal(0)},
+                               {'id': Decimal(2), 'seqN': Decimal(9), 'state': Decimal(0)}]
+        }
+        table = FakeTable(errors=['ValidationException'], item=item)
+        self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1, 2], 7)
+        self.assertEqual(table.updates[1]['ExpressionAttributeValues'][':button_pressed'],
+                         {'1': {'seqN': 7, 'state': 1}, '2': {'seqN': 9, 'state': 0}})
+
+    def test_applyButtonPresses_collapsed_shouldSucceed(self):
+        table = FakeTable()
+        self.handler(table).apply_button_presses_and_last_uplink(WIRELESS_DEVICE_ID, [(9, [1]), (8, [1, 2])])
+        self.assertEqual(len(table.updates), 1)
+        update = table.updates[0]
+        self.assertNotIn('#b0.#state', update['UpdateExpression'])  # button 1 pressed twice
+        self.assertIn('button_pressed.#b1.#state = :one - button_pressed.#b1.#state', update['UpdateExpression'])
+        values = update['ExpressionAttributeValues']
+        self.assertEqual((values[':first0'], values[':last0'], values[':first1'], values[':last1']), (8, 9, 8, 8))
+
+    def test_applyButtonPresses_alreadyApplied_shouldApplyOneByOne(self):
+        table = FakeTable(errors=['ConditionalCheckFailedException'])
+        self.handler(table).apply_button_presses_and_last_uplink(WIRELESS_DEVICE_ID, [(9, [1]), (8, [2])])
+        self.assertEqual([update['ExpressionAttributeValues'].get(':first0') for update in table.updates[1:]], [8, 9])
+
+    def test_toggleButtons_otherError_shouldFail(self):
+        table = FakeTable(errors=['ProvisionedThroughputExceededException'])
+        with self.assertRaises(ClientError):
+            self.handler(table).toggle_buttons_and_last_uplink(WIRELESS_DEVICE_ID, [1], 7)
+
+    # -----------------------------------------------
+    # LEDs
+    # -----------------------------------------------
+    def test_updateLedState_addAndDelete_shouldSucceed(self):
+        table = FakeTable()
+        self.handler(table).update_led_state_and_last_uplink(WIRELESS_DEVICE_ID, [1, 2], [3])
+        self.assertEqual(len(table.updates), 2)
+        self.assertTrue(table.updates[0]['UpdateExpression'].endswith('add led_on :led_ids'))
+        self.assertEqual(table.updates[0]['ExpressionAttributeValues'][':led_ids'], {1, 2})
+        self.assertTrue(table.updates[1]['UpdateExpression'].endswith('delete led_on :led_ids'))
+        self.assertEqual(table.updates[1]['ExpressionAttributeValues'][':led_ids'], {3})
+
+    def test_updateLedState_legacyListShape_shouldReadModifyWrite(self):
+        item = {'wireless_device_id': WIRELESS_DEVICE_ID, 'led_on': [Decimal(1), Decimal(3)]}
+        table = FakeTable(errors=['ValidationException'], item=item)
+        self.handler(table).update_led_state_and_last_uplink(WIRELESS_DEVICE_ID, [2], [3])
+        self.assertEqual(table.updates[1]['ExpressionAttributeValues'][':led_on'], {1, 2})
+
+    def test_updateLedState_allOff_shouldRemoveAttribute(self):
+        item = {'wireless_device_id': WIRELESS_DEVICE_ID, 'led_on': [Decimal(1)]}
+        table = FakeTable(errors=['ValidationException'], item=item)
+        self.handler(table).update_led_state_and_last_uplink(WIRELESS_DEVICE_ID, [], [1])
+        self.assertTrue(table.updates[1]['UpdateExpression'].endswith('remove led_on'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,36 +6,150 @@ Handles read request to SidewalkDevices and Measurements tables.
 """
 
 import json
+import time
 import traceback
 import cors_utils
+import http_utils
+from datetime import datetime, timezone
 from typing import Final
+from urllib.parse import unquote
 
+import aggregation_utils
+import pagination_utils
+from downlink_delivery_handler import DownlinkDeliveryHandler
 from measurements_handler import MeasurementsHandler
-from sidewalk_devices_handler import SidewalkDevicesHandler
+from sidewalk_devices_handler import SidewalkDevicesHandler, DEVICE_ATTRIBUTES
 
 device_handler: Final = SidewalkDevicesHandler()
 measurement_handler: Final = MeasurementsHandler()
+delivery_handler: Final = DownlinkDeliveryHandler()
 
+DEVICES_SCAN_SEGMENTS: Final = 4  # number of SidewalkDevices table segments scanned in parallel
+DEFAULT_PAGE_SIZE: Final = 100
+MAX_PAGE_SIZE: Final = 1000
+WATERMARK_LAG: Final = 5  # seconds, covers writes in flight and eventually consistent index reads
 
-def get_all_devices():
+
+def get_all_devices(parameters: dict):
     """
     Get all records from the SidewalkDevices table.
 
-    :return:    Response with list of records from SidewalkDevices table.
+    If limit or cursor parameter is given, a single page is returned: {"items": [...], "cursor": str}.
+    Cursor of the next page is null, if there are no more pages.
+    If since parameter is given, only the devices updated after that time are returned,
+    see: get_devices_changed_since.
+
+    :param parameters:  Query string parameters (limit, cursor, fields, since).
+    :return:            Response with list (or page) of records from SidewalkDevices table.
     """
-    devices = device_handler.get_all_devices()
-    devices_json = []
-    for device in devices:
-        devices_json.append(device.to_dict())
-    return _create_response_message(200, devices_json)
+    limit, start_key, fields = _parse_page_parameters(parameters, DEVICE_ATTRIBUTES)
+    attributes = DEVICE_ATTRIBUTES if fields is None else tuple(dict.fromkeys(('wireless_device_id',) + fields))
+    if "since" in parameters:
+        return get_devices_changed_since(parameters["since"], attributes, fields)
+    if not _is_paginated(parameters):
+        devices_json = []
+        for device in device_handler.iter_all_devices(total_segments=DEVICES_SCAN_SEGMENTS, attributes=attributes):
+            devices_json.append(_select_fields(device.to_dict(), fields))
+        return _create_response_message(200, devices_json)
+
+    devices, last_evaluated_key = device_handler.get_devices_page(limit or DEFAULT_PAGE_SIZE, start_key, attributes)
+    return _create_response_message(200, {
+        "items": [_select_fields(device.to_dict(), fields) for device in devices],
+        "cursor": pagination_utils.encode_cursor(last_evaluated_key)
+    })
+
+
+def get_devices_changed_since(since: str, attributes: tuple, fields: tuple):
+    """
+    Get records from the SidewalkDevices table, which were updated by an uplink after the given time.
+
+    Response: {"items": [...], "watermark": int}, where watermark is the value of since for the next call.
+    Watermark lags behind the server time, so devices updated shortly before the call can be returned twice.
+
+    :param since:       UTC time in seconds (watermark returned by the previous call).
+    :param attributes:  Names of the fetched attributes.
+    :param fields:      Names of the returned fields (all fields, if None).
+    :return:            Response with list of updated records from SidewalkDevices table and watermark.
+    """
+    since = int(since)
+    if since < 0:
+        raise ValueError('Since has to be a non-negative UTC time in seconds')
+    now = int(time.time())
+    devices = device_handler.get_devices_changed_since(since, now=now, attributes=attributes)
+    return _create_response_message(200, {
+        "items": [_select_fields(device.to_dict(), fields) for device in devices],
+        "watermark": max(since, now - WATERMARK_LAG)
+    })
+
+
+def get_measurements(wireless_device_id: str, date_start: int, date_end: int, parameters: dict):
+    """
+    Get records from the SidewalkDeviceMeasurements table coming from given device within a given time span.
+
+    Records are returned oldest first. If limit or cursor parameter is given, a single page of the newest
+    records is returned instead: {"items": [...], "cursor": str}, items are ordered newest first.
+    Cursor of the next (older) page is null, if there are no more pages.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param date_start:          Start of the time span (UTC time in milliseconds).
+    :param date_end:            End of the time span (UTC time in milliseconds).
+    :param parameters:          Query string parameters (limit, cursor, fields, or bucket, agg, points).
+    :return:                    Response with list (or page) of records from SidewalkDeviceMeasurements table.
+    """
+    if "bucket" in parameters or "points" in parameters:
+        return get_downsampled_measurements(wireless_device_id, date_start, date_end, parameters)
+
+    allowed_fields = tuple(MeasurementsHandler.FIELD_ATTRIBUTES)
+    limit, start_key, fields = _parse_page_parameters(parameters, allowed_fields)
+    if _is_paginated(parameters):
+        limit = limit or DEFAULT_PAGE_SIZE
+    measurements, last_evaluated_key = measurement_handler.get_measurements_page(
+        wireless_device_id=wireless_device_id, start=date_start, end=date_end, limit=limit, start_key=start_key,
+        fields=fields)
+    if not _is_paginated(parameters):
+        measurements_json = []
+        for measurement in reversed(measurements):  # oldest first, as drawn on the chart
+            measurements_json.append(_select_fields(measurement.to_dict(), fields))
+        return _create_response_message(200, measurements_json)
+
+    return _create_response_message(200, {
+        "items": [_select_fields(measurement.to_dict(), fields) for measurement in measurements],
+        "cursor": pagination_utils.encode_cursor(last_evaluated_key)
+    })
+
+
+def get_downlink_latency(wireless_device_id: str = None):
+    """
+    Get statistics of the downlink round-trip time (DEMO_APP_ACTION_REQ sent - DEMO_APP_ACTION_RESP received),
+    in milliseconds: count, mean, min, max, p50, p95 and p99.
+
+    :param wireless_device_id:  Id of the wireless device (statistics of every link type, if not given).
+    :return:                    Response with the statistics of the device, or dict of them keyed by the link type.
+    """
+    if wireless_device_id is not None:
+        return _create_response_message(200, delivery_handler.get_device_latency(wireless_device_id).summary())
+    return _create_response_message(200, {link_type: histogram.summary()
+                                          for link_type, histogram in delivery_handler.get_link_type_latency().items()})
 
 
 def lambda_handler(event, context):
     """
     Handles read request to SidewalkDevices and Measurements tables.
+    Responses are compressed and answered with 304 if the client already has them, see: http_utils.encode_response.
+    """
+    return http_utils.encode_response(handle_request(event), event.get("headers"))
+
+
+def handle_request(event) -> dict:
+    """
+    Handles read request to SidewalkDevices and Measurements tables.
+
+    :param event:   API Gateway proxy event.
+    :return:        API Gateway proxy response with JSON body.
     """
     method = event.get("httpMethod")
     path = event.get("path").split("api", 1)[1]
+    parameters = event.get("queryStringParameters") or {}
 
     if "on.aws/" in path:
         path = path.split("on.aws", 1)[1]
@@ -44,8 +158,8 @@ def lambda_handler(event, context):
         if path is not None and method is not None and method == "GET":  # get device request format devices/{deviceId}
             if path.startswith("/devices/"):
                 split_path = path.split("/devices/", 1)
-                if len(split_path) == 1:  # if no device id is specified we get all devices
-                    return get_all_devices()
+                if len(split_path) == 1 or not split_path[1]:  # if no device id is specified we get all devices
+                    return get_all_devices(parameters)
 
                 wireless_device_id = split_path[1]
                 device = device_handler.get_device(wireless_device_id)
@@ -54,7 +168,7 @@ def lambda_handler(event, context):
                 return _create_response_message(200, device.to_dict())
 
             elif path == "/devices":
-                return get_all_devices()
+                return get_all_devices(parameters)
 
             elif path.startswith("/measurements/"):  # get device request format devices/{deviceId}
                 # you can also optionally specify range: devices/{deviceId}/dateStart/dateEnd
@@ -62,14 +176,18 @@ def lambda_handler(event, context):
                 if len(split_path) == 1:
                     return _create_response_message(400, "Invalid path. Device id needs to be specified. Example of correct "
                                                          "path /measurements/{wirelessDeviceId}")
-                remaining_path = split_path[1].split("/", 1)
+                remaining_path = split_path[1].split("/")
                 wireless_device_id = remaining_path[0]
+                dates = [part for part in remaining_path[1:] if part]
+                date_start = _parse_time(dates[0]) if len(dates) > 0 else None
+                date_end = _parse_time(dates[1]) if len(dates) > 1 else None
+                return get_measurements(wireless_device_id, date_start, date_end, parameters)
+
+            elif path.rstrip("/") == "/latency":
+                return get_downlink_latency()
 
-                measurements = measurement_handler.get_measurements_for_device(wireless_device_id=wireless_device_id)
-                measurements_json = []
-                for measurement in measurements:
-                    measurements_json.append(measurement.to_dict())
-                return _create_response_message(200, measurements_json)
+            elif path.startswith("/latency/"):  # round-trip time of the downlinks to a device: latency/{deviceId}
+                return get_downlink_latency(path.split("/latency/", 1)[1])
 
             elif path == "/measurements":
                 return _create_response_message(400, "Invalid path. Correct path format /measurements/{wirelessDeviceId}")
@@ -78,11 +196,96 @@ def lambda_handler(event, context):
 
         return _create_response_message(400, "Invalid path or method.")
 
+    except ValueError as e:
+        return _create_response_message(400, "Invalid path or parameters. {}".format(e))
     except Exception as e:
         print(f'Unexpected error occurred: {traceback.format_exc()}')
         return _create_response_message(400, "Unexpected exception thrown {}".format(e))
 
 
+def get_downsampled_measurements(wireless_device_id: str, date_start: int, date_end: int, parameters: dict):
+    """
+    Get time-bucketed aggregates (bucket and agg parameters, e.g. ?bucket=60s&agg=avg,min,max)
+    or visually downsampled records (points parameter, LTTB) of the SidewalkDeviceMeasurements table records
+    coming from given device within a given time span. Series is returned oldest first.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param date_start:          Start of the time span (UTC time in milliseconds).
+    :param date_end:            End of the time span (UTC time in milliseconds).
+    :param parameters:          Query string parameters.
+    :return:                    Response with list of aggregates ({"time": int, "<agg>": float, ...})
+                                or records.
+    """
+    if _is_paginated(parameters):
+        raise ValueError('Limit and cursor cannot be combined with bucket or points')
+    if "bucket" in parameters and "points" in parameters:
+        raise ValueError('Bucket and points cannot be combined')
+    if "bucket" in parameters:
+        bucket = aggregation_utils.parse_bucket(parameters["bucket"])
+        aggregates = aggregation_utils.parse_aggregates(parameters.get("agg"))
+    else:
+        points = int(parameters["points"])
+        if not 3 <= points <= aggregation_utils.MAX_POINTS:
+            raise ValueError(f'Points has to be between 3 and {aggregation_utils.MAX_POINTS}')
+
+    measurements, _ = measurement_handler.get_measurements_page(wireless_device_id=wireless_device_id,
+                                                                start=date_start, end=date_end,
+                                                                fields=('value', 'time'))
+    measurements.reverse()  # oldest first
+    times = [measurement.get_time() for measurement in measurements]
+    values = [measurement.get_value() for measurement in measurements]
+    if "bucket" in parameters:
+        return _create_response_message(200, aggregation_utils.aggregate(times, values, bucket, aggregates))
+
+    indices = aggregation_utils.lttb(times, values, points)
+    return _create_response_message(200, [measurements[idx].to_dict() for idx in indices])
+
+
+def _is_paginated(parameters: dict) -> bool:
+    return "limit" in parameters or "cursor" in parameters
+
+
+def _parse_page_parameters(parameters: dict, allowed_fields: tuple) -> (int, dict, tuple):
+    """
+    Parses pagination query string parameters.
+
+    :param parameters:      Query string parameters.
+    :param allowed_fields:  Names of the fields, which can be requested.
+    :return:                Tuple of limit (None if not given), ExclusiveStartKey (None for the first page)
+                            and requested fields (None for all fields).
+    :raises ValueError: If any of the parameters is invalid.
+    """
+    limit = parameters.get("limit")
+    if limit is not None:
+        limit = int(limit)
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'Limit has to be between 1 and {MAX_PAGE_SIZE}')
+    start_key = pagination_utils.decode_cursor(parameters.get("cursor"))
+    fields = pagination_utils.parse_fields(parameters.get("fields"), allowed_fields)
+    return limit, start_key, fields
+
+
+def _select_fields(record: dict, fields: tuple) -> dict:
+    if fields is None:
+        return record
+    return {field: record[field] for field in dict.fromkeys(('wireless_device_id',) + fields)}
+
+
+def _parse_time(value: str) -> int:
+    """
+    Parses time given in the path.
+
+    :param value:   UTC time in milliseconds or ISO 8601 date (UTC, if no timezone is given).
+    :return:        UTC time in milliseconds.
+    """
+    if value.isdigit():
+        return int(value)
+    date = datetime.fromisoformat(unquote(value).replace("Z", "+00:00"))
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
 def _create_response_message(status_code: int, body) -> dict:
     return {
         'statusCode': status_code,
@@ -90,6 +293,8 @@ def _create_response_message(status_code: int, body) -> dict:
         "headers": {
             "Access-Control-Allow-Origin": cors_utils.get_gui_bucket_url_for_cors(),
             "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT",
-            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,"
+                                            "If-None-Match",
+            "Access-Control-Expose-Headers": "ETag"
         }
     }
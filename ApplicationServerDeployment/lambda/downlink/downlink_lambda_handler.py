@@ -5,27 +5,22 @@
 Handles requests to send downlink commands to a wireless device.
 """
 
-import base64
-import boto3
 import json
 import cors_utils
 import traceback
 from botocore.exceptions import ClientError
-from datetime import datetime, timezone
 from typing import Final
 
-import time_utils
-from command import Command
+import downlink_utils
+from downlink_retry import get_error_code
+from downlink_utils import DEMO_APP_CAP_DISCOVERY_RESP, DEMO_APP_ACTION_RESP, DEMO_APP_ACTION_REQ, DownlinkQueuedError
 from protocol import *
-from tag import Tag
 
 
 COMMAND_KEY: Final = "command"
-DEMO_APP_CAP_DISCOVERY_RESP: Final = "DEMO_APP_CAP_DISCOVERY_RESP"
-DEMO_APP_ACTION_RESP: Final = "DEMO_APP_ACTION_RESP"
-DEMO_APP_ACTION_REQ: Final = "DEMO_APP_ACTION_REQ"
-session = boto3.Session()
-wireless_client = session.client(service_name='iotwireless')
+MAX_FANOUT_DEVICES: Final = 500  # max number of devices in the "devices" list of a single request
+SCHEDULED_EVENT_SOURCE: Final = "aws.events"  # EventBridge rule, which triggers the sweep of the retry queue
+MAX_INDEX: Final = 255  # LED and button indices are encoded as single bytes
 headers = {
     "Access-Control-Allow-Origin": cors_utils.get_gui_bucket_url_for_cors(),
     "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT",
@@ -33,57 +28,119 @@ headers = {
 }
 
 
-def send_hex_payload_to_device(wireless_device_id: str, cmd: Command, seq_n: int):
+def format_command_id_as_json(command: str, response):
     """
-    Extracts hexadecimal representation of the Command object.
-    Encodes hex into base64 and sends it to the wireless device.
+    Formats information about the sent downlink into a json dict.
 
-    :param wireless_device_id:  Id of the wireless device.
-    :param cmd:                 Command object.
-    :param seq_n:               Sequence number of the downlink message.
-    :return:                    IoTWireless client response.
+    :param command:     Demo app specific command.
+    :param response:    IoTWireless client response.
+    :return:            Command data in a json format.
     """
-    wireless_metadata = {}
-    wireless_metadata_sidewalk = {"Seq": seq_n}
-    wireless_metadata["Sidewalk"] = wireless_metadata_sidewalk
+    dict_format = dict()
+    dict_format["command"] = command
+    dict_format["response"] = response
+    return dict_format
 
-    payload_hex = cmd.hex_repr()
-    payload_data = base64.b64encode(bytes.fromhex(payload_hex)).decode()
 
-    return wireless_client.send_data_to_wireless_device(Id=wireless_device_id,
-                                                        TransmitMode=0,
-                                                        PayloadData=payload_data,
-                                                        WirelessMetadata=wireless_metadata)
+def parse_indices(value) -> [int]:
+    """
+    Parses indices of the LEDs or buttons given in the request.
 
+    :param value:   Value of the ledId or button_press field: int or non-empty list of ints (0-255).
+    :return:        List of indices, None if the value is not supported.
+    """
+    if type(value) is int:
+        value = [value]
+    if type(value) is list and value and all(type(idx) is int and 0 <= idx <= MAX_INDEX for idx in value):
+        return value
+    return None
 
-def calculate_seq_from_current_time():
+
+def send_led_action_req(device_id: str, tag_type: TagType, led_id: [int], context):
     """
-    Determines sequence number to be used for downlink message based on the current time.
-    SeqN is calculated in following fashion:
-    First 2 digits are reserved for current seconds
-    Last 2 digits are reserved for first 2 digits of current microseconds
+    Sends DEMO_APP_ACTION_REQ command to the device, merged with the other LED requests sent to it meanwhile
+    and throttled by the rate limits of the device and its link type.
+    The merged requests were answered with 202 already, so if their net state can not be sent now, it is queued
+    for the sweeper instead of being dropped.
 
-    :return:    Sequence number.
+    :param device_id:   Id of the wireless device.
+    :param tag_type:    TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:      List of indices of the LEDs.
+    :param context:     Lambda context, used to stop waiting for the rate limit before the Lambda times out.
+    :return:            Response with the message id, 202 if the request was merged into another one or queued.
     """
-    time_now = datetime.now(timezone.utc)
-    seq_n = time_now.strftime("%S%f")[:-4]
-    while seq_n[0] == "0" and len(seq_n) > 1:
-        seq_n = seq_n[1:]
-    return int(seq_n)
+    net_state = downlink_utils.coalesce_led_action_req(device_id, tag_type, led_id)
+    if net_state is None:
+        return {
+            'statusCode': 202,
+            'body': json.dumps(format_command_id_as_json(DEMO_APP_ACTION_REQ, {"coalesced": True})),
+            "headers": headers
+        }
+    led_on, led_off = net_state
+    coalesced = downlink_utils.get_coalescer() is not None
+    deadline = downlink_utils.get_deadline(context)
+    link_type = downlink_utils.get_link_type(device_id)
+    if not downlink_utils.acquire_send_slot(device_id, deadline, downlink_utils.MAX_SEND_SLOT_WAIT, link_type):
+        if coalesced:
+            downlink_utils.queue_led_state_req(device_id, led_on, led_off, downlink_utils.ERROR_THROTTLED)
+            raise DownlinkQueuedError(device_id, DEMO_APP_ACTION_REQ, downlink_utils.ERROR_THROTTLED)
+        return {
+            'statusCode': 429,
+            'body': json.dumps(f'Rate limit of the downlinks to device with id {device_id} exceeded, try again later.'),
+            "headers": headers
+        }
 
+    try:
+        msg_id = downlink_utils.send_led_state_req(device_id, led_on, led_off, deadline=deadline,
+                                                   link_type=link_type)
+    except DownlinkQueuedError:
+        raise
+    except Exception as error:
+        if coalesced:
+            # permanent errors are dead-lettered by the sweeper, so the merged state is kept for inspection
+            downlink_utils.queue_led_state_req(device_id, led_on, led_off, get_error_code(error))
+        raise
+    body = format_command_id_as_json(DEMO_APP_ACTION_REQ, msg_id)
+    body["led_on"], body["led_off"] = led_on, led_off
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body),
+        "headers": headers
+    }
 
-def format_command_id_as_json(command: str, response):
+
+def send_led_action_req_to_devices(devices, tag_type: TagType, led_id: [int], context):
     """
-    Formats information about the sent downlink into a json dict.
+    Sends DEMO_APP_ACTION_REQ command to every device from the "devices" list of the request.
 
-    :param command:     Demo app specific command.
-    :param response:    IoTWireless client response.
-    :return:            Command data in a json format.
+    :param devices:     Ids of the wireless devices (list of str).
+    :param tag_type:    TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:      List of indices of the LEDs.
+    :param context:     Lambda context, used to stop sending before the Lambda times out.
+    :return:            Response with the message ids and errors of every device.
     """
-    dict_format = dict()
-    dict_format["command"] = command
-    dict_format["response"] = response
-    return dict_format
+    if type(devices) is not list or not devices or not all(type(device) is str for device in devices):
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Devices field needs to be a non-empty list of device ids.'),
+            "headers": headers
+        }
+    if len(devices) > MAX_FANOUT_DEVICES:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(f'At most {MAX_FANOUT_DEVICES} devices are supported in a single request.'),
+            "headers": headers
+        }
+
+    message_ids, errors = downlink_utils.send_led_action_req_to_devices(devices, tag_type, led_id,
+                                                                        downlink_utils.get_deadline(context))
+    body = format_command_id_as_json(DEMO_APP_ACTION_REQ, message_ids)
+    body["errors"] = errors
+    return {
+        'statusCode': 200,
+        'body': json.dumps(body),
+        "headers": headers
+    }
 
 
 def lambda_handler(event, context):
@@ -99,6 +156,9 @@ def lambda_handler(event, context):
         if type(event) == str:
             event = json.loads(event)
 
+        if event.get("source") == SCHEDULED_EVENT_SOURCE:
+            return downlink_utils.sweep_retry_queue(downlink_utils.get_deadline(context))
+
         method = event.get("httpMethod")
         if method != "POST":
             return {
@@ -126,22 +186,11 @@ def lambda_handler(event, context):
         command = json_body.get("command")
         device_id = json_body.get("deviceId")
 
-        seq_n = calculate_seq_from_current_time()
-
         # ---------------------------------------------
         # Handle and encode demo app specific commands
         # ---------------------------------------------
         if command == DEMO_APP_CAP_DISCOVERY_RESP:
-            status_code = '00000000'
-            cmd = Command()
-            cmd.encode(
-                status_hdr_ind=True,
-                op_code=OpCode.MSG_TYPE_RESP,
-                cls=Class.DEMO_APP_CLASS,
-                id=Id.DEMO_APP_CAP_DISCOVERY_RESP,
-                status_code=status_code
-            )
-            msg_id = send_hex_payload_to_device(device_id, cmd, seq_n)
+            msg_id = downlink_utils.send_cap_discovery_resp(device_id, deadline=downlink_utils.get_deadline(context))
 
             return {
                 'statusCode': 200,
@@ -150,18 +199,17 @@ def lambda_handler(event, context):
             }
 
         elif command == DEMO_APP_ACTION_RESP:
-            button_press = json_body.get("button_press")
-            tags_json = [{TagType.BUTTON_PRESSED_RESP: button_press}]
-            tags = [Tag().encode(tag) for tag in tags_json]
-            cmd = Command().encode(
-                status_hdr_ind=True,
-                op_code=OpCode.MSG_TYPE_RESP,
-                cls=Class.DEMO_APP_CLASS,
-                id=Id.DEMO_APP_ACTION_RESP,
-                status_code='00000000',
-                payload=tags
-            )
-            msg_id = send_hex_payload_to_device(device_id, cmd, seq_n)
+            button_press = parse_indices(json_body.get("button_press"))
+            if button_press is None:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps("Button index {} is not supported. "
+                                       "Only int and non-empty lists of int (0-{}) are supported".format(
+                                           json_body.get("button_press"), MAX_INDEX)),
+                    "headers": headers
+                }
+            msg_id = downlink_utils.send_button_pressed_resp(device_id, button_press,
+                                                             deadline=downlink_utils.get_deadline(context))
             return {
                 'statusCode': 200,
                 'body': json.dumps(format_command_id_as_json(DEMO_APP_ACTION_RESP, msg_id)),
@@ -169,9 +217,7 @@ def lambda_handler(event, context):
             }
         elif command == DEMO_APP_ACTION_REQ:
 
-            led_id = json_body.get("ledId")
             action = json_body.get("action")
-            gps_time = time_utils.get_gps_time()
             if action == "ON":
                 tag_type = TagType.LED_ON
             elif action == "OFF":
@@ -183,34 +229,20 @@ def lambda_handler(event, context):
                                        f" Action needs to be either ON or OFF. "),
                     "headers": headers
                 }
-            if type(led_id) is not list:
-                if type(led_id) is int:
-                    led_id = [led_id]
-                else:
-                    return {
-                        'statusCode': 400,
-                        'body': json.dumps("Led index of format {} is not supported. "
-                                "Only lists and int are supported".format(type(led_id))),
-                        "headers": headers
-                    }
-            tags_json = [
-                {tag_type: led_id},
-                {TagType.CURRENT_GPS_TIME_IN_SECS: int(gps_time)}
-            ]
-            tags = [Tag().encode(tag) for tag in tags_json]
-            cmd = Command().encode(
-                status_hdr_ind=False,
-                op_code=OpCode.MSG_TYPE_WRITE,
-                cls=Class.DEMO_APP_CLASS,
-                id=Id.DEMO_APP_ACTION_REQ,
-                payload=tags
-            )
-            msg_id = send_hex_payload_to_device(device_id, cmd, seq_n)
-            return {
-                'statusCode': 200,
-                'body': json.dumps(format_command_id_as_json(DEMO_APP_ACTION_REQ, msg_id)),
-                "headers": headers
-            }
+            led_id = parse_indices(json_body.get("ledId"))
+            if led_id is None:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps("Led index {} is not supported. "
+                                       "Only int and non-empty lists of int (0-{}) are supported".format(
+                                           json_body.get("ledId"), MAX_INDEX)),
+                    "headers": headers
+                }
+            devices = json_body.get("devices")
+            if devices is not None:
+                return send_led_action_req_to_devices(devices, tag_type, led_id, context)
+
+            return send_led_action_req(device_id, tag_type, led_id, context)
         elif command is None:
             return {
                 'statusCode': 400,
@@ -223,6 +255,14 @@ def lambda_handler(event, context):
             'body': json.dumps('Command ' + str(command) + ' is not supported.'),
             "headers": headers
         }
+    except DownlinkQueuedError as error:
+        print(f'Downlink queued: {error}')
+        return {
+            'statusCode': 202,
+            'body': json.dumps(f'Downlink to device with id {device_id} failed with {error.error_code},'
+                               f' it will be retried later.'),
+            "headers": headers
+        }
     except ClientError as error:
         print(f'Iot wireless exception: {traceback.format_exc()}.')
         if error.response['Error']['Code'] == 'ResourceNotFoundException':
@@ -0,0 +1,189 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for batched uplink processing.
+"""
+import base64
+import json
+import unittest
+
+import uplink_batch
+
+CAP_DISCOVERY = '4001014201020B030C01'
+LED_ON_123 = '61C90301020387000003E888000000640C04'
+LED_OFF_123 = '61CA0301020387000003E888000000640C04'
+SENSOR_DATA = '41060187000000010C01'
+BUTTON_PRESS_1 = '41050187000000010C04'
+BUTTON_PRESS_12 = '4145010287000000010C04'
+
+
+def uplink(wireless_device_id: str, seq: int, payload: str) -> dict:
+    return {
+        "WirelessDeviceId": wireless_device_id,
+        "WirelessMetadata": {"Sidewalk": {"Seq": seq}},
+        "PayloadData": base64.b64encode(payload.encode('ascii')).decode('ascii')
+    }
+
+
+class FakeEventSource:
+    """
+    Builds SQS and Kinesis batches of uplinks, as delivered by the Lambda event source mappings.
+    """
+
+    def __init__(self):
+        self.uplinks = []
+
+    def send(self, wireless_device_id: str, seq: int, payload: str):
+        self.uplinks.append({"uplink": uplink(wireless_device_id, seq, payload)})
+        return self
+
+    def sqs_records(self) -> [dict]:
+        return [{"messageId": f'message-{i}', "body": json.dumps(message), "eventSource": "aws:sqs",
+                 "attributes": {"SentTimestamp": str(1700000000000 + 250 * i)}}
+                for i, message in enumerate(self.uplinks)]
+
+    def kinesis_records(self) -> [dict]:
+        return [{"kinesis": {"sequenceNumber": str(i),
+                             "data": base64.b64encode(json.dumps(message).encode()).decode(),
+                             "approximateArrivalTimestamp": 1700000000.0 + 0.25 * i},
+                 "eventSource": "aws:kinesis"}
+                for i, message in enumerate(self.uplinks)]
+
+
+class FakeDeviceHandler:
+
+    def __init__(self, failing_device_id: str = None):
+        self.failing_device_id = failing_device_id
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(wireless_device_id, *args):
+            if wireless_device_id == self.failing_device_id:
+                raise RuntimeError('Write failed')
+            self.calls.append((name, wireless_device_id) + args)
+
+        return record
+
+
+class FakeMeasurementHandler:
+
+    def __init__(self, unprocessed_device_id: str = None):
+        self.unprocessed_device_id = unprocessed_device_id
+        self.measurements = []
+
+    def add_measurements(self, measurements):
+        unprocessed = [measurement for measurement in measurements
+                       if measurement.get_wireless_device_id() == self.unprocessed_device_id]
+        if unprocessed:
+            raise uplink_batch.UnprocessedMeasurementsError(unprocessed)
+        self.measurements.extend(measurements)
+
+
+class FakeDeliveryHandler:
+
+    def __init__(self, failing: bool = False):
+        self.failing = failing
+        self.responses = []
+
+    def match_response(self, wireless_device_id, led_on, led_off):
+        if self.failing:
+            raise RuntimeError('Query failed')
+        self.responses.append((wireless_device_id, led_on, led_off))
+        return {'seq': len(self.responses), 'link_type': 'BLE', 'round_trip': 1200}
+
+
+class TestUplinkBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.device_handler = FakeDeviceHandler()
+        self.measurement_handler = FakeMeasurementHandler()
+        self.responses = []
+
+    def send_response(self, command, wireless_device_id, button_press=None):
+        self.responses.append((command, wireless_device_id, button_press))
+
+    def process(self, records):
+        return uplink_batch.process_batch(records, self.device_handler, self.measurement_handler,
+                                          self.send_response)
+
+    def test_processBatch_collapsesPerDevice_shouldSucceed(self):
+        source = (FakeEventSource()
+                  .send('device-1', 3, BUTTON_PRESS_12)
+                  .send('device-1', 1, LED_ON_123)
+                  .send('device-1', 2, LED_OFF_123)
+                  .send('device-1', 4, BUTTON_PRESS_1)
+                  .send('device-2', 1, SENSOR_DATA)
+                  .send('device-2', 2, SENSOR_DATA))
+        result = self.process(source.sqs_records())
+        self.assertEqual(result, {"batchItemFailures": []})
+        self.assertEqual(self.device_handler.calls, [
+            ('update_led_state_and_last_uplink', 'device-1', [], [1, 2, 3]),
+            ('apply_button_presses_and_last_uplink', 'device-1', [(3, [1, 2]), (4, [1])]),
+            ('update_link_type_and_last_uplink', 'device-2', uplink_batch.Device('d', link_type='BLE').get_link_type())
+        ])
+        self.assertEqual(self.responses, [('DEMO_APP_ACTION_RESP', 'device-1', [1, 2])])
+        self.assertEqual([measurement.get_value() for measurement in self.measurement_handler.measurements], [1.0, 1.0])
+        self.assertEqual([measurement.get_time() for measurement in self.measurement_handler.measurements],
+                         [1700000001000, 1700000001250])
+
+    def test_processBatch_kinesis_shouldKeepRecordTimes(self):
+        source = FakeEventSource().send('device-1', 2, SENSOR_DATA).send('device-2', 1, SENSOR_DATA)
+        self.assertEqual(self.process(source.kinesis_records()), {"batchItemFailures": []})
+        self.assertEqual(sorted((measurement.get_wireless_device_id(), measurement.get_time())
+                                for measurement in self.measurement_handler.measurements),
+                         [('device-1', 1700000000000), ('device-2', 1700000000250)])
+
+    def test_processBatch_ledResponses_shouldMatchDeliveries(self):
+        records = (FakeEventSource()
+                   .send('device-1', 1, LED_ON_123)
+                   .send('device-1', 2, LED_OFF_123)
+                   .sqs_records())
+        delivery_handler = FakeDeliveryHandler()
+        result = uplink_batch.process_batch(records, self.device_handler, self.measurement_handler,
+                                            self.send_response, delivery_handler)
+        self.assertEqual(result, {"batchItemFailures": []})
+        self.assertEqual(delivery_handler.responses, [('device-1', [1, 2, 3], []), ('device-1', [], [1, 2, 3])])
+
+        result = uplink_batch.process_batch(records, self.device_handler, self.measurement_handler,
+                                            self.send_response, FakeDeliveryHandler(failing=True))
+        self.assertEqual(result, {"batchItemFailures": []})
+
+    def test_processBatch_capDiscovery_shouldAddDevice(self):
+        result = self.process(FakeEventSource().send('device-1', 5, CAP_DISCOVERY).kinesis_records())
+        self.assertEqual(result, {"batchItemFailures": []})
+        (name, device), = self.device_handler.calls
+        self.assertEqual(name, 'add_device')
+        self.assertEqual(device.get_button_pressed(), [{"id": 1, "seqN": 5, "state": 0}])
+        self.assertEqual(self.responses, [('DEMO_APP_CAP_DISCOVERY_RESP', 'device-1', None)])
+
+    def test_processBatch_malformedRecord_shouldReportFailure(self):
+        records = FakeEventSource().send('device-1', 1, SENSOR_DATA).sqs_records()
+        records.append({"messageId": "broken", "body": "not json"})
+        records.append({"messageId": "bad-payload", "body": json.dumps({"uplink": uplink('device-1', 2, '4Z')})})
+        result = self.process(records)
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "broken"},
+                                                        {"itemIdentifier": "bad-payload"}]})
+        self.assertEqual(len(self.measurement_handler.measurements), 1)
+
+    def test_processBatch_writeFails_shouldReportDeviceRecords(self):
+        self.device_handler = FakeDeviceHandler(failing_device_id='device-1')
+        source = (FakeEventSource()
+                  .send('device-1', 1, BUTTON_PRESS_1)
+                  .send('device-2', 1, BUTTON_PRESS_1)
+                  .send('device-1', 2, BUTTON_PRESS_1))
+        result = self.process(source.kinesis_records())
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "0"}, {"itemIdentifier": "2"}]})
+        self.assertEqual(self.responses, [('DEMO_APP_ACTION_RESP', 'device-2', [1])])
+
+    def test_processBatch_measurementsUnprocessed_shouldReportDeviceRecords(self):
+        self.measurement_handler = FakeMeasurementHandler(unprocessed_device_id='device-2')
+        source = (FakeEventSource()
+                  .send('device-1', 1, SENSOR_DATA)
+                  .send('device-2', 1, SENSOR_DATA))
+        result = self.process(source.sqs_records())
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "message-1"}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
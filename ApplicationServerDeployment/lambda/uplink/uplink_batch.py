@@ -0,0 +1,284 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Handles batches of uplinks delivered by SQS or Kinesis event sources.
+
+Records are decoded and grouped by the wireless device. State updates of every device are collapsed,
+so that each device is written once per batch (per kind of the update), no matter how many uplinks it sent.
+Records, which could not be processed, are reported as partial batch failures.
+"""
+
+import base64
+import json
+from typing import Final
+
+from command import Command
+from device import Device
+from measurement import Measurement
+from measurements_handler import UnprocessedMeasurementsError
+
+DEMO_APP_CAP_DISCOVERY_RESP: Final = "DEMO_APP_CAP_DISCOVERY_RESP"
+DEMO_APP_CAP_DISCOVERY_NOTIFICATION: Final = "DEMO_APP_CAP_DISCOVERY_NOTIFICATION"
+DEMO_APP_ACTION_RESP: Final = "DEMO_APP_ACTION_RESP"
+DEMO_APP_ACTION_NOTIFICATION: Final = "DEMO_APP_ACTION_NOTIFICATION"
+
+
+class DeviceUplinks:
+    """
+    Collapsed state updates reported by uplinks of a single device.
+
+    Attributes
+    ----------
+        wireless_device_id: str
+            Wireless device ID.
+        item_ids: [str]
+            Ids of the records (SQS messageId or Kinesis sequenceNumber).
+        seqs: [int]
+            Sidewalk Seq of every uplink.
+        capabilities: (int, dict)
+            Seq and decoded payload of the newest DEMO_APP_CAP_DISCOVERY_NOTIFICATION (None if not received).
+        led_on: set
+            Indices of the LEDs reported as turned on (and not turned off by a newer uplink).
+        led_off: set
+            Indices of the LEDs reported as turned off (and not turned on by a newer uplink).
+        led_updated: bool
+            True if any DEMO_APP_ACTION_RESP was received.
+        led_responses: [([int], [int])]
+            LEDs reported as turned on and off by every DEMO_APP_ACTION_RESP.
+        link_type: str
+            Link type reported by the newest sensor data notification.
+        measurements: [(int, int, int)]
+            Seq, value and time (UTC time in milliseconds, None if not known) of every sensor data notification.
+        button_presses: [(int, [int])]
+            Seq and indices of the pressed buttons of every button press notification.
+    """
+    __slots__ = ('wireless_device_id', 'item_ids', 'seqs', 'capabilities', 'led_on', 'led_off', 'led_updated',
+                 'led_responses', 'link_type', 'measurements', 'button_presses')
+
+    def __init__(self, wireless_device_id: str):
+        self.wireless_device_id = wireless_device_id
+        self.item_ids = []
+        self.seqs = []
+        self.capabilities = None
+        self.led_on = set()
+        self.led_off = set()
+        self.led_updated = False
+        self.led_responses = []
+        self.link_type = None
+        self.measurements = []
+        self.button_presses = []
+
+    def add(self, item_id: str, seq: int, decoded: dict, received_at: int = None):
+        """
+        Adds decoded uplink. Uplinks have to be added in the order of their Seq.
+
+        :param item_id:     Id of the record.
+        :param seq:         Sidewalk Seq of the uplink.
+        :param decoded:     Decoded payload, see: Command.decoded_cmd.
+        :param received_at: Time of the record (UTC time in milliseconds), see: read_record_time.
+        """
+        self.item_ids.append(item_id)
+        self.seqs.append(seq)
+        command = decoded["id"]
+        if command == DEMO_APP_CAP_DISCOVERY_NOTIFICATION:
+            self.capabilities = (seq, decoded)
+        elif command == DEMO_APP_ACTION_RESP:
+            led_on = set(decoded.get("led_on_resp", []))
+            led_off = set(decoded.get("led_off_resp", []))
+            self.led_on = (self.led_on - led_off) | led_on
+            self.led_off = (self.led_off - led_on) | led_off
+            self.led_on -= led_off
+            self.led_updated = True
+            self.led_responses.append((sorted(led_on), sorted(led_off)))
+        elif command == DEMO_APP_ACTION_NOTIFICATION:
+            if "sensor_data" in decoded:
+                self.measurements.append((seq, decoded["sensor_data"], received_at))
+                self.link_type = decoded.get("link_type")
+            if "button_press" in decoded:
+                self.button_presses.append((seq, decoded["button_press"]))
+
+    def pressed_buttons(self) -> [int]:
+        """
+        Returns indices of the buttons pressed in any of the uplinks.
+        """
+        return sorted(set(button_id for _, button_ids in self.button_presses for button_id in button_ids))
+
+
+def read_record(record: dict) -> (str, dict):
+    """
+    Reads uplink from the SQS or Kinesis record. Record body is the sidewalk/app_data message,
+    optionally wrapped in {"uplink": {...}}, like the event of the uplink lambda.
+
+    :param record:  SQS or Kinesis record.
+    :return:        Tuple of record id (for batchItemFailures) and uplink dict.
+    """
+    if "kinesis" in record:
+        item_id = record["kinesis"]["sequenceNumber"]
+        message = json.loads(base64.b64decode(record["kinesis"]["data"]))
+    else:
+        item_id = record["messageId"]
+        message = json.loads(record["body"])
+    return item_id, message.get("uplink", message)
+
+
+def read_record_time(record: dict) -> int:
+    """
+    Reads time, at which the uplink was put to the queue or stream.
+
+    :param record:  SQS or Kinesis record.
+    :return:        UTC time in milliseconds (SQS SentTimestamp or Kinesis approximateArrivalTimestamp),
+                    None if the record does not carry it.
+    """
+    if "kinesis" in record:
+        arrival = record["kinesis"].get("approximateArrivalTimestamp")
+        return None if arrival is None else int(round(float(arrival) * 1000))
+    sent = record.get("attributes", {}).get("SentTimestamp")
+    return None if sent is None else int(sent)
+
+
+def decode_uplink(uplink: dict) -> (str, int, dict):
+    """
+    Decodes sidewalk/app_data message.
+
+    :param uplink:  Dict with WirelessDeviceId, WirelessMetadata and PayloadData.
+    :return:        Tuple of wireless device ID, Sidewalk Seq and decoded payload.
+    """
+    wireless_device_id = uplink["WirelessDeviceId"]
+    seq = uplink["WirelessMetadata"]["Sidewalk"].get("Seq")
+    decoded_data = base64.b64decode(uplink["PayloadData"].encode('ascii')).decode('ascii')
+    return wireless_device_id, seq, Command().decode(decoded_data).decoded_cmd
+
+
+def group_records(records: [dict]) -> ({str: DeviceUplinks}, [str]):
+    """
+    Decodes records and groups them by the wireless device.
+
+    :param records:     List of SQS or Kinesis records.
+    :return:            Tuple of dict (wireless device ID: DeviceUplinks) and list of ids of the malformed records.
+    """
+    decoded = []
+    failed_item_ids = []
+    for record in records:
+        item_id = record.get("messageId") or record.get("kinesis", {}).get("sequenceNumber")
+        try:
+            item_id, uplink = read_record(record)
+            decoded.append((item_id,) + decode_uplink(uplink) + (read_record_time(record),))
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError) as err:
+            print(f'Malformed record {item_id}: {err!r}')
+            failed_item_ids.append(item_id)
+
+    devices = {}
+    for item_id, wireless_device_id, seq, decoded_cmd, received_at in sorted(decoded, key=lambda uplink: (uplink[2] is None,
+                                                                                            uplink[2] or 0)):
+        if wireless_device_id not in devices:
+            devices[wireless_device_id] = DeviceUplinks(wireless_device_id)
+        devices[wireless_device_id].add(item_id, seq, decoded_cmd, received_at)
+    return devices, failed_item_ids
+
+
+def match_delivery(delivery_handler, wireless_device_id: str, led_on: [int], led_off: [int]) -> dict:
+    """
+    Matches DEMO_APP_ACTION_RESP with the downlink it responds to and logs its round-trip time.
+    Errors are logged only, delivery tracking does not affect handling of the uplink.
+
+    :param delivery_handler:    DownlinkDeliveryHandler object.
+    :param wireless_device_id:  Wireless device ID.
+    :param led_on:              LEDs reported as turned on.
+    :param led_off:             LEDs reported as turned off.
+    :return:                    Matched delivery, see: DownlinkDeliveryHandler.match_response (None if not matched).
+    """
+    try:
+        delivery = delivery_handler.match_response(wireless_device_id, led_on, led_off)
+    except Exception as err:
+        print(f'Error while matching downlink delivery of wireless_device_id: {wireless_device_id}: {err!r}')
+        return None
+    if delivery is not None:
+        print(json.dumps(dict(delivery, metric='dl_round_trip', wireless_device_id=wireless_device_id)))
+    return delivery
+
+
+def apply_device_uplinks(uplinks: DeviceUplinks, device_handler, send_response, measurements: [Measurement],
+                         delivery_handler=None):
+    """
+    Writes collapsed state updates of a single device and sends responses to its uplinks.
+    Measurements are not written, but appended to the given list, to be written with the other devices' ones.
+
+    :param uplinks:                 DeviceUplinks object.
+    :param device_handler:          SidewalkDevicesHandler object.
+    :param send_response:           Function (command, wireless device ID, button_press=None), which sends response
+                                    to the device, see: downlink_utils.send_response_to_device.
+    :param measurements:            List, to which the measurements of the device are appended.
+    :param delivery_handler:        DownlinkDeliveryHandler object, which tracks the downlinks (None to skip tracking).
+    """
+    wireless_device_id = uplinks.wireless_device_id
+    if uplinks.capabilities is not None:
+        seq, decoded = uplinks.capabilities
+        buttons = decoded.get("buttons", [])
+        device = Device(wireless_device_id=wireless_device_id,
+                        led=decoded.get("leds", []), led_on=[],
+                        button=buttons, button_pressed=[{"id": button, "seqN": seq, "state": 0} for button in buttons],
+                        link_type=decoded.get("link_type"),
+                        sensor=decoded.get("sensor", False), sensor_unit=decoded.get("sensor_units"))
+        device_handler.add_device(device)
+        send_response(DEMO_APP_CAP_DISCOVERY_RESP, wireless_device_id)
+
+    if uplinks.led_updated:
+        device_handler.update_led_state_and_last_uplink(wireless_device_id, sorted(uplinks.led_on),
+                                                        sorted(uplinks.led_off))
+        if delivery_handler is not None:
+            for led_on, led_off in uplinks.led_responses:
+                match_delivery(delivery_handler, wireless_device_id, led_on, led_off)
+
+    if uplinks.measurements:
+        device = Device(wireless_device_id, link_type=uplinks.link_type)
+        device_handler.update_link_type_and_last_uplink(wireless_device_id, device.get_link_type())
+        for _, value, received_at in uplinks.measurements:
+            # time of the record, not of the batch, so that the readings keep their own (distinct) times
+            measurements.append(Measurement(wireless_device_id=wireless_device_id, temperature=value,
+                                            timestamp=received_at))
+
+    if uplinks.button_presses:
+        device_handler.apply_button_presses_and_last_uplink(wireless_device_id, uplinks.button_presses)
+        send_response(DEMO_APP_ACTION_RESP, wireless_device_id, button_press=uplinks.pressed_buttons())
+
+
+def process_batch(records: [dict], device_handler, measurement_handler, send_response,
+                  delivery_handler=None) -> dict:
+    """
+    Processes batch of SQS or Kinesis records.
+
+    :param records:                 List of records.
+    :param device_handler:          SidewalkDevicesHandler object.
+    :param measurement_handler:     MeasurementsHandler object.
+    :param send_response:           Function, which sends response to the device, see: apply_device_uplinks.
+    :param delivery_handler:        DownlinkDeliveryHandler object (None to skip delivery tracking).
+    :return:                        Partial batch response ({"batchItemFailures": [{"itemIdentifier": id}, ...]}).
+    """
+    devices, failed_item_ids = group_records(records)
+    failed_devices = set()
+    measurements = []
+    for uplinks in devices.values():
+        try:
+            apply_device_uplinks(uplinks, device_handler, send_response, measurements, delivery_handler)
+        except Exception as err:
+            print(f'Error while processing uplinks of wireless_device_id: {uplinks.wireless_device_id}: {err!r}')
+            failed_devices.add(uplinks.wireless_device_id)
+
+    measurements = [measurement for measurement in measurements
+                    if measurement.get_wireless_device_id() not in failed_devices]
+    if measurements:
+        try:
+            measurement_handler.add_measurements(measurements)
+        except UnprocessedMeasurementsError as err:
+            print(f'Error while writing measurements: {err}')
+            failed_devices.update(measurement.get_wireless_device_id() for measurement in err.measurements)
+        except Exception as err:
+            print(f'Error while writing measurements: {err!r}')
+            failed_devices.update(measurement.get_wireless_device_id() for measurement in measurements)
+
+    for uplinks in devices.values():
+        if uplinks.wireless_device_id in failed_devices:
+            failed_item_ids.extend(uplinks.item_ids)
+    print(f'Processed {len(records)} records from {len(devices)} devices, {len(failed_item_ids)} failed')
+    return {"batchItemFailures": [{"itemIdentifier": item_id} for item_id in failed_item_ids]}
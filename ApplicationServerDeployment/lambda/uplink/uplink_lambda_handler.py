@@ -6,13 +6,15 @@ Handles uplinks coming from the Sidewalk Sensor Monitoring Demo Application.
 """
 
 import base64
-import boto3
+import functools
 import json
 import traceback
 from datetime import datetime, timezone
 from typing import Final
 
+import downlink_utils
 import time_utils
+import uplink_batch
 from command import Command
 from device import Device
 from measurement import Measurement
@@ -23,38 +25,13 @@ DEMO_APP_ACTION_RESP: Final = "DEMO_APP_ACTION_RESP"
 DEMO_APP_ACTION_REQ: Final = "DEMO_APP_ACTION_REQ"
 DEMO_APP_ACTION_NOTIFICATION: Final = "DEMO_APP_ACTION_NOTIFICATION"
 
+from downlink_delivery_handler import DownlinkDeliveryHandler
 from measurements_handler import MeasurementsHandler
 from sidewalk_devices_handler import SidewalkDevicesHandler
 
 device_handler: Final = SidewalkDevicesHandler()
 measurement_handler: Final = MeasurementsHandler()
-
-
-def send_payload_to_downlink_lambda(command: str, wireless_device_id: str, button_pressed=None):
-    """
-    Sends commands to the SidewalkDownlinkLambda.
-
-    :param command:             Command to be sent.
-    :param wireless_device_id:  Id of the wireless device.
-    :param button_pressed:      List of indices of the buttons being pressed.
-    :return:                    Response from the SidewalkDownlinkLambda.
-    """
-    client = boto3.client('lambda')
-    downlink_payload = '{"body": {' \
-                       ' "command":"' + command + '",' \
-                                                  ' "deviceId":"' + wireless_device_id + '"'
-    if button_pressed is not None:
-        downlink_payload += ', "button_press":' + str(button_pressed)
-    downlink_payload += '}, ' \
-                        '"httpMethod": "POST"' \
-                        '}'
-
-    json_body = json.dumps(downlink_payload).encode('utf-8')
-    response = client.invoke(FunctionName='SidewalkDownlinkLambda',
-                             Payload=json_body)
-    response_body = response["Payload"].read().decode()
-    print(f'Response from SidewalkDownlinkLambda: {response_body}')
-    return response_body
+delivery_handler: Final = DownlinkDeliveryHandler()
 
 
 def lambda_handler(event, context):
@@ -69,6 +46,14 @@ def lambda_handler(event, context):
         # ---------------------------------------------------------------
         print(f'Received event: {event}')
 
+        records = event.get("Records")
+        if records is not None:
+            # Batch of uplinks delivered by SQS or Kinesis event source mapping (ReportBatchItemFailures)
+            send_response = functools.partial(downlink_utils.send_response_to_device,
+                                              deadline=downlink_utils.get_deadline(context))
+            return uplink_batch.process_batch(records, device_handler, measurement_handler, send_response,
+                                              delivery_handler)
+
         notification = event.get("notification")
         if notification is not None:
             return {
@@ -96,7 +81,7 @@ def lambda_handler(event, context):
         # Decode and handle demo app specific commands
         # ---------------------------------------------
         decoder = Command()
-        decoded_payload = decoder.decode(decoded_data).decoded_cmd
+        decoded_payload = decoder.decode(decoded_data, lazy=True).decoded_cmd
 
         ul_time = decoded_payload.get("gps_time")
         ul_latency = 'no latency info'
@@ -104,14 +89,15 @@ def lambda_handler(event, context):
         if ul_time is not None:
             ul_latency = str((datetime_now - time_utils.convert_gps_to_utc(ul_time)).total_seconds())
 
-        print(f'WirelessDeviceId: {wireless_device_id} DecodedPayload: {decoded_payload} Seqn: {sidewalk.get("Seq")} '
-              f'Uplink latency: {ul_latency}')
+        # raw payload is logged, formatting of the lazily decoded command would decode all of its tags
+        print(f'WirelessDeviceId: {wireless_device_id} Command: {decoded_payload["id"]} Payload: {decoded_data} '
+              f'Seqn: {sidewalk.get("Seq")} Uplink latency: {ul_latency}')
 
         command = decoded_payload["id"]
         if command is None or command == "":
             return {
                 'statusCode': 400,
-                'body': json.dumps('Received no command from request ' + decoded_payload)
+                'body': json.dumps('Received no command from request ' + decoded_data)
             }
 
         elif command == DEMO_APP_CAP_DISCOVERY_NOTIFICATION:
@@ -132,7 +118,9 @@ def lambda_handler(event, context):
                             sensor=sensor, sensor_unit=sensor_units)
             device_handler.add_device(device)
 
-            response_body = send_payload_to_downlink_lambda(DEMO_APP_CAP_DISCOVERY_RESP, wireless_device_id)
+            response_body = json.dumps(downlink_utils.send_response_to_device(
+                DEMO_APP_CAP_DISCOVERY_RESP, wireless_device_id, deadline=downlink_utils.get_deadline(context)))
+            print(f'Downlink response: {response_body}')
             return {
                 'statusCode': 200,
                 'body': json.dumps('Hello from DEMO_APP_CAP_DISCOVERY_NOTIFICATION! Resp' +
@@ -144,18 +132,9 @@ def lambda_handler(event, context):
             led_on = decoded_payload.get("led_on_resp", [])
             led_off = decoded_payload.get("led_off_resp", [])
 
-            # get device
-            device = device_handler.get_device(wireless_device_id)
-            led_on_set = set(device.get_led_on())
-
             # update leds
-            led_on_set.update(led_on)
-            led_on_set.difference_update(led_off)
-            device.set_led_on(list(led_on_set))
-            device_handler.update_led_and_last_uplink(
-                device.get_wireless_device_id(),
-                device.get_led_on()
-            )
+            device_handler.update_led_state_and_last_uplink(wireless_device_id, led_on, led_off)
+            uplink_batch.match_delivery(delivery_handler, wireless_device_id, led_on, led_off)
 
             print(f'Downlink latency: {dl_latency if dl_latency < 1000 else 0}')  # 'if' introduced in case of edge device time drift
             return {
@@ -178,27 +157,18 @@ def lambda_handler(event, context):
                 measurement = Measurement(wireless_device_id=wireless_device_id,
                                           temperature=sensor_data,
                                           timestamp=int(round(time_now * 1000)))
-                measurement_handler.add_measurement(measurement)
+                measurement_handler.add_measurements([measurement])
 
             if "button_press" in decoded_payload:
                 buttons_pressed = decoded_payload.get("button_press", [])
                 seq_n = sidewalk.get("Seq")
-                # get device
-                device = device_handler.get_device(wireless_device_id)
-                device_buttons = device.get_button_pressed()
-                for button in device_buttons:
-                    if button["id"] in buttons_pressed:
-                        if button["seqN"] < seq_n:
-                            button["state"] = 1 - button["state"]
-                            button["seqN"] = seq_n
-                device.button_pressed = device_buttons
-                device_handler.update_button_and_last_uplink(
-                    device.get_wireless_device_id(),
-                    device.button_pressed
-                )
+                # toggle buttons
+                device_handler.toggle_buttons_and_last_uplink(wireless_device_id, buttons_pressed, seq_n)
 
-                response_body = send_payload_to_downlink_lambda(DEMO_APP_ACTION_RESP, wireless_device_id,
-                                                                button_pressed=buttons_pressed)
+                response_body = json.dumps(downlink_utils.send_response_to_device(
+                    DEMO_APP_ACTION_RESP, wireless_device_id, button_press=buttons_pressed,
+                    deadline=downlink_utils.get_deadline(context)))
+                print(f'Downlink response: {response_body}')
                 return {
                     'statusCode': 200,
                     'body': json.dumps('Hello from DEMO_APP_ACTION_NOTIFICATION! Resp' +
@@ -213,7 +183,7 @@ def lambda_handler(event, context):
         else:
             return {
                 'statusCode': 400,
-                'body': json.dumps('Command ' + command + 'is not supported. Payload ' + decoded_payload)
+                'body': json.dumps('Command ' + command + 'is not supported. Payload ' + decoded_data)
             }
 
     except Exception:
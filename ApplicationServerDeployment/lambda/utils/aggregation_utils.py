@@ -0,0 +1,151 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Utility functions for time-bucketed aggregation and visual downsampling (LTTB) of measurement series.
+Aggregation is vectorized with NumPy for large series, if NumPy is available.
+"""
+
+import itertools
+import re
+from typing import Final
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, pure Python aggregation is used instead
+    numpy = None
+
+AGGREGATES: Final = ('avg', 'min', 'max', 'sum', 'count', 'first', 'last')
+NUMPY_THRESHOLD: Final = 1000  # number of points, above which NumPy is used
+MIN_BUCKET_MS: Final = 1000
+MAX_POINTS: Final = 10000
+
+_BUCKET_UNITS: Final = {'ms': 1, 's': 1000, 'm': 60 * 1000, 'h': 3600 * 1000, 'd': 24 * 3600 * 1000}
+_BUCKET_PATTERN: Final = re.compile(r'^(\d+)(ms|s|m|h|d)?$')
+
+
+def parse_bucket(bucket: str) -> int:
+    """
+    Parses bucket size, e.g. 500ms, 60s (seconds are the default unit), 5m, 1h, 1d.
+
+    :param bucket:  Bucket size.
+    :return:        Bucket size in milliseconds.
+    :raises ValueError: If the bucket size is malformed or smaller than MIN_BUCKET_MS.
+    """
+    match = _BUCKET_PATTERN.match(bucket.strip())
+    if match is None:
+        raise ValueError(f'Invalid bucket: {bucket}. Example of correct bucket: 60s, 5m, 1h')
+    size = int(match.group(1)) * _BUCKET_UNITS[match.group(2) or 's']
+    if size < MIN_BUCKET_MS:
+        raise ValueError(f'Bucket has to be at least {MIN_BUCKET_MS} ms')
+    return size
+
+
+def parse_aggregates(aggregates: str) -> tuple:
+    """
+    Parses comma-separated list of the aggregate functions.
+
+    :param aggregates:  Aggregate functions (avg, min and max, if None or empty).
+    :return:            Tuple of aggregate function names.
+    :raises ValueError: If any of the functions is not supported.
+    """
+    if not aggregates:
+        return 'avg', 'min', 'max'
+    names = tuple(dict.fromkeys(name.strip() for name in aggregates.split(',') if name.strip()))
+    unknown = [name for name in names if name not in AGGREGATES]
+    if unknown or not names:
+        raise ValueError(f'Unsupported aggregates: {", ".join(unknown)}. Supported aggregates: {", ".join(AGGREGATES)}')
+    return names
+
+
+def aggregate(times: [int], values: [float], bucket: int, aggregates: tuple) -> [dict]:
+    """
+    Aggregates series into time buckets aligned to the multiples of the bucket size.
+
+    :param times:       UTC times in milliseconds, in ascending order.
+    :param values:      Measured values.
+    :param bucket:      Bucket size in milliseconds.
+    :param aggregates:  Names of the aggregate functions, see: AGGREGATES.
+    :return:            List of dicts (time: start of the bucket and value of every aggregate), oldest first.
+                        Empty buckets are skipped.
+    """
+    if numpy is not None and len(times) > NUMPY_THRESHOLD:
+        return _aggregate_numpy(times, values, bucket, aggregates)
+    result = []
+    for start, points in itertools.groupby(zip(times, values), key=lambda point: point[0] // bucket * bucket):
+        bucket_values = [value for _, value in points]
+        total = sum(bucket_values)
+        functions = {
+            'avg': lambda: total / len(bucket_values),
+            'min': lambda: min(bucket_values),
+            'max': lambda: max(bucket_values),
+            'sum': lambda: total,
+            'count': lambda: len(bucket_values),
+            'first': lambda: bucket_values[0],
+            'last': lambda: bucket_values[-1]
+        }
+        row = {'time': start}
+        row.update((name, functions[name]()) for name in aggregates)
+        result.append(row)
+    return result
+
+
+def _aggregate_numpy(times: [int], values: [float], bucket: int, aggregates: tuple) -> [dict]:
+    times = numpy.asarray(times, dtype=numpy.int64)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    starts_of_points = times // bucket * bucket
+    starts, first_indices, counts = numpy.unique(starts_of_points, return_index=True, return_counts=True)
+    sums = numpy.add.reduceat(values, first_indices)
+    columns = {
+        'avg': lambda: sums / counts,
+        'min': lambda: numpy.minimum.reduceat(values, first_indices),
+        'max': lambda: numpy.maximum.reduceat(values, first_indices),
+        'sum': lambda: sums,
+        'count': lambda: counts,
+        'first': lambda: values[first_indices],
+        'last': lambda: values[first_indices + counts - 1]
+    }
+    columns = {name: columns[name]().tolist() for name in aggregates}
+    starts = starts.tolist()
+    return [dict(time=start, **{name: column[idx] for name, column in columns.items()})
+            for idx, start in enumerate(starts)]
+
+
+def lttb(times: [int], values: [float], points: int) -> [int]:
+    """
+    Downsamples series with the Largest-Triangle-Three-Buckets algorithm, which keeps its visual shape.
+
+    :param times:   UTC times in milliseconds, in ascending order.
+    :param values:  Measured values.
+    :param points:  Target number of points (at least 3).
+    :return:        Indices of the selected points, in ascending order.
+    """
+    count = len(times)
+    if points >= count or points < 3:
+        return list(range(count))
+
+    selected = [0]
+    every = (count - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        # average of the next bucket is the third vertex of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_length = next_end - next_start
+        avg_time = sum(times[next_start:next_end]) / next_length
+        avg_value = sum(values[next_start:next_end]) / next_length
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        max_area = -1.0
+        max_idx = start
+        for idx in range(start, end):
+            area = abs((times[a] - avg_time) * (values[idx] - values[a]) -
+                       (times[a] - times[idx]) * (avg_value - values[a]))
+            if area > max_area:
+                max_area = area
+                max_idx = idx
+        selected.append(max_idx)
+        a = max_idx
+    selected.append(count - 1)
+    return selected
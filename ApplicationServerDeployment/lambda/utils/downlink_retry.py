@@ -0,0 +1,124 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Retry policy of the IoT Wireless calls: per-error-code decision and exponential backoff with full jitter.
+"""
+
+import random
+import time
+from typing import Final
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+RETRY: Final = "RETRY"  # transient error, the call is retried (and queued for the sweeper, if retries are exhausted)
+FAIL: Final = "FAIL"  # permanent error, returned to the caller immediately
+
+ERROR_POLICIES: Final = {
+    'ThrottlingException': RETRY,
+    'InternalServerException': RETRY,
+    'ServiceUnavailableException': RETRY,
+    'ConflictException': RETRY,
+    'ResourceNotFoundException': FAIL,
+    'ValidationException': FAIL,
+    'AccessDeniedException': FAIL
+}
+DEFAULT_POLICY: Final = FAIL  # unknown error codes are not retried
+
+MAX_ATTEMPTS: Final = 3
+BACKOFF_BASE: Final = 0.1  # seconds
+BACKOFF_CAP: Final = 1.0  # seconds
+
+
+class RetriesExhaustedError(Exception):
+    """
+    Raised when the call failed with a transient error in every attempt.
+
+    Attributes
+    ----------
+        error: Exception
+            Error of the last attempt.
+        attempts: int
+            Number of the attempts made.
+    """
+
+    def __init__(self, error: Exception, attempts: int):
+        super().__init__(f'{get_error_code(error)} after {attempts} attempts: {error}')
+        self.error = error
+        self.attempts = attempts
+
+
+def get_error_code(error: Exception) -> str:
+    """
+    Returns error code of the failed call.
+
+    :param error:   ClientError, BotoCoreError or RetriesExhaustedError.
+    :return:        Error code of the ClientError, name of the class otherwise.
+    """
+    if isinstance(error, RetriesExhaustedError):
+        return get_error_code(error.error)
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code', 'Unknown')
+    return type(error).__name__
+
+
+def get_policy(error: Exception) -> str:
+    """
+    Decides whether the failed call should be retried.
+
+    :param error:   Error raised by the call.
+    :return:        RETRY or FAIL.
+    """
+    if isinstance(error, RetriesExhaustedError):
+        return RETRY
+    if isinstance(error, ClientError):
+        return ERROR_POLICIES.get(get_error_code(error), DEFAULT_POLICY)
+    if isinstance(error, BotoCoreError):
+        return RETRY  # connection errors and timeouts
+    return FAIL
+
+
+def get_backoff(attempt: int, base: float, cap: float, rng=random.random) -> float:
+    """
+    Returns delay before the next attempt: exponential backoff with full jitter.
+
+    :param attempt: Number of the failed attempts (1 for the first retry).
+    :param base:    Delay of the first retry, before jitter.
+    :param cap:     Max delay, before jitter.
+    :param rng:     Random number generator (0-1).
+    :return:        Delay, in the units of base and cap.
+    """
+    return rng() * min(cap, base * 2 ** (attempt - 1))
+
+
+def call_with_retries(call, max_attempts: int = MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE,
+                      backoff_cap: float = BACKOFF_CAP, deadline: float = None, sleep=None, rng=None):
+    """
+    Calls the function, retries it on transient errors.
+
+    :param call:            Function without arguments.
+    :param max_attempts:    Max number of the attempts.
+    :param backoff_base:    Delay of the first retry in seconds, before jitter.
+    :param backoff_cap:     Max delay in seconds, before jitter.
+    :param deadline:        Monotonic time (time.monotonic), after which no more attempts are made.
+    :param sleep:           Sleep function, in seconds (time.sleep, if not given).
+    :param rng:             Random number generator (0-1, random.random, if not given).
+    :return:                Result of the call.
+    :raises RetriesExhaustedError:  If every attempt failed with a transient error.
+    :raises Exception:              Error of the call, if it is not transient (policy FAIL).
+    """
+    sleep = sleep or time.sleep
+    rng = rng or random.random
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return call()
+        except (ClientError, BotoCoreError) as error:
+            if get_policy(error) != RETRY:
+                raise
+            delay = get_backoff(attempt, backoff_base, backoff_cap, rng)
+            if attempt >= max_attempts or (deadline is not None and time.monotonic() + delay > deadline):
+                raise RetriesExhaustedError(error, attempt) from error
+            print(f'Retrying after {get_error_code(error)} (attempt {attempt}) in {delay:.3f} s')
+            sleep(delay)
@@ -0,0 +1,593 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Utility functions for encoding and sending downlink commands to the wireless devices.
+Shared by SidewalkDownlinkLambda and SidewalkUplinkLambda, which acknowledges uplinks in-process.
+"""
+
+import base64
+import json
+import os
+import time
+import traceback
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+
+import boto3
+from botocore.config import Config
+
+import command_templates
+import time_utils
+from device_cache import DeviceCache
+from downlink_coalescer import LedRequestCoalescer
+from downlink_delivery_handler import DownlinkDeliveryHandler
+from downlink_retry import RETRY, RetriesExhaustedError, call_with_retries, get_error_code, get_policy
+from downlink_retry_queue import DownlinkRetryQueue
+from downlink_sequence_allocator import DownlinkSequenceAllocator
+from link_type import LinkType
+from protocol import TagType
+from rate_limiter import KeyedTokenBuckets, TokenBucket, acquire_all
+from sidewalk_devices_handler import SidewalkDevicesHandler
+
+DEMO_APP_CAP_DISCOVERY_RESP: Final = "DEMO_APP_CAP_DISCOVERY_RESP"
+DEMO_APP_ACTION_RESP: Final = "DEMO_APP_ACTION_RESP"
+DEMO_APP_ACTION_REQ: Final = "DEMO_APP_ACTION_REQ"
+ACK_COMMANDS: Final = (DEMO_APP_CAP_DISCOVERY_RESP, DEMO_APP_ACTION_RESP)
+
+DOWNLINK_LAMBDA_NAME: Final = "SidewalkDownlinkLambda"
+DOWNLINK_MODE_ENV: Final = "DOWNLINK_MODE"
+DOWNLINK_MODE_DIRECT: Final = "DIRECT"  # send data to the wireless device from the calling Lambda
+DOWNLINK_MODE_EVENT: Final = "EVENT"  # invoke SidewalkDownlinkLambda asynchronously (InvocationType='Event')
+
+DOWNLINK_MAX_TPS_ENV: Final = "DOWNLINK_MAX_TPS"
+DEFAULT_DOWNLINK_MAX_TPS: Final = 10  # SendDataToWirelessDevice calls per second, per Lambda container
+FANOUT_WORKERS: Final = 8
+ERROR_THROTTLED: Final = "Throttled"
+ERROR_QUEUED: Final = "Queued"
+ERROR_EXPIRED: Final = "Expired"
+ACK_EXPIRY: Final = 3 * 60 * 1000  # milliseconds, queued acknowledgements are not re-sent later than that
+DEADLINE_MARGIN: Final = 1.0  # seconds left for queueing the failed downlink and building the response
+CONNECT_TIMEOUT: Final = 1  # seconds, of a single SendDataToWirelessDevice attempt
+READ_TIMEOUT: Final = 1  # seconds, of a single SendDataToWirelessDevice attempt
+MAX_SEND_SLOT_WAIT: Final = 2.0  # seconds, a single downlink waits for the rate limits (then it is throttled)
+
+# Sidewalk links differ in bandwidth by orders of magnitude, so the downlinks are throttled per link type
+# (all devices of the link type) and per device (rate depends on its link type). Rates are in messages per second.
+# The token buckets live in the memory of a Lambda container, so the limits apply per container: concurrent
+# containers each get the full rate. They smooth the bursts of a single container (e.g. fan-out), they are not
+# a global limit of the account.
+LINK_TYPE_MAX_TPS: Final = {LinkType.BLE: 10.0, LinkType.FSK: 5.0, LinkType.LORA: 2.0, LinkType.UNKNOWN: 2.0}
+DEVICE_MAX_TPS: Final = {LinkType.BLE: 1.0, LinkType.FSK: 0.5, LinkType.LORA: 0.2, LinkType.UNKNOWN: 0.2}
+DEVICE_BURST: Final = 2
+
+DOWNLINK_COALESCE_WINDOW_ENV: Final = "DOWNLINK_COALESCE_WINDOW_MS"
+DEFAULT_DOWNLINK_COALESCE_WINDOW_MS: Final = 0  # coalescing of the LED requests is opt-in, 0 disables it
+
+_wireless_client = None
+_lambda_client = None
+_sequence_allocator = None
+_rate_limiter = None
+_link_type_limiters = KeyedTokenBuckets(lambda link_type: LINK_TYPE_MAX_TPS[link_type])
+_device_limiters = KeyedTokenBuckets(lambda key: DEVICE_MAX_TPS[key[1]], capacity=DEVICE_BURST)
+_devices_handler = None
+_coalescer = None
+_delivery_handler = None
+_retry_queue = None
+
+
+class DownlinkQueuedError(Exception):
+    """
+    Raised when the downlink failed with a transient error in every in-call attempt and was queued to be re-sent
+    by the sweeper, see: sweep_retry_queue.
+
+    Attributes
+    ----------
+        error_code: str
+            Error code of the last attempt.
+    """
+
+    def __init__(self, wireless_device_id: str, command: str, error_code: str):
+        super().__init__(f'{command} to {wireless_device_id} queued for retry after {error_code}')
+        self.error_code = error_code
+
+
+def get_wireless_client():
+    """
+    Returns iotwireless client, created once per Lambda container.
+    Retries of botocore are disabled, the calls are retried by send_payload_to_device (see: downlink_retry).
+    Timeouts are short, so that a hung attempt leaves time for the retries (or queueing) before the Lambda times out.
+
+    :return:    IoTWireless client.
+    """
+    global _wireless_client
+    if _wireless_client is None:
+        _wireless_client = boto3.client('iotwireless', config=Config(connect_timeout=CONNECT_TIMEOUT,
+                                                                     read_timeout=READ_TIMEOUT,
+                                                                     retries={'mode': 'standard',
+                                                                              'total_max_attempts': 1}))
+    return _wireless_client
+
+
+def get_deadline(context) -> float:
+    """
+    Returns time, after which no more downlinks are sent (or retried), so that the Lambda finishes before it times out.
+
+    :param context: Lambda context.
+    :return:        Monotonic time (time.monotonic), None if there is no context.
+    """
+    if context is None:
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN
+
+
+def get_lambda_client():
+    """
+    Returns lambda client, created once per Lambda container.
+
+    :return:    Lambda client.
+    """
+    global _lambda_client
+    if _lambda_client is None:
+        _lambda_client = boto3.client('lambda')
+    return _lambda_client
+
+
+def get_sequence_allocator() -> DownlinkSequenceAllocator:
+    """
+    Returns allocator of the downlink sequence numbers, created once per Lambda container.
+
+    :return:    DownlinkSequenceAllocator object.
+    """
+    global _sequence_allocator
+    if _sequence_allocator is None:
+        _sequence_allocator = DownlinkSequenceAllocator()
+    return _sequence_allocator
+
+
+def get_rate_limiter() -> TokenBucket:
+    """
+    Returns limiter of the SendDataToWirelessDevice calls of the fan-out downlinks, created once per Lambda container.
+    Rate is taken from the DOWNLINK_MAX_TPS environment variable.
+
+    :return:    TokenBucket object.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket(float(os.environ.get(DOWNLINK_MAX_TPS_ENV) or DEFAULT_DOWNLINK_MAX_TPS))
+    return _rate_limiter
+
+
+def get_devices_handler() -> SidewalkDevicesHandler:
+    """
+    Returns handler of the SidewalkDevices table with a device cache, created once per Lambda container.
+
+    :return:    SidewalkDevicesHandler object.
+    """
+    global _devices_handler
+    if _devices_handler is None:
+        _devices_handler = SidewalkDevicesHandler(cache=DeviceCache())
+    return _devices_handler
+
+
+def get_delivery_handler() -> DownlinkDeliveryHandler:
+    """
+    Returns handler of the downlink delivery tracking tables, created once per Lambda container.
+
+    :return:    DownlinkDeliveryHandler object.
+    """
+    global _delivery_handler
+    if _delivery_handler is None:
+        _delivery_handler = DownlinkDeliveryHandler()
+    return _delivery_handler
+
+
+def get_retry_queue() -> DownlinkRetryQueue:
+    """
+    Returns queue of the downlinks to be re-sent, created once per Lambda container.
+
+    :return:    DownlinkRetryQueue object.
+    """
+    global _retry_queue
+    if _retry_queue is None:
+        _retry_queue = DownlinkRetryQueue()
+    return _retry_queue
+
+
+def get_coalescer() -> LedRequestCoalescer:
+    """
+    Returns coalescer of the LED requests, created once per Lambda container.
+    Window is taken from the DOWNLINK_COALESCE_WINDOW_MS environment variable.
+
+    :return:    LedRequestCoalescer object (None if coalescing is disabled).
+    """
+    global _coalescer
+    if _coalescer is None:
+        window = int(os.environ.get(DOWNLINK_COALESCE_WINDOW_ENV) or DEFAULT_DOWNLINK_COALESCE_WINDOW_MS)
+        if window <= 0:
+            return None
+        _coalescer = LedRequestCoalescer(window / 1000)
+    return _coalescer
+
+
+def get_link_type(wireless_device_id: str) -> LinkType:
+    """
+    Returns link type of the wireless device, as recorded from its last uplink.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :return:                    LinkType enum (LinkType.UNKNOWN if the device is not known).
+    """
+    device = get_devices_handler().get_device(wireless_device_id)
+    return device.get_link_type() if device is not None else LinkType.UNKNOWN
+
+
+def acquire_send_slot(wireless_device_id: str, deadline: float = None, max_wait: float = None,
+                      link_type: LinkType = None) -> bool:
+    """
+    Waits until the downlink to the wireless device is allowed by the rate limits of the device, its link type
+    and the Lambda container (all of them are per container, see: LINK_TYPE_MAX_TPS).
+    Denied downlink takes no token from any of the limits.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param deadline:            Monotonic time (time.monotonic), after which the downlink would not be sent
+                                (no limit, if None).
+    :param max_wait:            Max wait in seconds, regardless of the deadline (no limit, if None).
+    :param link_type:           LinkType of the device (looked up, if not given).
+    :return:                    True if the downlink can be sent, False if it would not be allowed in time.
+    """
+    if link_type is None:
+        link_type = get_link_type(wireless_device_id)
+    timeout = None if deadline is None else deadline - time.monotonic()
+    if max_wait is not None:
+        timeout = max_wait if timeout is None else min(timeout, max_wait)
+    return acquire_all([_device_limiters.get((wireless_device_id, link_type)), _link_type_limiters.get(link_type),
+                        get_rate_limiter()], timeout)
+
+
+def coalesce_led_action_req(wireless_device_id: str, tag_type: TagType, led_id: [int]) -> ([int], [int]):
+    """
+    Merges DEMO_APP_ACTION_REQ request with the other LED requests to the device, see: LedRequestCoalescer.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param tag_type:            TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:              List of indices of the LEDs.
+    :return:                    Tuple of lists of the LEDs to be turned on and off, or None if the request was merged
+                                into a request, which sends the net state.
+    """
+    coalescer = get_coalescer()
+    if coalescer is None or not led_id:
+        return _requested_led_state(tag_type, led_id)
+    return coalescer.submit(wireless_device_id, tag_type, led_id)
+
+
+def _requested_led_state(tag_type: TagType, led_id: [int]) -> ([int], [int]):
+    """
+    Returns LEDs turned on and off by the LED_ON or LED_OFF request.
+    """
+    return (list(led_id), []) if tag_type == TagType.LED_ON else ([], list(led_id))
+
+
+def allocate_seq(wireless_device_id: str) -> int:
+    """
+    Allocates sequence number of the next downlink message sent to the wireless device.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :return:                    Sequence number, see: DownlinkSequenceAllocator.
+    """
+    return get_sequence_allocator().allocate(wireless_device_id)
+
+
+def send_payload_to_device(wireless_device_id: str, payload: bytes, seq_n: int = None, led_state: tuple = None,
+                           command: str = None, deadline: float = None, link_type: LinkType = None):
+    """
+    Encodes command bytes into base64 and sends it to the wireless device.
+    Transient errors (e.g. throttling) are retried with backoff. If every attempt fails, the downlink is queued
+    and re-sent later by the sweeper (see: sweep_retry_queue).
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param payload:             Encoded command.
+    :param seq_n:               Sequence number of the downlink message (allocated for the device if not given).
+    :param led_state:           Tuple of the LEDs turned on and off by DEMO_APP_ACTION_REQ. If given, the downlink
+                                is recorded for delivery tracking, see: DownlinkDeliveryHandler.
+    :param command:             Demo app command. If given, the downlink is queued when the retries are exhausted
+                                (otherwise the error of the last attempt is raised). Acknowledgements (ACK_COMMANDS)
+                                are queued with ACK_EXPIRY.
+    :param deadline:            Monotonic time (time.monotonic), after which the call is not retried
+                                (see: get_deadline).
+    :param link_type:           LinkType of the device, recorded with the delivery (looked up, if not given).
+    :return:                    IoTWireless client response.
+    :raises DownlinkQueuedError:    If the downlink was queued for retry.
+    """
+    if seq_n is None:
+        seq_n = allocate_seq(wireless_device_id)
+    wireless_metadata = {"Sidewalk": {"Seq": seq_n}}
+    payload_data = base64.b64encode(payload).decode()
+
+    try:
+        response = call_with_retries(lambda: get_wireless_client().send_data_to_wireless_device(
+            Id=wireless_device_id, TransmitMode=0, PayloadData=payload_data, WirelessMetadata=wireless_metadata),
+            deadline=deadline)
+    except RetriesExhaustedError as error:
+        if command is None:
+            raise error.error
+        get_retry_queue().enqueue(wireless_device_id, command, payload, get_error_code(error), led_state,
+                                  ACK_EXPIRY if command in ACK_COMMANDS else None)
+        raise DownlinkQueuedError(wireless_device_id, command, get_error_code(error)) from error
+
+    if led_state is not None:
+        try:
+            get_delivery_handler().record_sent(wireless_device_id, seq_n, led_state[0], led_state[1],
+                                               link_type or get_link_type(wireless_device_id))
+        except Exception:
+            # downlink was sent already, missing delivery record only leaves its response unmatched
+            # (and lets the sweeper re-send the queued state of its LEDs)
+            print(f'Delivery of downlink {seq_n} to {wireless_device_id} not recorded: {traceback.format_exc()}')
+    return response
+
+
+def send_cap_discovery_resp(wireless_device_id: str, seq_n: int = None, deadline: float = None):
+    """
+    Sends DEMO_APP_CAP_DISCOVERY_RESP command to the wireless device.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param seq_n:               Sequence number of the downlink message.
+    :param deadline:            Monotonic time, after which the call is not retried, see: send_payload_to_device.
+    :return:                    IoTWireless client response.
+    """
+    return send_payload_to_device(wireless_device_id, command_templates.encode_cap_discovery_resp(), seq_n,
+                                  command=DEMO_APP_CAP_DISCOVERY_RESP, deadline=deadline)
+
+
+def send_button_pressed_resp(wireless_device_id: str, button_press: [int], seq_n: int = None,
+                             deadline: float = None):
+    """
+    Sends DEMO_APP_ACTION_RESP command, which acknowledges pressed buttons, to the wireless device.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param button_press:        List of indices of the pressed buttons.
+    :param seq_n:               Sequence number of the downlink message.
+    :param deadline:            Monotonic time, after which the call is not retried, see: send_payload_to_device.
+    :return:                    IoTWireless client response.
+    """
+    return send_payload_to_device(wireless_device_id, command_templates.encode_button_pressed_resp(button_press),
+                                  seq_n, command=DEMO_APP_ACTION_RESP, deadline=deadline)
+
+
+def send_led_action_req(wireless_device_id: str, tag_type: TagType, led_id: [int], seq_n: int = None,
+                        deadline: float = None):
+    """
+    Sends DEMO_APP_ACTION_REQ command, which turns LEDs on or off, to the wireless device.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param tag_type:            TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:              List of indices of the LEDs.
+    :param seq_n:               Sequence number of the downlink message.
+    :param deadline:            Monotonic time, after which the call is not retried, see: send_payload_to_device.
+    :return:                    IoTWireless client response.
+    """
+    payload = command_templates.encode_led_action_req(tag_type, led_id, int(time_utils.get_gps_time()))
+    return send_payload_to_device(wireless_device_id, payload, seq_n, _requested_led_state(tag_type, led_id),
+                                  DEMO_APP_ACTION_REQ, deadline)
+
+
+def send_payload_to_devices(wireless_device_ids: [str], payload: bytes, deadline: float = None,
+                            led_state: tuple = None, command: str = None) -> (dict, dict):
+    """
+    Sends the same encoded command to many wireless devices, concurrently and throttled by the rate limits,
+    see: acquire_send_slot.
+    Every device gets its own sequence number.
+    Devices, which downlinks were queued for retry, fail with ERROR_QUEUED.
+
+    :param wireless_device_ids: Ids of the wireless devices.
+    :param payload:             Encoded command.
+    :param deadline:            Monotonic time (time.monotonic), after which no more messages are sent.
+                                Devices, which were not reached before the deadline, fail with ERROR_THROTTLED.
+    :param led_state:           Tuple of the LEDs turned on and off, see: send_payload_to_device.
+    :param command:             Demo app command, see: send_payload_to_device.
+    :return:                    Tuple of dicts keyed by the device id: IoTWireless message ids of the sent messages
+                                and errors ({"code": str, "message": str}) of the failed ones.
+    """
+    def send(wireless_device_id: str):
+        link_type = get_link_type(wireless_device_id)
+        if not acquire_send_slot(wireless_device_id, deadline, link_type=link_type):
+            return None, {"code": ERROR_THROTTLED, "message": "Rate limit would be exceeded before the deadline"}
+        try:
+            response = send_payload_to_device(wireless_device_id, payload, led_state=led_state, command=command,
+                                              deadline=deadline, link_type=link_type)
+            return response.get("MessageId"), None
+        except DownlinkQueuedError as error:
+            return None, {"code": ERROR_QUEUED, "message": str(error)}
+        except ClientError as error:
+            error = error.response['Error']
+            return None, {"code": error.get('Code'), "message": error.get('Message', '')}
+
+    unique_ids = list(dict.fromkeys(wireless_device_ids))
+    message_ids, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(unique_ids) or 1)) as executor:
+        for wireless_device_id, (message_id, error) in zip(unique_ids, executor.map(send, unique_ids)):
+            if error is None:
+                message_ids[wireless_device_id] = message_id
+            else:
+                errors[wireless_device_id] = error
+    return message_ids, errors
+
+
+def send_led_state_req(wireless_device_id: str, led_on: [int], led_off: [int], seq_n: int = None,
+                       deadline: float = None, link_type: LinkType = None):
+    """
+    Sends DEMO_APP_ACTION_REQ command, which sets the net state of the LEDs, to the wireless device.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param led_on:              List of indices of the LEDs to be turned on.
+    :param led_off:             List of indices of the LEDs to be turned off.
+    :param seq_n:               Sequence number of the downlink message.
+    :param deadline:            Monotonic time, after which the call is not retried, see: send_payload_to_device.
+    :param link_type:           LinkType of the device, see: send_payload_to_device.
+    :return:                    IoTWireless client response.
+    """
+    payload = command_templates.encode_led_state_req(led_on, led_off, int(time_utils.get_gps_time()))
+    return send_payload_to_device(wireless_device_id, payload, seq_n, (led_on, led_off), DEMO_APP_ACTION_REQ,
+                                  deadline, link_type)
+
+
+def queue_led_state_req(wireless_device_id: str, led_on: [int], led_off: [int], error_code: str):
+    """
+    Queues DEMO_APP_ACTION_REQ command, which sets the net state of the LEDs, to be sent by the sweeper
+    (see: sweep_retry_queue) instead of sending it now.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param led_on:              List of indices of the LEDs to be turned on.
+    :param led_off:             List of indices of the LEDs to be turned off.
+    :param error_code:          Reason, why the command was not sent (e.g. ERROR_THROTTLED).
+    """
+    payload = command_templates.encode_led_state_req(led_on, led_off, int(time_utils.get_gps_time()))
+    get_retry_queue().enqueue(wireless_device_id, DEMO_APP_ACTION_REQ, payload, error_code, (led_on, led_off))
+
+
+def send_led_action_req_to_devices(wireless_device_ids: [str], tag_type: TagType, led_id: [int],
+                                   deadline: float = None) -> (dict, dict):
+    """
+    Sends DEMO_APP_ACTION_REQ command, which turns LEDs on or off, to many wireless devices.
+    Command is encoded once for all the devices.
+
+    :param wireless_device_ids: Ids of the wireless devices.
+    :param tag_type:            TagType.LED_ON or TagType.LED_OFF.
+    :param led_id:              List of indices of the LEDs.
+    :param deadline:            Monotonic time, after which no more messages are sent, see: send_payload_to_devices.
+    :return:                    Tuple of dicts of message ids and errors, see: send_payload_to_devices.
+    """
+    payload = command_templates.encode_led_action_req(tag_type, led_id, int(time_utils.get_gps_time()))
+    return send_payload_to_devices(wireless_device_ids, payload, deadline, _requested_led_state(tag_type, led_id),
+                                   DEMO_APP_ACTION_REQ)
+
+
+def invoke_downlink_lambda(command: str, wireless_device_id: str, button_press: [int] = None):
+    """
+    Invokes SidewalkDownlinkLambda asynchronously (the call returns as soon as the event is queued).
+
+    :param command:             Command to be sent.
+    :param wireless_device_id:  Id of the wireless device.
+    :param button_press:        List of indices of the pressed buttons.
+    :return:                    HTTP status code of the invocation (202 if the event is queued).
+    """
+    body = {"command": command, "deviceId": wireless_device_id}
+    if button_press is not None:
+        body["button_press"] = button_press
+    response = get_lambda_client().invoke(FunctionName=DOWNLINK_LAMBDA_NAME,
+                                          InvocationType='Event',
+                                          Payload=json.dumps({"body": body, "httpMethod": "POST"}).encode('utf-8'))
+    return response['StatusCode']
+
+
+def send_response_to_device(command: str, wireless_device_id: str, button_press: [int] = None, mode: str = None,
+                            deadline: float = None):
+    """
+    Sends response to the uplink (DEMO_APP_CAP_DISCOVERY_RESP or DEMO_APP_ACTION_RESP) to the wireless device.
+
+    :param command:             Command to be sent.
+    :param wireless_device_id:  Id of the wireless device.
+    :param button_press:        List of indices of the pressed buttons (DEMO_APP_ACTION_RESP only).
+    :param mode:                DOWNLINK_MODE_DIRECT or DOWNLINK_MODE_EVENT. Taken from the DOWNLINK_MODE
+                                environment variable, if not given.
+    :param deadline:            Monotonic time, after which the call is not retried, see: send_payload_to_device.
+    :return:                    Dict with command and IoTWireless response (or status code of the invocation).
+    """
+    mode = (mode or os.environ.get(DOWNLINK_MODE_ENV) or DOWNLINK_MODE_DIRECT).upper()
+    try:
+        if mode == DOWNLINK_MODE_EVENT:
+            response = invoke_downlink_lambda(command, wireless_device_id, button_press)
+        elif command == DEMO_APP_CAP_DISCOVERY_RESP:
+            response = send_cap_discovery_resp(wireless_device_id, deadline=deadline)
+        elif command == DEMO_APP_ACTION_RESP:
+            response = send_button_pressed_resp(wireless_device_id, button_press, deadline=deadline)
+        else:
+            raise ValueError(f'Command {command} is not supported')
+    except DownlinkQueuedError as error:
+        print(error)
+        response = {"queued": True}
+    return {"command": command, "response": response}
+
+
+def sweep_retry_queue(deadline: float = None) -> dict:
+    """
+    Re-sends the queued downlinks, which are due (see: DownlinkRetryQueue), each with a new sequence number.
+    Sent downlinks are removed from the queue, downlinks failed with a transient error are rescheduled
+    and downlinks failed with a permanent error are moved to the dead letters, as well as the expired ones.
+    LED state superseded by the downlinks sent after it was queued is removed without sending.
+    Unexpected errors (e.g. of the queue table) are logged and the item is left for the next sweep.
+
+    :param deadline:    Monotonic time (time.monotonic), after which no more downlinks are sent
+                        (the rest is left for the next sweep).
+    :return:            Dict with the number of the sent, rescheduled, dead, expired, superseded, skipped
+                        and failed downlinks.
+    """
+    queue = get_retry_queue()
+    stats = {"sent": 0, "rescheduled": 0, "dead": 0, "expired": 0, "superseded": 0, "skipped": 0, "errors": 0}
+    for item in queue.get_due():
+        try:
+            stats[_sweep_item(queue, item, deadline)] += 1
+        except Exception:
+            print(f'Unable to sweep queued {item.get("command")} to {item.get("wireless_device_id")}: '
+                  f'{traceback.format_exc()}')
+            stats["errors"] += 1
+    print(f'Retry queue swept: {json.dumps(stats)}')
+    return stats
+
+
+def _sweep_item(queue: DownlinkRetryQueue, item: dict, deadline: float = None) -> str:
+    """
+    Re-sends single queued downlink, see: sweep_retry_queue.
+    LED state is re-encoded with the current GPS time, other commands are re-sent as queued.
+
+    :return:    Key of the sweep statistics: sent, rescheduled, dead, expired, superseded or skipped.
+    """
+    wireless_device_id, command = item['wireless_device_id'], item['command']
+    if queue.is_expired(item):
+        queue.mark_dead(item, ERROR_EXPIRED)
+        return "expired"
+    payload, led_state = bytes(item['payload']), None
+    queued_leds = _get_unsent_leds(wireless_device_id, queue.get_led_state(item))
+    if queued_leds is not None:
+        if not queued_leds:
+            queue.delete_sent(item)
+            return "superseded"
+        led_state = (sorted(led for led, on in queued_leds.items() if on),
+                     sorted(led for led, on in queued_leds.items() if not on))
+        payload = command_templates.encode_led_state_req(*led_state, int(time_utils.get_gps_time()))
+    link_type = get_link_type(wireless_device_id)
+    if not acquire_send_slot(wireless_device_id, deadline, MAX_SEND_SLOT_WAIT, link_type):
+        return "skipped"
+    try:
+        # no command, so that the failed downlink is not queued again (it is rescheduled instead)
+        send_payload_to_device(wireless_device_id, payload, led_state=led_state, deadline=deadline,
+                               link_type=link_type)
+    except (ClientError, BotoCoreError) as error:
+        print(f'Queued {command} to {wireless_device_id} failed: {error}')
+        if get_policy(error) == RETRY:
+            queue.reschedule(item, get_error_code(error))
+            return "rescheduled"
+        queue.mark_dead(item, get_error_code(error))
+        return "dead"
+    queue.delete_sent(item)
+    return "sent"
+
+
+def _get_unsent_leds(wireless_device_id: str, led_state: {int: (bool, int)}) -> {int: bool}:
+    """
+    Drops the queued LED state superseded by the downlinks sent after it was queued (see: DownlinkDeliveryHandler),
+    so that the sweeper does not revert a newer state of the LED.
+
+    :param wireless_device_id:  Id of the wireless device.
+    :param led_state:           Queued LED state, see: DownlinkRetryQueue.get_led_state.
+    :return:                    Dict of the LED states (True if on) to be sent keyed by the LED index,
+                                None if no LED state was queued.
+    """
+    if not led_state:
+        return None
+    sent_at = {}
+    for delivery in get_delivery_handler().get_sent_since(wireless_device_id,
+                                                          min(queued_at for _, queued_at in led_state.values())):
+        for led in list(delivery.get('led_on', [])) + list(delivery.get('led_off', [])):
+            sent_at[int(led)] = max(sent_at.get(int(led), 0), int(delivery['sent_at']))
+    return {led: on for led, (on, queued_at) in led_state.items() if sent_at.get(led, 0) < queued_at}
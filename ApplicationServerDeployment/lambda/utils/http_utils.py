@@ -0,0 +1,134 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Utility functions for compressed and conditional (ETag) JSON responses of the API Gateway proxy integration.
+Compressed bodies are returned base64 encoded. API Gateway decodes them only for the requests, which Accept
+COMPRESSED_MEDIA_TYPE (the binary media type of the RestApi), so the other clients get uncompressed bodies.
+"""
+
+import base64
+import gzip
+import hashlib
+from typing import Final
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is used instead
+    brotli = None
+
+MIN_COMPRESSED_SIZE: Final = 1024  # bytes, smaller bodies are sent uncompressed
+COMPRESSED_MEDIA_TYPE: Final = "application/vnd.sidewalk+json"  # JSON, which may be sent with Content-Encoding
+
+
+def get_header(headers: dict, name: str) -> str:
+    """
+    Returns value of the request header (header names are case-insensitive).
+
+    :param headers: Request headers (may be None).
+    :param name:    Header name.
+    :return:        Header value (None if not present).
+    """
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def compute_etag(body: bytes) -> str:
+    """
+    Computes strong ETag of the response body.
+
+    :param body:    Serialized response body.
+    :return:        Quoted ETag.
+    """
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks If-None-Match request header against the ETag of the response (weak comparison).
+
+    :param if_none_match:   Value of the If-None-Match header (None if not present).
+    :param etag:            Quoted ETag.
+    :return:                True if the client already has the current representation.
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+def accepts_compressed(accept: str) -> bool:
+    """
+    Checks whether the client asked for COMPRESSED_MEDIA_TYPE. API Gateway compares only the first type
+    of the Accept header with the binary media types, so it has to be the first one.
+
+    :param accept:  Value of the Accept header (None if not present).
+    :return:        True if the compressed (binary) body would be decoded by API Gateway.
+    """
+    first = (accept or '').split(',')[0].partition(';')[0].strip().lower()
+    return first == COMPRESSED_MEDIA_TYPE
+
+
+def select_encoding(accept_encoding: str) -> str:
+    """
+    Selects content coding supported by the client: br (if brotli is available), gzip or none.
+
+    :param accept_encoding: Value of the Accept-Encoding header (None if not present).
+    :return:                'br', 'gzip' or None.
+    """
+    accepted = {}
+    for coding in (accept_encoding or '').split(','):
+        name, _, parameters = coding.strip().partition(';')
+        quality = 1.0
+        parameter, _, value = parameters.strip().partition('=')
+        if parameter.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    supported = (['br'] if brotli is not None else []) + ['gzip']
+    candidates = [coding for coding in supported if accepted.get(coding, accepted.get('*', 0.0)) > 0.0]
+    return candidates[0] if candidates else None
+
+
+def encode_response(response: dict, request_headers: dict = None) -> dict:
+    """
+    Adds ETag to the API Gateway proxy response and compresses its body.
+
+    Successful responses carry an ETag. If it matches the If-None-Match request header, 304 without body
+    is returned. Bodies of at least MIN_COMPRESSED_SIZE bytes are compressed, if the request Accepts
+    COMPRESSED_MEDIA_TYPE and Accept-Encoding allows it.
+
+    :param response:        API Gateway proxy response with JSON (string) body.
+    :param request_headers: Request headers (event["headers"]).
+    :return:                API Gateway proxy response.
+    """
+    data = response.get('body', '').encode('utf-8')
+    headers = dict(response.get('headers') or {})
+    headers['Content-Type'] = 'application/json'
+    headers['Vary'] = 'Accept, Accept-Encoding'
+    response = dict(response, headers=headers)
+
+    if response['statusCode'] == 200:
+        etag = compute_etag(data)
+        headers['ETag'] = etag
+        headers['Cache-Control'] = 'private, no-cache'  # always revalidate with If-None-Match
+        if etag_matches(get_header(request_headers, 'If-None-Match'), etag):
+            return dict(response, statusCode=304, body='')
+
+    if not accepts_compressed(get_header(request_headers, 'Accept')):
+        return response
+    encoding = select_encoding(get_header(request_headers, 'Accept-Encoding'))
+    if encoding is None or len(data) < MIN_COMPRESSED_SIZE:
+        return response
+
+    compressed = brotli.compress(data) if encoding == 'br' else gzip.compress(data, compresslevel=6, mtime=0)
+    headers['Content-Encoding'] = encoding
+    return dict(response, body=base64.b64encode(compressed).decode('ascii'), isBase64Encoded=True)
@@ -0,0 +1,128 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Latency histogram with logarithmic buckets of fixed relative precision (in the style of HdrHistogram).
+Memory does not depend on the number of recorded values, so histograms can be kept per device and merged.
+"""
+
+from typing import Final
+
+SUB_BUCKET_BITS: Final = 7  # 128 sub-buckets, values are kept with relative error below 1/64
+MAX_VALUE_BITS: Final = 32  # values up to 2^32 - 1 (e.g. milliseconds, about 49 days)
+
+_SUB_BUCKET_COUNT: Final = 1 << SUB_BUCKET_BITS
+_SUB_BUCKET_HALF: Final = _SUB_BUCKET_COUNT >> 1
+BUCKET_COUNT: Final = _SUB_BUCKET_COUNT + (MAX_VALUE_BITS - SUB_BUCKET_BITS) * _SUB_BUCKET_HALF
+
+
+def bucket_index(value: int) -> int:
+    """
+    Returns index of the bucket, which holds the value.
+
+    Values below 2^SUB_BUCKET_BITS have their own buckets. Every higher power of two range is split into
+    2^(SUB_BUCKET_BITS-1) buckets of equal width.
+
+    :param value:   Non-negative integer value (capped at 2^MAX_VALUE_BITS - 1).
+    :return:        Bucket index (0 - BUCKET_COUNT-1).
+    """
+    value = min(max(int(value), 0), (1 << MAX_VALUE_BITS) - 1)
+    if value < _SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return _SUB_BUCKET_COUNT + (shift - 1) * _SUB_BUCKET_HALF + (value >> shift) - _SUB_BUCKET_HALF
+
+
+def bucket_range(index: int) -> (int, int):
+    """
+    Returns range of the values held by the bucket.
+
+    :param index:   Bucket index.
+    :return:        Tuple of the lowest and the highest value of the bucket (both inclusive).
+    """
+    if index < _SUB_BUCKET_COUNT:
+        return index, index
+    shift, offset = divmod(index - _SUB_BUCKET_COUNT, _SUB_BUCKET_HALF)
+    shift += 1
+    lowest = (_SUB_BUCKET_HALF + offset) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Histogram of the latencies. Only non-empty buckets are stored.
+
+    Attributes
+    ----------
+        counts: {int: int}
+            Number of the recorded values by the bucket index.
+        total_count: int
+            Number of the recorded values.
+        total_sum: int
+            Sum of the recorded values.
+    """
+
+    __slots__ = ('counts', 'total_count', 'total_sum')
+
+    def __init__(self, counts: dict = None, total_sum: int = 0):
+        self.counts = {int(index): int(count) for index, count in (counts or {}).items() if int(count) > 0}
+        self.total_count = sum(self.counts.values())
+        self.total_sum = int(total_sum)
+
+    def record(self, value: int, count: int = 1):
+        """
+        Records the value.
+
+        :param value:   Non-negative integer value, e.g. latency in milliseconds.
+        :param count:   Number of occurrences of the value.
+        """
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.total_sum += int(value) * count
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Adds values recorded by the other histogram.
+
+        :param other:   LatencyHistogram object.
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+
+    def percentile(self, percentile: float) -> int:
+        """
+        Returns the value, which is not exceeded by the given percentage of the recorded values.
+        The result is the highest value of its bucket, so it is never lower than the exact percentile.
+
+        :param percentile:  Percentile (0-100).
+        :return:            Value (None if no values were recorded).
+        """
+        if self.total_count == 0:
+            return None
+        rank = max(1, -(-self.total_count * percentile // 100))  # ceil, at least the lowest value
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return bucket_range(index)[1]
+        return bucket_range(max(self.counts))[1]
+
+    def summary(self, percentiles: tuple = (50, 95, 99)) -> dict:
+        """
+        Returns statistics of the recorded values.
+
+        :param percentiles: Percentiles to be included.
+        :return:            Dict with count, mean, min, max and p<percentile> values.
+        """
+        result = {'count': self.total_count}
+        if self.total_count == 0:
+            return result
+        result['mean'] = self.total_sum / self.total_count
+        result['min'] = bucket_range(min(self.counts))[0]
+        result['max'] = bucket_range(max(self.counts))[1]
+        for percentile in percentiles:
+            result[f'p{percentile:g}'] = self.percentile(percentile)
+        return result
@@ -0,0 +1,62 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Utility functions for cursor-based pagination of the API responses.
+"""
+
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+
+def encode_cursor(last_evaluated_key: dict) -> str:
+    """
+    Encodes DynamoDB LastEvaluatedKey into an opaque, URL-safe cursor.
+
+    :param last_evaluated_key:  LastEvaluatedKey of the scan or query (None if there are no more items).
+    :return:                    Cursor (None if there are no more items).
+    """
+    if not last_evaluated_key:
+        return None
+    data = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True,
+                      default=lambda value: int(value) if isinstance(value, Decimal) else str(value))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decodes cursor created by encode_cursor into ExclusiveStartKey.
+
+    :param cursor:  Cursor (None or empty string means the first page).
+    :return:        ExclusiveStartKey (None for the first page).
+    :raises ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as err:
+        raise ValueError(f'Invalid cursor: {cursor}') from err
+    if not isinstance(key, dict) or not all(isinstance(value, (str, int)) for value in key.values()):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return key
+
+
+def parse_fields(fields: str, allowed: tuple) -> tuple:
+    """
+    Parses comma-separated list of the requested fields.
+
+    :param fields:  Comma-separated field names (None or empty string means all fields).
+    :param allowed: Names of the fields, which can be requested.
+    :return:        Tuple of the requested field names (None for all fields).
+    :raises ValueError: If any of the fields is not allowed.
+    """
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f'Unsupported fields: {", ".join(unknown)}. Supported fields: {", ".join(allowed)}')
+    return names or None
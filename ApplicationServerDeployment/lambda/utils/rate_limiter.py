@@ -0,0 +1,165 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Thread-safe token buckets, which limit the rate of the calls made from a Lambda container.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Token bucket refilled with rate tokens per second, up to capacity tokens.
+
+    Callers, which have to wait, reserve their token in advance (the bucket goes below zero), so concurrent
+    callers are served in the order of arrival and the rate is kept without polling.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate:        Tokens added per second.
+        :param capacity:    Max number of tokens (max burst). Defaults to rate (at least 1).
+        :param clock:       Monotonic clock, in seconds.
+        :param sleep:       Sleep function, in seconds.
+        """
+        if rate <= 0:
+            raise ValueError(f'Rate has to be positive: {rate}')
+        self._rate = float(rate)
+        self._capacity = float(capacity) if capacity is not None else max(float(rate), 1.0)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self._capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token, if available.
+
+        :return:    True if the token was taken.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Takes a token, waits until it is available.
+
+        :param timeout: Max wait in seconds (no limit, if None).
+        :return:        True if the token was taken, False if it would not be available within the timeout.
+        """
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0.0:
+            self._sleep(wait)
+        return True
+
+    def reserve(self, timeout: float = None) -> float:
+        """
+        Takes a token in advance, without waiting for it.
+
+        :param timeout: Max wait in seconds (no limit, if None).
+        :return:        Seconds until the token is available, None if it would not be available within the timeout
+                        (no token is taken then).
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (1.0 - self._tokens) / self._rate)
+            if timeout is not None and wait > timeout:
+                return None
+            self._tokens -= 1.0
+            return wait
+
+    def release(self):
+        """
+        Returns a token taken by reserve, which is not going to be used.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens + 1.0)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+
+class KeyedTokenBuckets:
+    """
+    Token buckets created on demand for every key (e.g. device id). Least recently used buckets are dropped,
+    when there are more than max_size of them.
+    """
+
+    DEFAULT_MAX_SIZE = 4096
+
+    def __init__(self, rate, capacity: float = None, max_size: int = DEFAULT_MAX_SIZE, clock=time.monotonic,
+                 sleep=time.sleep):
+        """
+        :param rate:        Tokens added per second, or function, which returns the rate for the key.
+        :param capacity:    Max number of tokens of every bucket, see: TokenBucket.
+        :param max_size:    Max number of the buckets.
+        :param clock:       Monotonic clock, in seconds.
+        :param sleep:       Sleep function, in seconds.
+        """
+        self._rate = rate if callable(rate) else (lambda key: rate)
+        self._capacity = capacity
+        self._max_size = max_size
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> TokenBucket:
+        """
+        Returns token bucket of the key.
+
+        :param key: Hashable key.
+        :return:    TokenBucket object.
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self._rate(key), self._capacity, self._clock, self._sleep)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self._max_size:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+
+def acquire_all(buckets: [TokenBucket], timeout: float = None) -> bool:
+    """
+    Takes a token of every bucket, waits until all of them are available. If any of the tokens would not be
+    available within the timeout, the tokens reserved meanwhile are returned, so that the denied call does not
+    use up the rate of the other buckets.
+
+    :param buckets: TokenBucket objects.
+    :param timeout: Max wait in seconds (no limit, if None).
+    :return:        True if the tokens were taken, False if they would not be available within the timeout.
+    """
+    reserved, wait, slowest = [], 0.0, None
+    for bucket in buckets:
+        bucket_wait = bucket.reserve(timeout)
+        if bucket_wait is None:
+            for taken in reserved:
+                taken.release()
+            return False
+        reserved.append(bucket)
+        if bucket_wait > wait:
+            wait, slowest = bucket_wait, bucket
+    if slowest is not None:
+        slowest._sleep(wait)
+    return True
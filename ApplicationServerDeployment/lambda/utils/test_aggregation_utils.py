@@ -0,0 +1,70 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for aggregation and downsampling of measurement series.
+"""
+import math
+import unittest
+from unittest import mock
+
+import aggregation_utils
+
+
+class TestAggregationUtils(unittest.TestCase):
+
+    def test_parseBucket_shouldSucceed(self):
+        self.assertEqual(aggregation_utils.parse_bucket('60s'), 60000)
+        self.assertEqual(aggregation_utils.parse_bucket('60'), 60000)
+        self.assertEqual(aggregation_utils.parse_bucket('5m'), 300000)
+        self.assertEqual(aggregation_utils.parse_bucket('1500ms'), 1500)
+
+    def test_parseBucket_invalidInput(self):
+        for bucket in ['', '1 minute', '-5s', '10ms']:
+            with self.assertRaises(ValueError):
+                aggregation_utils.parse_bucket(bucket)
+
+    def test_parseAggregates_shouldSucceed(self):
+        self.assertEqual(aggregation_utils.parse_aggregates(None), ('avg', 'min', 'max'))
+        self.assertEqual(aggregation_utils.parse_aggregates('count, last'), ('count', 'last'))
+        with self.assertRaises(ValueError):
+            aggregation_utils.parse_aggregates('avg,median')
+
+    def test_aggregate_shouldSucceed(self):
+        times = [60000, 61000, 119999, 240000]
+        values = [1.0, 3.0, 2.0, 5.0]
+        self.assertEqual(aggregation_utils.aggregate(times, values, 60000, ('avg', 'min', 'max', 'count', 'last')), [
+            {'time': 60000, 'avg': 2.0, 'min': 1.0, 'max': 3.0, 'count': 3, 'last': 2.0},
+            {'time': 240000, 'avg': 5.0, 'min': 5.0, 'max': 5.0, 'count': 1, 'last': 5.0}
+        ])
+
+    @unittest.skipIf(aggregation_utils.numpy is None, 'NumPy is not installed')
+    def test_aggregate_numpySameAsPython_shouldSucceed(self):
+        times = list(range(0, 3000000, 1000))
+        values = [math.sin(time / 100000) for time in times]
+        aggregates = aggregation_utils.AGGREGATES
+        vectorized = aggregation_utils.aggregate(times, values, 60000, aggregates)
+        with mock.patch.object(aggregation_utils, 'numpy', None):
+            expected = aggregation_utils.aggregate(times, values, 60000, aggregates)
+        self.assertEqual(len(vectorized), 50)
+        for row, expected_row in zip(vectorized, expected):
+            self.assertEqual(row.keys(), expected_row.keys())
+            for name in row:
+                self.assertAlmostEqual(row[name], expected_row[name])
+
+    def test_lttb_shouldKeepEndsAndPeaks(self):
+        times = list(range(100))
+        values = [0.0] * 100
+        values[37] = 10.0
+        indices = aggregation_utils.lttb(times, values, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertEqual((indices[0], indices[-1]), (0, 99))
+        self.assertIn(37, indices)
+        self.assertEqual(indices, sorted(indices))
+
+    def test_lttb_fewPoints_shouldReturnAll(self):
+        self.assertEqual(aggregation_utils.lttb([1, 2, 3], [1.0, 2.0, 3.0], 5), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
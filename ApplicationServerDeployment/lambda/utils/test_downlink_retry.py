@@ -0,0 +1,83 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for the retry policy of the IoT Wireless calls, against a stubbed iotwireless client.
+"""
+import unittest
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import Stubber
+
+from downlink_retry import FAIL, RETRY, RetriesExhaustedError, call_with_retries, get_backoff, get_policy
+
+SEND_PARAMS = {'Id': 'device-1', 'TransmitMode': 0, 'PayloadData': 'AQ==', 'WirelessMetadata': {'Sidewalk': {'Seq': 1}}}
+
+
+class TestDownlinkRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.client = boto3.client('iotwireless', region_name='us-east-1',
+                                   aws_access_key_id='test', aws_secret_access_key='test',
+                                   config=Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+        self.stubber = Stubber(self.client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        self.delays = []
+
+    def send(self, **kwargs):
+        return call_with_retries(lambda: self.client.send_data_to_wireless_device(**SEND_PARAMS),
+                                 sleep=self.delays.append, rng=lambda: 1.0, **kwargs)
+
+    def test_getPolicy_shouldSucceed(self):
+        def error(code):
+            return ClientError({'Error': {'Code': code}}, 'SendDataToWirelessDevice')
+        self.assertEqual(get_policy(error('ThrottlingException')), RETRY)
+        self.assertEqual(get_policy(error('InternalServerException')), RETRY)
+        self.assertEqual(get_policy(error('ResourceNotFoundException')), FAIL)
+        self.assertEqual(get_policy(error('SomethingNew')), FAIL)
+        self.assertEqual(get_policy(EndpointConnectionError(endpoint_url='https://localhost')), RETRY)
+
+    def test_getBackoff_shouldBeCapped(self):
+        self.assertEqual([get_backoff(attempt, 0.1, 1.0, rng=lambda: 1.0) for attempt in range(1, 6)],
+                         [0.1, 0.2, 0.4, 0.8, 1.0])
+        self.assertEqual(get_backoff(3, 0.1, 1.0, rng=lambda: 0.5), 0.2)
+
+    def test_callWithRetries_throttled_shouldSucceed(self):
+        self.stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException', expected_params=SEND_PARAMS)
+        self.stubber.add_client_error('send_data_to_wireless_device', 'InternalServerException',
+                                      expected_params=SEND_PARAMS)
+        self.stubber.add_response('send_data_to_wireless_device', {'MessageId': 'message-1'}, SEND_PARAMS)
+        self.assertEqual(self.send()['MessageId'], 'message-1')
+        self.assertEqual(self.delays, [0.1, 0.2])
+        self.stubber.assert_no_pending_responses()
+
+    def test_callWithRetries_notFound_shouldFailFast(self):
+        self.stubber.add_client_error('send_data_to_wireless_device', 'ResourceNotFoundException')
+        with self.assertRaises(ClientError) as context:
+            self.send()
+        self.assertEqual(context.exception.response['Error']['Code'], 'ResourceNotFoundException')
+        self.assertEqual(self.delays, [])
+
+    def test_callWithRetries_exhausted_shouldRaise(self):
+        for _ in range(3):
+            self.stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        with self.assertRaises(RetriesExhaustedError) as context:
+            self.send(max_attempts=3)
+        self.assertEqual(context.exception.attempts, 3)
+        self.assertEqual(context.exception.error.response['Error']['Code'], 'ThrottlingException')
+        self.assertEqual(self.delays, [0.1, 0.2])
+        self.stubber.assert_no_pending_responses()
+
+    def test_callWithRetries_deadline_shouldNotSleepPastIt(self):
+        self.stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        with self.assertRaises(RetriesExhaustedError) as context:
+            self.send(deadline=0.0)
+        self.assertEqual(context.exception.attempts, 1)
+        self.assertEqual(self.delays, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
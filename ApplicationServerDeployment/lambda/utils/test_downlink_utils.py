@@ -0,0 +1,331 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for the shared downlink path.
+"""
+import base64
+import json
+import time
+import unittest
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from unittest import mock
+
+import boto3
+
+import downlink_retry
+import downlink_utils
+from conftest import FakeClock
+from device import Device
+from downlink_retry_queue import DownlinkRetryQueue
+from downlink_sequence_allocator import DownlinkSequenceAllocator
+from protocol import TagType
+from rate_limiter import KeyedTokenBuckets, TokenBucket
+
+
+class FakeClient:
+
+    def __init__(self, missing_device_ids: [str] = ()):
+        self.calls = []
+        self.missing_device_ids = missing_device_ids
+
+    def send_data_to_wireless_device(self, **kwargs):
+        if kwargs['Id'] in self.missing_device_ids:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': 'Not found'}},
+                              'SendDataToWirelessDevice')
+        self.calls.append(kwargs)
+        return {'MessageId': f'message-{len(self.calls)}'}
+
+    def invoke(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'StatusCode': 202}
+
+    def update_item(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'Attributes': {'next_seq': kwargs['ExpressionAttributeValues'][':block_size'] * len(self.calls)}}
+
+
+class FakeDevicesHandler:
+
+    def __init__(self, link_types: dict):
+        self.link_types = link_types
+
+    def get_device(self, wireless_device_id: str) -> Device:
+        if wireless_device_id in self.link_types:
+            return Device(wireless_device_id, link_type=self.link_types[wireless_device_id])
+
+
+class FakeDeliveryHandler:
+
+    def __init__(self):
+        self.sent = []
+        self.deliveries = []
+
+    def record_sent(self, wireless_device_id, seq, led_on, led_off, link_type):
+        self.sent.append((wireless_device_id, led_on, led_off, link_type.name))
+
+    def get_sent_since(self, wireless_device_id, since):
+        return [delivery for delivery in self.deliveries
+                if delivery['wireless_device_id'] == wireless_device_id and delivery['sent_at'] >= since]
+
+
+class FakeRetryQueue:
+
+    def __init__(self, due: [dict] = ()):
+        self.due = list(due)
+        self.queued, self.sent, self.rescheduled, self.dead = [], [], [], []
+        self.failing_device_ids = set()
+
+    def enqueue(self, wireless_device_id, command, payload, error_code, led_state=None, expires_in=None):
+        self.queued.append((wireless_device_id, command, payload, error_code, led_state, expires_in))
+
+    def get_due(self):
+        return self.due
+
+    get_led_state = DownlinkRetryQueue.get_led_state
+
+    def is_expired(self, item):
+        return item.get('expired', False)
+
+    def delete_sent(self, item):
+        if item['wireless_device_id'] in self.failing_device_ids:
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'DeleteItem')
+        self.sent.append(item['wireless_device_id'])
+        return True
+
+    def reschedule(self, item, error_code):
+        self.rescheduled.append((item['wireless_device_id'], error_code))
+        return True
+
+    def mark_dead(self, item, error_code):
+        self.dead.append((item['wireless_device_id'], error_code))
+        return True
+
+
+class TestDownlinkUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.wireless_client = FakeClient(missing_device_ids=['device-missing'])
+        self.lambda_client = FakeClient()
+        self.sequence_table = FakeClient()
+        self.delivery_handler = FakeDeliveryHandler()
+        self.retry_queue = FakeRetryQueue()
+        patcher = mock.patch.multiple(downlink_utils, _wireless_client=self.wireless_client,
+                                      _lambda_client=self.lambda_client,
+                                      _sequence_allocator=DownlinkSequenceAllocator(table=self.sequence_table),
+                                      _rate_limiter=TokenBucket(rate=1000),
+                                      _link_type_limiters=KeyedTokenBuckets(1000),
+                                      _device_limiters=KeyedTokenBuckets(1000),
+                                      _devices_handler=FakeDevicesHandler({'device-1': 'LORA'}),
+                                      _coalescer=None,
+                                      _delivery_handler=self.delivery_handler,
+                                      _retry_queue=self.retry_queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep_patcher = mock.patch('downlink_retry.time.sleep')
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def stub_wireless_client(self) -> Stubber:
+        client = boto3.client('iotwireless', region_name='us-east-1',
+                              aws_access_key_id='test', aws_secret_access_key='test',
+                              config=Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+        stubber = Stubber(client)
+        stubber.activate()
+        self.addCleanup(stubber.deactivate)
+        patcher = mock.patch.object(downlink_utils, '_wireless_client', client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return stubber
+
+    def test_sendResponse_direct_shouldSucceed(self):
+        result = downlink_utils.send_response_to_device(downlink_utils.DEMO_APP_ACTION_RESP, 'device-1',
+                                                        button_press=[1, 2, 4], mode='direct')
+        self.assertEqual(result, {'command': 'DEMO_APP_ACTION_RESP', 'response': {'MessageId': 'message-1'}})
+        call, = self.wireless_client.calls
+        self.assertEqual(call['Id'], 'device-1')
+        self.assertEqual(base64.b64decode(call['PayloadData']).hex().upper(), 'E100CD03010204')
+        self.assertEqual(call['WirelessMetadata'], {'Sidewalk': {'Seq': 0}})
+        self.assertEqual(self.lambda_client.calls, [])
+
+    def test_sendResponse_event_shouldInvokeDownlinkLambda(self):
+        with mock.patch.dict('os.environ', {downlink_utils.DOWNLINK_MODE_ENV: downlink_utils.DOWNLINK_MODE_EVENT}):
+            result = downlink_utils.send_response_to_device(downlink_utils.DEMO_APP_CAP_DISCOVERY_RESP, 'device-1')
+        self.assertEqual(result['response'], 202)
+        call, = self.lambda_client.calls
+        self.assertEqual(call['InvocationType'], 'Event')
+        self.assertEqual(json.loads(call['Payload']), {'body': {'command': 'DEMO_APP_CAP_DISCOVERY_RESP',
+                                                                'deviceId': 'device-1'},
+                                                       'httpMethod': 'POST'})
+        self.assertEqual(self.wireless_client.calls, [])
+
+    def test_sendResponse_unsupportedCommand(self):
+        with self.assertRaises(ValueError):
+            downlink_utils.send_response_to_device(downlink_utils.DEMO_APP_ACTION_REQ, 'device-1', mode='DIRECT')
+
+    def test_sendLedActionReqToDevices_shouldSucceed(self):
+        device_ids = [f'device-{idx}' for idx in range(20)]
+        message_ids, errors = downlink_utils.send_led_action_req_to_devices(device_ids + ['device-missing', 'device-1'],
+                                                                            TagType.LED_ON, [1, 2])
+        self.assertEqual(sorted(message_ids), sorted(device_ids))
+        self.assertEqual(len(set(message_ids.values())), 20)
+        self.assertEqual(errors, {'device-missing': {'code': 'ResourceNotFoundException', 'message': 'Not found'}})
+        self.assertEqual({call['Id'] for call in self.wireless_client.calls}, set(device_ids))
+        self.assertEqual(len({call['PayloadData'] for call in self.wireless_client.calls}), 1)
+        self.assertEqual(sorted(self.delivery_handler.sent),
+                         sorted((device_id, [1, 2], [], 'LORA' if device_id == 'device-1' else 'UNKNOWN')
+                                for device_id in device_ids))
+
+    def test_sendPayloadToDevices_deadline_shouldBeThrottled(self):
+        with mock.patch.object(downlink_utils, '_rate_limiter', TokenBucket(rate=1, capacity=2)):
+            message_ids, errors = downlink_utils.send_payload_to_devices(['device-1', 'device-2', 'device-3'],
+                                                                         b'\x01', deadline=time.monotonic() + 0.5)
+        self.assertEqual(len(message_ids), 2)
+        error, = errors.values()
+        self.assertEqual(error['code'], downlink_utils.ERROR_THROTTLED)
+
+    def test_acquireSendSlot_shouldLimitDeviceByLinkType(self):
+        clock = FakeClock()
+        device_limiters = KeyedTokenBuckets(lambda key: downlink_utils.DEVICE_MAX_TPS[key[1]],
+                                            capacity=downlink_utils.DEVICE_BURST, clock=clock, sleep=clock.sleep)
+        with mock.patch.object(downlink_utils, '_device_limiters', device_limiters):
+            self.assertEqual([downlink_utils.acquire_send_slot('device-1', time.monotonic() + 1) for _ in range(3)],
+                             [True, True, False])
+            self.assertTrue(downlink_utils.acquire_send_slot('device-2', time.monotonic() + 1))
+            self.assertTrue(downlink_utils.acquire_send_slot('device-1'))
+        self.assertAlmostEqual(clock.now, 1 / downlink_utils.DEVICE_MAX_TPS[downlink_utils.LinkType.LORA])
+
+    def test_coalesceLedActionReq_disabled_shouldReturnRequestedState(self):
+        with mock.patch.dict('os.environ', {downlink_utils.DOWNLINK_COALESCE_WINDOW_ENV: '0'}):
+            self.assertEqual(downlink_utils.coalesce_led_action_req('device-1', TagType.LED_OFF, [2, 1]), ([], [2, 1]))
+            self.assertEqual(downlink_utils.coalesce_led_action_req('device-1', TagType.LED_ON, [3]), ([3], []))
+
+    def test_sendLedStateReq_shouldSucceed(self):
+        with mock.patch.object(downlink_utils.time_utils, 'get_gps_time', return_value=1000):
+            downlink_utils.send_led_state_req('device-1', [1], [2])
+        self.assertEqual(self.delivery_handler.sent, [('device-1', [1], [2], 'LORA')])
+        call, = self.wireless_client.calls
+        self.assertEqual(base64.b64decode(call['PayloadData']),
+                         downlink_utils.command_templates.encode_led_state_req([1], [2], 1000))
+
+    def test_sendLedStateReq_linkType_shouldNotBeLookedUp(self):
+        with mock.patch.object(downlink_utils, 'get_link_type') as get_link_type:
+            downlink_utils.send_led_state_req('device-1', [1], [], link_type=downlink_utils.LinkType.BLE)
+        get_link_type.assert_not_called()
+        self.assertEqual(self.delivery_handler.sent, [('device-1', [1], [], 'BLE')])
+
+    def test_queueLedStateReq_shouldBeQueued(self):
+        with mock.patch.object(downlink_utils.time_utils, 'get_gps_time', return_value=1000):
+            downlink_utils.queue_led_state_req('device-1', [1], [2], downlink_utils.ERROR_THROTTLED)
+        self.assertEqual(self.retry_queue.queued, [('device-1', downlink_utils.DEMO_APP_ACTION_REQ,
+                                                    downlink_utils.command_templates.encode_led_state_req([1], [2],
+                                                                                                         1000),
+                                                    downlink_utils.ERROR_THROTTLED, ([1], [2]), None)])
+        self.assertEqual(self.wireless_client.calls, [])
+
+    def test_acquireSendSlot_maxWait_shouldNotTakeTokens(self):
+        clock = FakeClock()
+        device_limiters = KeyedTokenBuckets(lambda key: downlink_utils.DEVICE_MAX_TPS[key[1]], capacity=1,
+                                            clock=clock, sleep=clock.sleep)
+        link_type_limiters = KeyedTokenBuckets(1, capacity=2, clock=clock, sleep=clock.sleep)
+        with mock.patch.multiple(downlink_utils, _device_limiters=device_limiters,
+                                 _link_type_limiters=link_type_limiters):
+            self.assertTrue(downlink_utils.acquire_send_slot('device-1'))
+            self.assertFalse(downlink_utils.acquire_send_slot('device-1', max_wait=1))
+            self.assertTrue(link_type_limiters.get(downlink_utils.LinkType.LORA).try_acquire())
+        self.assertEqual(clock.sleeps, [])
+
+    def test_sendLedStateReq_throttled_shouldRetry(self):
+        stubber = self.stub_wireless_client()
+        stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        stubber.add_response('send_data_to_wireless_device', {'MessageId': 'message-1'})
+        self.assertEqual(downlink_utils.send_led_state_req('device-1', [1], [])['MessageId'], 'message-1')
+        stubber.assert_no_pending_responses()
+        self.assertEqual(self.retry_queue.queued, [])
+        self.assertEqual(self.delivery_handler.sent, [('device-1', [1], [], 'LORA')])
+
+    def test_sendLedStateReq_notFound_shouldFailFast(self):
+        stubber = self.stub_wireless_client()
+        stubber.add_client_error('send_data_to_wireless_device', 'ResourceNotFoundException')
+        with self.assertRaises(ClientError):
+            downlink_utils.send_led_state_req('device-1', [1], [])
+        stubber.assert_no_pending_responses()
+        self.assertEqual(self.retry_queue.queued, [])
+
+    def test_sendResponse_retriesExhausted_shouldBeQueued(self):
+        stubber = self.stub_wireless_client()
+        for _ in range(downlink_retry.MAX_ATTEMPTS):
+            stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        result = downlink_utils.send_response_to_device(downlink_utils.DEMO_APP_ACTION_RESP, 'device-1',
+                                                        button_press=[1], mode='direct')
+        self.assertEqual(result, {'command': 'DEMO_APP_ACTION_RESP', 'response': {'queued': True}})
+        stubber.assert_no_pending_responses()
+        (device_id, command, payload, error_code, led_state, expires_in), = self.retry_queue.queued
+        self.assertEqual((device_id, command, error_code, led_state, expires_in),
+                         ('device-1', downlink_utils.DEMO_APP_ACTION_RESP, 'ThrottlingException', None,
+                          downlink_utils.ACK_EXPIRY))
+        self.assertEqual(payload, downlink_utils.command_templates.encode_button_pressed_resp([1]))
+
+    def test_sendResponse_deadline_shouldBeQueuedWithoutRetries(self):
+        stubber = self.stub_wireless_client()
+        stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        result = downlink_utils.send_response_to_device(downlink_utils.DEMO_APP_CAP_DISCOVERY_RESP, 'device-1',
+                                                        mode='direct', deadline=time.monotonic())
+        self.assertEqual(result, {'command': 'DEMO_APP_CAP_DISCOVERY_RESP', 'response': {'queued': True}})
+        stubber.assert_no_pending_responses()
+        self.assertEqual(len(self.retry_queue.queued), 1)
+
+    def test_getDeadline_shouldKeepMargin(self):
+        context = mock.Mock(get_remaining_time_in_millis=lambda: 3000)
+        remaining = downlink_utils.get_deadline(context) - time.monotonic()
+        self.assertAlmostEqual(remaining, 3 - downlink_utils.DEADLINE_MARGIN, delta=0.1)
+        self.assertIsNone(downlink_utils.get_deadline(None))
+
+    def test_sweepRetryQueue_shouldSendRescheduleAndDrop(self):
+        stubber = self.stub_wireless_client()
+        self.retry_queue.due = [
+            {'wireless_device_id': 'device-1', 'command': downlink_utils.DEMO_APP_ACTION_REQ, 'payload': b'\x01',
+             'led_1': {'state': 1, 'queued_at': 5000}, 'led_2': {'state': 0, 'queued_at': 3000}},
+            {'wireless_device_id': 'device-4', 'command': downlink_utils.DEMO_APP_ACTION_RESP, 'payload': b'\x04'},
+            {'wireless_device_id': 'device-2', 'command': downlink_utils.DEMO_APP_ACTION_RESP, 'payload': b'\x02'},
+            {'wireless_device_id': 'device-3', 'command': downlink_utils.DEMO_APP_ACTION_RESP, 'payload': b'\x03'},
+            {'wireless_device_id': 'device-5', 'command': downlink_utils.DEMO_APP_ACTION_RESP, 'payload': b'\x05',
+             'expired': True}
+        ]
+        self.retry_queue.failing_device_ids = {'device-4'}
+        self.delivery_handler.deliveries = [{'wireless_device_id': 'device-1', 'sent_at': 4000,
+                                             'led_on': [1, 2], 'led_off': []}]
+        payload = downlink_utils.command_templates.encode_led_state_req([1], [], 1000)  # with the current GPS time
+        stubber.add_response('send_data_to_wireless_device', {'MessageId': 'message-1'},
+                             {'Id': 'device-1', 'TransmitMode': 0, 'PayloadData': base64.b64encode(payload).decode(),
+                              'WirelessMetadata': {'Sidewalk': {'Seq': 0}}})
+        stubber.add_response('send_data_to_wireless_device', {'MessageId': 'message-2'})
+        for _ in range(downlink_retry.MAX_ATTEMPTS):
+            stubber.add_client_error('send_data_to_wireless_device', 'ThrottlingException')
+        stubber.add_client_error('send_data_to_wireless_device', 'ResourceNotFoundException')
+        with mock.patch.object(downlink_utils.time_utils, 'get_gps_time', return_value=1000):
+            stats = downlink_utils.sweep_retry_queue()
+        stubber.assert_no_pending_responses()
+        self.assertEqual(stats, {'sent': 1, 'rescheduled': 1, 'dead': 1, 'expired': 1, 'superseded': 0,
+                                 'skipped': 0, 'errors': 1})
+        self.assertEqual(self.retry_queue.sent, ['device-1'])
+        self.assertEqual(self.retry_queue.rescheduled, [('device-2', 'ThrottlingException')])
+        self.assertEqual(self.retry_queue.dead, [('device-3', 'ResourceNotFoundException'),
+                                                 ('device-5', downlink_utils.ERROR_EXPIRED)])
+        self.assertEqual(self.retry_queue.queued, [])
+        self.assertEqual(self.delivery_handler.sent, [('device-1', [1], [], 'LORA')])
+
+    def test_sweepRetryQueue_supersededLeds_shouldNotBeSent(self):
+        self.retry_queue.due = [{'wireless_device_id': 'device-1', 'command': downlink_utils.DEMO_APP_ACTION_REQ,
+                                 'payload': b'\x01', 'led_1': {'state': 1, 'queued_at': 3000}}]
+        self.delivery_handler.deliveries = [{'wireless_device_id': 'device-1', 'sent_at': 4000,
+                                             'led_on': [], 'led_off': [1]}]
+        stats = downlink_utils.sweep_retry_queue()
+        self.assertEqual(stats['superseded'], 1)
+        self.assertEqual(self.retry_queue.sent, ['device-1'])
+        self.assertEqual(self.wireless_client.calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for compressed and conditional responses.
+"""
+import base64
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import http_utils
+
+MEASUREMENTS = [{'wireless_device_id': 'device-1', 'value': 21.5, 'time': 1700000000000 + i} for i in range(100)]
+
+
+def response(body, status_code: int = 200) -> dict:
+    return {'statusCode': status_code, 'body': json.dumps(body), 'headers': {'Access-Control-Allow-Origin': 'x'}}
+
+
+class TestHttpUtils(unittest.TestCase):
+
+    def test_encodeResponse_gzip_shouldSucceed(self):
+        with mock.patch.object(http_utils, 'brotli', None):
+            encoded = http_utils.encode_response(response(MEASUREMENTS), {'accept-encoding': 'gzip, deflate, br',
+                                                                          'accept': http_utils.COMPRESSED_MEDIA_TYPE})
+        self.assertTrue(encoded['isBase64Encoded'])
+        self.assertEqual(encoded['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(encoded['headers']['Access-Control-Allow-Origin'], 'x')
+        body = gzip.decompress(base64.b64decode(encoded['body']))
+        self.assertEqual(json.loads(body), MEASUREMENTS)
+        self.assertLess(len(encoded['body']), len(body) / 4)
+
+    def test_encodeResponse_smallOrNotAccepted_shouldNotCompress(self):
+        accept = http_utils.COMPRESSED_MEDIA_TYPE
+        for body, headers in [({'id': 1}, {'Accept-Encoding': 'gzip', 'Accept': accept}),
+                              (MEASUREMENTS, {'Accept-Encoding': 'gzip;q=0, identity', 'Accept': accept}),
+                              (MEASUREMENTS, {'Accept-Encoding': 'gzip', 'Accept': '*/*'}),
+                              (MEASUREMENTS, {'Accept-Encoding': 'gzip', 'Accept': f'application/json, {accept}'}),
+                              (MEASUREMENTS, None)]:
+            encoded = http_utils.encode_response(response(body), headers)
+            self.assertNotIn('isBase64Encoded', encoded)
+            self.assertEqual(json.loads(encoded['body']), body)
+
+    def test_encodeResponse_etagMatches_shouldReturn304(self):
+        etag = http_utils.encode_response(response(MEASUREMENTS))['headers']['ETag']
+        encoded = http_utils.encode_response(response(MEASUREMENTS), {'If-None-Match': f'"other", W/{etag}',
+                                                                      'Accept-Encoding': 'gzip'})
+        self.assertEqual(encoded['statusCode'], 304)
+        self.assertEqual(encoded['body'], '')
+        self.assertEqual(encoded['headers']['ETag'], etag)
+
+    def test_encodeResponse_etagChanged_shouldReturn200(self):
+        etag = http_utils.encode_response(response(MEASUREMENTS))['headers']['ETag']
+        encoded = http_utils.encode_response(response(MEASUREMENTS[1:]), {'If-None-Match': etag})
+        self.assertEqual(encoded['statusCode'], 200)
+        self.assertNotEqual(encoded['headers']['ETag'], etag)
+
+    def test_encodeResponse_error_shouldNotHaveEtag(self):
+        encoded = http_utils.encode_response(response('Invalid path', 400), {'If-None-Match': '*'})
+        self.assertEqual(encoded['statusCode'], 400)
+        self.assertNotIn('ETag', encoded['headers'])
+
+    def test_selectEncoding_shouldSucceed(self):
+        with mock.patch.object(http_utils, 'brotli', object()):
+            self.assertEqual(http_utils.select_encoding('gzip, br'), 'br')
+            self.assertEqual(http_utils.select_encoding('br;q=0, *'), 'gzip')
+        with mock.patch.object(http_utils, 'brotli', None):
+            self.assertEqual(http_utils.select_encoding('br'), None)
+        self.assertEqual(http_utils.select_encoding(''), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
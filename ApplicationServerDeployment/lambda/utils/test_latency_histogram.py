@@ -0,0 +1,56 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for the latency histogram.
+"""
+import random
+import unittest
+
+import latency_histogram
+from latency_histogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_bucketIndex_rangesShouldBeContiguous(self):
+        previous_highest = -1
+        for index in range(latency_histogram.BUCKET_COUNT):
+            lowest, highest = latency_histogram.bucket_range(index)
+            self.assertEqual(lowest, previous_highest + 1)
+            self.assertEqual(latency_histogram.bucket_index(lowest), index)
+            self.assertEqual(latency_histogram.bucket_index(highest), index)
+            self.assertLessEqual(highest - lowest, lowest / 64)
+            previous_highest = highest
+        self.assertEqual(previous_highest, 2 ** latency_histogram.MAX_VALUE_BITS - 1)
+        self.assertEqual(latency_histogram.bucket_index(2 ** 40), latency_histogram.BUCKET_COUNT - 1)
+
+    def test_percentile_shouldBeWithinPrecision(self):
+        rng = random.Random(7)
+        values = sorted(int(rng.lognormvariate(8, 1)) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        for percentile in (50, 95, 99, 100):
+            exact = values[-(-len(values) * percentile // 100) - 1]
+            self.assertGreaterEqual(histogram.percentile(percentile), exact)
+            self.assertLessEqual(histogram.percentile(percentile), exact * (1 + 1 / 64))
+        self.assertLess(len(histogram.counts), latency_histogram.BUCKET_COUNT)
+        self.assertAlmostEqual(histogram.summary()['mean'], sum(values) / len(values))
+
+    def test_merge_shouldSucceed(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(100, count=3)
+        second.record(5000)
+        first.merge(second)
+        self.assertEqual(first.summary(), {'count': 4, 'mean': 1325.0, 'min': 100, 'max': 5055,
+                                           'p50': 100, 'p95': 5055, 'p99': 5055})
+        self.assertEqual(LatencyHistogram(first.counts, first.total_sum).summary(), first.summary())
+
+    def test_summary_empty(self):
+        self.assertEqual(LatencyHistogram().summary(), {'count': 0})
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for cursor-based pagination helpers.
+"""
+import unittest
+from decimal import Decimal
+
+import pagination_utils
+
+
+class TestPaginationUtils(unittest.TestCase):
+
+    def test_cursor_roundTrip_shouldSucceed(self):
+        key = {'timestamp': Decimal(1700000000123), 'wireless_device_id': 'device-1'}
+        cursor = pagination_utils.encode_cursor(key)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(pagination_utils.decode_cursor(cursor), {'timestamp': 1700000000123,
+                                                                  'wireless_device_id': 'device-1'})
+
+    def test_cursor_lastPage_shouldBeNone(self):
+        self.assertIsNone(pagination_utils.encode_cursor(None))
+        self.assertIsNone(pagination_utils.decode_cursor(''))
+
+    def test_decodeCursor_invalidInput(self):
+        for cursor in ['not a cursor!', 'bm90IGpzb24', 'WzEsMl0']:  # invalid base64, 'not json', '[1,2]'
+            with self.assertRaises(ValueError):
+                pagination_utils.decode_cursor(cursor)
+
+    def test_parseFields_shouldSucceed(self):
+        self.assertEqual(pagination_utils.parse_fields(' led, button,led ', ('led', 'button')), ('led', 'button'))
+        self.assertIsNone(pagination_utils.parse_fields(None, ('led',)))
+
+    def test_parseFields_unsupportedField(self):
+        with self.assertRaises(ValueError):
+            pagination_utils.parse_fields('led,password', ('led', 'button'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Unit tests for the token bucket rate limiter.
+"""
+import unittest
+
+from conftest import FakeClock
+from rate_limiter import TokenBucket, acquire_all
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=10, capacity=2, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_tryAcquire_shouldRefill(self):
+        self.assertEqual([self.bucket.try_acquire() for _ in range(3)], [True, True, False])
+        self.clock.now = 0.1
+        self.assertTrue(self.bucket.try_acquire())
+        self.assertFalse(self.bucket.try_acquire())
+        self.clock.now = 10
+        self.assertEqual([self.bucket.try_acquire() for _ in range(3)], [True, True, False])
+
+    def test_acquire_shouldKeepRate(self):
+        for _ in range(12):
+            self.assertTrue(self.bucket.acquire())
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        self.assertEqual(len(self.clock.sleeps), 10)
+
+    def test_acquire_timeout_shouldNotReserve(self):
+        self.bucket.acquire()
+        self.bucket.acquire()
+        self.assertFalse(self.bucket.acquire(timeout=0.05))
+        self.assertTrue(self.bucket.acquire(timeout=0.1))
+        self.assertEqual(self.clock.sleeps, [0.1])
+
+    def test_reserveRelease_shouldReturnToken(self):
+        self.assertEqual([self.bucket.reserve(), self.bucket.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.reserve(), 0.1)
+        self.assertIsNone(self.bucket.reserve(timeout=0.1))
+        self.bucket.release()
+        self.assertAlmostEqual(self.bucket.reserve(), 0.1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_acquireAll_denied_shouldReleaseTokens(self):
+        slow_bucket = TokenBucket(rate=1, capacity=1, clock=self.clock, sleep=self.clock.sleep)
+        self.assertTrue(acquire_all([self.bucket, slow_bucket], timeout=0.5))
+        self.assertFalse(acquire_all([self.bucket, slow_bucket], timeout=0.5))
+        self.assertTrue(self.bucket.try_acquire())
+        self.assertTrue(acquire_all([self.bucket, slow_bucket]))
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    def test_invalidRate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+if __name__ == '__main__':
+    unittest.main()